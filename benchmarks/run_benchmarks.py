@@ -0,0 +1,200 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic_portfolio import generate_building, generate_portfolio, generate_portfolio_columns
+from src.portfolio_calculators import calculate_portfolio
+from src.simplified_calculators import Building
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_SIZES = (1000, 100000, 1000000)
+DEFAULT_ELEMENT_COUNTS = (1, 10, 100, 1000)
+ELEMENT_SCALING_TOTAL_ELEMENTS = 20000
+MEMORY_BUILDINGS = 10000
+
+# Run in a fresh interpreter, so the cold measurement includes imports and first-call overhead
+COLD_START_SCRIPT = '''
+import json, random, sys, time
+start = time.perf_counter()
+from benchmarks.synthetic_portfolio import generate_building
+from src.simplified_calculators import Building
+data = generate_building(random.Random(int(sys.argv[1])))
+ready = time.perf_counter()
+Building(data)
+end = time.perf_counter()
+print(json.dumps({'import_seconds': ready - start, 'first_building_seconds': end - ready}))
+'''
+
+
+def run_single_building_latency_cold(seed: int, repeats: int = 5) -> dict:
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT, str(seed)], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'median_import_seconds': statistics.median(run['import_seconds'] for run in runs),
+        'median_first_building_seconds': statistics.median(run['first_building_seconds'] for run in runs),
+        'repeats': repeats,
+    }
+
+
+def run_single_building_latency_warm(seed: int, repeats: int = 2000) -> dict:
+    data = generate_building(random.Random(seed))
+    Building(data)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        Building(data)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'n_elements': len(data['building_elements']),
+        'median_seconds': statistics.median(timings),
+        'p99_seconds': timings[int(0.99 * (len(timings) - 1))],
+        'repeats': repeats,
+    }
+
+
+def run_bulk_throughput_building(n_buildings: int, seed: int) -> dict:
+    # One Building per record, records generated lazily and not retained
+    n_elements = 0
+    seconds = 0.0
+    for data in generate_portfolio(n_buildings, seed):
+        start = time.perf_counter()
+        Building(data)
+        seconds += time.perf_counter() - start
+        n_elements += len(data['building_elements'])
+    return {'n_buildings': n_buildings, 'n_elements': n_elements, 'seconds': seconds,
+            'buildings_per_second': n_buildings / seconds}
+
+
+def run_bulk_throughput_portfolio(n_buildings: int, seed: int) -> dict:
+    columns = generate_portfolio_columns(n_buildings, seed)
+    start = time.perf_counter()
+    calculate_portfolio(**columns)
+    seconds = time.perf_counter() - start
+    return {'n_buildings': n_buildings, 'n_elements': int(columns['a__k'].size), 'seconds': seconds,
+            'buildings_per_second': n_buildings / seconds}
+
+
+def run_element_count_scaling(n_elements: int, seed: int) -> dict:
+    n_buildings = max(1, ELEMENT_SCALING_TOTAL_ELEMENTS // n_elements)
+    buildings = list(generate_portfolio(n_buildings, seed, n_elements=n_elements))
+    start = time.perf_counter()
+    for data in buildings:
+        Building(data)
+    seconds = time.perf_counter() - start
+    return {'n_elements': n_elements, 'n_buildings': n_buildings,
+            'seconds_per_building': seconds / n_buildings, 'seconds_per_element': seconds / (n_buildings * n_elements)}
+
+
+def run_peak_memory(seed: int, compact: bool) -> dict:
+    buildings_data = list(generate_portfolio(MEMORY_BUILDINGS, seed))
+    n_elements = sum(len(data['building_elements']) for data in buildings_data)
+    tracemalloc.start()
+    buildings = [Building(data, compact=compact) for data in buildings_data]
+    retained_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del buildings
+    return {'compact': compact, 'n_buildings': MEMORY_BUILDINGS, 'n_elements': n_elements,
+            'peak_bytes': peak_bytes, 'retained_bytes': retained_bytes,
+            'retained_bytes_per_element': retained_bytes / n_elements}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, element_counts=DEFAULT_ELEMENT_COUNTS, seed: int = 0) -> dict:
+    results = []
+
+    def record(scenario: str, result: dict):
+        results.append({'scenario': scenario, **result})
+        print(scenario, json.dumps(result), file=sys.stderr)
+
+    record('single_building_latency_cold', run_single_building_latency_cold(seed))
+    record('single_building_latency_warm', run_single_building_latency_warm(seed))
+    for n_buildings in sizes:
+        record('bulk_throughput_building', run_bulk_throughput_building(n_buildings, seed))
+        record('bulk_throughput_portfolio', run_bulk_throughput_portfolio(n_buildings, seed))
+    for n_elements in element_counts:
+        record('element_count_scaling', run_element_count_scaling(n_elements, seed))
+    for compact in (False, True):
+        record('peak_memory', run_peak_memory(seed, compact))
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def result_key(result: dict) -> tuple:
+    # Identifies the same measurement across runs: scenario plus its size parameters
+    return (result['scenario'],) + tuple(result.get(name) for name in ('n_buildings', 'n_elements', 'compact'))
+
+
+def compare_benchmarks(previous: dict, current: dict) -> list:
+    """
+    Compare two benchmark result files.
+
+    Returns:
+    - List of (key, metric, previous value, current value, current/previous) for every shared numeric metric.
+    """
+    previous_results = {result_key(result): result for result in previous['results']}
+    comparison = []
+    for result in current['results']:
+        key = result_key(result)
+        if key not in previous_results:
+            continue
+        for metric, value in result.items():
+            previous_value = previous_results[key].get(metric)
+            if metric in ('scenario', 'n_buildings', 'n_elements', 'compact', 'repeats') or not isinstance(value, (int, float)) \
+                    or not isinstance(previous_value, (int, float)) or not previous_value:
+                continue
+            comparison.append((key, metric, previous_value, value, value / previous_value))
+    return comparison
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run the heat load calculation benchmarks on a synthetic portfolio.')
+    parser.add_argument('--output', default='benchmark_results.json', help='JSON file the results are written to')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic portfolio')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Portfolio sizes of the bulk scenarios')
+    parser.add_argument('--element-counts', type=int, nargs='+', default=DEFAULT_ELEMENT_COUNTS, help='Elements per building of the scaling scenario')
+    parser.add_argument('--compare', help='Earlier result file to compare against')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmarks(args.sizes, args.element_counts, args.seed)
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.compare:
+        for key, metric, previous_value, value, ratio in compare_benchmarks(json.loads(Path(args.compare).read_text()), report):
+            print(f'{" ".join(str(part) for part in key if part is not None)} {metric}: {previous_value:.6g} -> {value:.6g} ({ratio:.2f}x)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
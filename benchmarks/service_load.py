@@ -0,0 +1,173 @@
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic_portfolio import generate_portfolio
+from src.calculation_service import CalculationService, RequestRejected, SynchronousCalculationService
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_REQUESTS = 4000
+DEFAULT_CONCURRENCY = 64
+SERVER_START_TIMEOUT = 30  # Seconds
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def start_server(port: int, server_args: list) -> subprocess.Popen:
+    # Serve from a separate interpreter, so client and server do not share an event loop
+    server = subprocess.Popen([sys.executable, '-m', 'src.calculation_service', '--port', str(port), *server_args],
+                              cwd=REPO_ROOT, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.05)
+    server.kill()
+    raise RuntimeError(f'Server on port {port} did not start.')
+
+
+async def request(reader, writer, method: str, path: str, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else b''
+    writer.write(f'{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(body)}\r\n\r\n'.encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return status, json.loads(await reader.readexactly(int(headers['content-length'])))
+
+
+def load_summary(n_requests: int, concurrency: int, elapsed: float, latencies: list, statuses: dict, server_metrics: dict) -> dict:
+    return {
+        'requests': n_requests,
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'throughput_per_second': n_requests / elapsed,
+        'latency_p50_ms': float(np.percentile(latencies, 50)) * 1000,
+        'latency_p99_ms': float(np.percentile(latencies, 99)) * 1000,
+        'statuses': statuses,
+        'server_mean_batch_size': server_metrics['mean_batch_size'],
+    }
+
+
+async def run_client(port: int, records: list, latencies: list, statuses: dict):
+    # One keep-alive connection sending its records one after the other
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for data in records:
+            started_at = time.perf_counter()
+            status, _ = await request(reader, writer, 'POST', '/calculate', data)
+            latencies.append(time.perf_counter() - started_at)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def run_load(port: int, records: list, concurrency: int) -> dict:
+    # One request per client first, untimed, so the first batch (table compilation etc.) is not measured
+    await asyncio.gather(*[run_client(port, [data], [], {}) for data in records[:concurrency]])
+    latencies, statuses = [], {}
+    started_at = time.perf_counter()
+    await asyncio.gather(*[run_client(port, records[client::concurrency], latencies, statuses) for client in range(concurrency)])
+    elapsed = time.perf_counter() - started_at
+
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    _, server_metrics = await request(reader, writer, 'GET', '/metrics')
+    writer.close()
+    return load_summary(len(records), concurrency, elapsed, latencies, statuses, server_metrics)
+
+
+async def run_in_process_client(service, records: list, latencies: list, statuses: dict):
+    for data in records:
+        started_at = time.perf_counter()
+        try:
+            await service.calculate(data)
+            status = 200
+        except RequestRejected:
+            status = 422
+        latencies.append(time.perf_counter() - started_at)
+        statuses[status] = statuses.get(status, 0) + 1
+
+
+async def run_in_process_load(service, records: list, concurrency: int) -> dict:
+    # The same load without HTTP and JSON, to measure the service layer alone. The synchronous service never
+    # yields to the event loop, so its requests never queue and its latencies are calculation times only.
+    latencies, statuses = [], {}
+    async with service:
+        await asyncio.gather(*[run_in_process_client(service, [data], [], {}) for data in records[:concurrency]])
+        started_at = time.perf_counter()
+        await asyncio.gather(*[run_in_process_client(service, records[client::concurrency], latencies, statuses)
+                               for client in range(concurrency)])
+        elapsed = time.perf_counter() - started_at
+        server_metrics = service.metrics_snapshot()
+    return load_summary(len(records), concurrency, elapsed, latencies, statuses, server_metrics)
+
+
+def run_scenario(name: str, server_args: list, records: list, concurrency: int) -> dict:
+    port = free_port()
+    server = start_server(port, server_args)
+    try:
+        return {'scenario': name, **asyncio.run(run_load(port, records, concurrency))}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the calculation service: one synchronous Building per request vs. micro-batching.')
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='Concurrent keep-alive client connections')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--max-delay-ms', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--in-process', action='store_true', help='Call the services directly instead of over HTTP')
+    parser.add_argument('--inline', action='store_true', help='Calculate the batches on the event loop instead of in worker processes')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    records = list(generate_portfolio(args.requests, seed=args.seed))
+    if args.in_process:
+        results = [
+            {'scenario': 'synchronous', **asyncio.run(run_in_process_load(SynchronousCalculationService(), records, args.concurrency))},
+            {'scenario': 'micro-batched', **asyncio.run(run_in_process_load(
+                CalculationService(batch_size=args.batch_size, max_delay=args.max_delay_ms / 1000,
+                                   max_queue_size=max(args.concurrency, 1024), inline=args.inline), records, args.concurrency))},
+        ]
+    else:
+        results = [
+            run_scenario('synchronous', ['--synchronous'], records, args.concurrency),
+            run_scenario('micro-batched', ['--batch-size', str(args.batch_size), '--max-delay-ms', str(args.max_delay_ms),
+                                           *(['--inline'] if args.inline else [])], records, args.concurrency),
+        ]
+    for result in results:
+        print(f"{result['scenario']:>14}: {result['throughput_per_second']:8.0f} req/s, p50 {result['latency_p50_ms']:7.2f} ms, "
+              f"p99 {result['latency_p99_ms']:7.2f} ms, mean batch {result['server_mean_batch_size']:5.1f}, statuses {result['statuses']}")
+    print(f"Throughput gain: {results[1]['throughput_per_second'] / results[0]['throughput_per_second']:.2f}x")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+import random
+
+import numpy as np
+
+from src.data import din_12831_data
+
+
+# Value ranges for the synthetic buildings
+BUILD_YEARS = (1850, 2024)
+THETA__E_VALUES = tuple(range(-16, -4))  # External design temperatures of German locations in °C
+V__BUILD_RANGE = (150.0, 2500.0)
+A__K_RANGE = (1.0, 120.0)
+ELEMENTS_PER_BUILDING_RANGE = (4, 30)
+
+# Share of buildings/elements that carry an explicit value instead of a table default
+EXPLICIT_VALUE_SHARE = 0.25
+
+# Table B.12 keys that are air tightness levels rather than build year ranges
+AIR_TIGHTNESS_LEVELS = tuple(key for key in din_12831_data.b_3_4_table_b_12_air_change_rate
+                             if key not in din_12831_data.air_change_rate_build_year_ranges)
+
+
+def defined_u_value_types(build_year: int) -> list:
+    # (be_type, be_sub_type) pairs with a Table B.15 value for the build year
+    build_year_range = din_12831_data.get_build_year_range_for_u_values(build_year)
+    return [(be_type, be_sub_type)
+            for be_type, sub_types in din_12831_data.b_4_3_table_b_15_u_values.items()
+            for be_sub_type, u_values in sub_types.items()
+            if u_values.get(build_year_range) is not None]
+
+
+def generate_building_element(rng: random.Random, build_year: int, u_value_types: list) -> dict:
+    if rng.random() < EXPLICIT_VALUE_SHARE:
+        u__k, be_type, be_sub_type = round(rng.uniform(0.15, 3.5), 2), None, None
+    else:
+        u__k, (be_type, be_sub_type) = None, rng.choice(u_value_types)
+
+    if rng.random() < EXPLICIT_VALUE_SHARE:
+        f__x, be_adjacent_to = rng.choice((1.0, 0.8, 0.5, 0.3)), None
+    else:
+        f__x, be_adjacent_to = None, rng.choice(tuple(din_12831_data.b_3_3_table_b_11_temperature_correction_factor))
+
+    return {
+        'a__k': round(rng.uniform(*A__K_RANGE), 2),
+        'u__k': u__k,
+        'f__x': f__x,
+        'be_adjacent_to': be_adjacent_to,
+        'be_type': be_type,
+        'be_sub_type': be_sub_type,
+    }
+
+
+def generate_building(rng: random.Random, n_elements: int = None) -> dict:
+    """
+    Draw one building dict, in the shape accepted by `Building`, from the keys and year ranges of the Annex tables.
+
+    Args:
+    - rng: Seeded random number generator.
+    - n_elements: Number of building elements, drawn from ELEMENTS_PER_BUILDING_RANGE if None.
+
+    Returns:
+    - Building input dict that passes validation.
+    """
+    build_year = rng.randint(*BUILD_YEARS)
+    u_value_types = defined_u_value_types(build_year)
+    theta__int_build = rng.choice((18, 20, 22)) if rng.random() < EXPLICIT_VALUE_SHARE else None
+    delta__utb = rng.choice((0.02, 0.05, 0.1, 0.15)) if rng.random() < EXPLICIT_VALUE_SHARE else None
+    n__build = rng.choice((0.25, 0.5, 1.0)) if rng.random() < EXPLICIT_VALUE_SHARE else None
+    n_elements = n_elements if n_elements is not None else rng.randint(*ELEMENTS_PER_BUILDING_RANGE)
+
+    return {
+        'build_year': build_year,
+        'theta__e': rng.choice(THETA__E_VALUES),
+        'v__build': round(rng.uniform(*V__BUILD_RANGE), 1),
+        'theta__int_build': theta__int_build,
+        'building_type': None if theta__int_build is not None else rng.choice(tuple(din_12831_data.b_4_2_table_b_14_building_temperature)),
+        'delta__utb': delta__utb,
+        'delta__utb_selection_criteria': None if delta__utb is not None else \
+            rng.choice(tuple(din_12831_data.b_2_1_table_b_1_additional_thermal_transmittance_for_thermal_bridges)),
+        'n__build': n__build,
+        'air_tightness_level': None if n__build is not None or rng.random() < 0.5 else rng.choice(AIR_TIGHTNESS_LEVELS),
+        'building_elements': [generate_building_element(rng, build_year, u_value_types) for _ in range(n_elements)],
+    }
+
+
+def generate_portfolio(n_buildings: int, seed: int = 0, n_elements: int = None):
+    """
+    Lazily generate a reproducible synthetic portfolio.
+
+    Yields:
+    - n_buildings building dicts; the same seed always yields the same buildings.
+    """
+    rng = random.Random(seed)
+    for _ in range(n_buildings):
+        yield generate_building(rng, n_elements)
+
+
+def generate_portfolio_columns(n_buildings: int, seed: int = 0, mean_elements: int = 15) -> dict:
+    """
+    Generate resolved columnar inputs for `calculate_portfolio` directly as arrays, for bulk sizes where building
+    dicts would not fit in memory.
+
+    Returns:
+    - Dict with the keyword arguments of calculate_portfolio.
+    """
+    rng = np.random.default_rng(seed)
+    n_elements = rng.integers(1, 2 * mean_elements, size=n_buildings)
+    building_index = np.repeat(np.arange(n_buildings), n_elements)
+    u_values = np.array([u_value for sub_types in din_12831_data.b_4_3_table_b_15_u_values.values()
+                         for u_values in sub_types.values() for u_value in u_values.values() if u_value is not None])
+    f_values = np.array(list(din_12831_data.b_3_3_table_b_11_temperature_correction_factor.values()), dtype=np.float64)
+    n_values = np.array(list(din_12831_data.b_3_4_table_b_12_air_change_rate.values()), dtype=np.float64)
+    return {
+        'a__k': rng.uniform(*A__K_RANGE, size=building_index.size),
+        'u__k': rng.choice(u_values, size=building_index.size),
+        'f__x': rng.choice(f_values, size=building_index.size),
+        'building_index': building_index,
+        'v__build': rng.uniform(*V__BUILD_RANGE, size=n_buildings),
+        'n__build': rng.choice(n_values, size=n_buildings),
+        'theta__int_build': rng.choice(np.array(list(din_12831_data.b_4_2_table_b_14_building_temperature.values()), dtype=np.float64), size=n_buildings),
+        'theta__e': rng.choice(np.array(THETA__E_VALUES, dtype=np.float64), size=n_buildings),
+        'delta__utb': rng.choice(np.array(list(din_12831_data.b_2_1_table_b_1_additional_thermal_transmittance_for_thermal_bridges.values())), size=n_buildings),
+    }
@@ -0,0 +1,155 @@
+import csv
+from dataclasses import dataclass
+
+import numpy as np
+
+
+DEFAULT_CHUNK_SIZE = 1024  # Buildings per chunk of hourly profiles; 1024 × 8760 hours × 8 bytes ≈ 72 MB
+
+
+@dataclass
+class AnnualSimulationResult:
+    annual_transmission_heat_demand: np.ndarray  # Per building, in kWh
+    annual_ventilation_heat_demand: np.ndarray  # Per building, in kWh
+    peak_heat_load: np.ndarray  # Per building, highest hourly heat demand of the series, in W
+    heating_hours: np.ndarray  # Per building, hours with a heat demand
+    full_load_hours: np.ndarray  # Per building, annual heat demand / design heat load, in h
+
+    @property
+    def annual_heat_demand(self) -> np.ndarray:
+        # Per building, in kWh
+        return self.annual_transmission_heat_demand + self.annual_ventilation_heat_demand
+
+
+def load_hourly_temperatures(path, column: str = None) -> np.ndarray:
+    """
+    Load an hourly outdoor temperature series, e.g. of a test reference year.
+
+    Args:
+    - path: .npy file with a 1-D array, or CSV file with one temperature per row. A CSV file may have a header
+      row; its temperatures are read from column, or from the last column if no column is given.
+    - column: Header of the temperature column of a CSV file.
+
+    Returns:
+    - Outdoor temperatures in °C, one per hour.
+    """
+    if str(path).endswith('.npy'):
+        theta__e_hourly = np.load(path)
+    else:
+        with open(path, newline='', encoding='utf-8') as file:
+            rows = [row for row in csv.reader(file) if row]
+        header = rows[0]
+        try:
+            float(header[-1])
+            has_header = False
+        except ValueError:
+            has_header = True
+        if column is not None and not has_header:
+            raise ValueError(f'{path} has no header row to find column {column!r} in.')
+        index = header.index(column) if column is not None else -1
+        theta__e_hourly = [float(row[index]) for row in (rows[1:] if has_header else rows)]
+
+    theta__e_hourly = np.asarray(theta__e_hourly, dtype=np.float64)
+    if theta__e_hourly.ndim != 1 or theta__e_hourly.size == 0:
+        raise ValueError(f'{path} must hold a one-dimensional series of hourly temperatures.')
+    if np.isnan(theta__e_hourly).any():
+        raise ValueError(f'{path} has missing hourly temperatures.')
+    return theta__e_hourly
+
+
+def _heating_threshold(theta__int_build: np.ndarray, heating_limit_temperature) -> np.ndarray:
+    # Outdoor temperature below which a building is heated: its internal temperature, or the heating limit if lower
+    if heating_limit_temperature is None:
+        return theta__int_build
+    return np.minimum(theta__int_build, np.asarray(heating_limit_temperature, dtype=np.float64))
+
+
+def simulate_annual_heat_demand(transmission_heat_loss_coefficient, ventilation_heat_loss_coefficient, theta__int_build,
+                                theta__e_hourly, design_heat_load=None,
+                                heating_limit_temperature=None) -> AnnualSimulationResult:
+    """
+    Annual heat demand of many buildings from an hourly outdoor temperature series.
+
+    The hourly heat demand of a building is its heat loss coefficient times (theta__int_build - theta__e) in every
+    hour with theta__e below its heating threshold (theta__int_build, or heating_limit_temperature if lower). Summed
+    over the year this is the heat loss coefficient times the degree hours below the threshold, which are read
+    from the cumulative sums of the sorted series: O((buildings + hours) log hours) instead of buildings × hours.
+
+    Args:
+    - transmission_heat_loss_coefficient (W/K), ventilation_heat_loss_coefficient (W/K), theta__int_build (°C):
+      Per building, e.g. from `Building` or `PortfolioResult`.
+    - theta__e_hourly (°C): Hourly outdoor temperatures, see load_hourly_temperatures.
+    - design_heat_load (W): Per building, for the full-load hours; defaults to the peak heat load of the series.
+    - heating_limit_temperature (°C): Optional outdoor temperature from which no heating is needed, scalar or
+      per building.
+
+    Returns:
+    - AnnualSimulationResult with per-building annual heat demand, peak load, heating hours and full-load hours.
+    """
+    transmission_heat_loss_coefficient = np.atleast_1d(np.asarray(transmission_heat_loss_coefficient, dtype=np.float64))
+    ventilation_heat_loss_coefficient = np.atleast_1d(np.asarray(ventilation_heat_loss_coefficient, dtype=np.float64))
+    theta__int_build = np.broadcast_to(np.asarray(theta__int_build, dtype=np.float64), transmission_heat_loss_coefficient.shape)
+    theta__e_hourly = np.asarray(theta__e_hourly, dtype=np.float64)
+
+    # Degree hours: Σ over hours with theta__e < threshold of (theta__int_build - theta__e), in K∙h
+    theta__e_sorted = np.sort(theta__e_hourly)
+    cumulative_theta__e = np.concatenate(([0.0], np.cumsum(theta__e_sorted)))
+    threshold = _heating_threshold(theta__int_build, heating_limit_temperature)
+    heating_hours = np.searchsorted(theta__e_sorted, threshold, side='left')
+    degree_hours = heating_hours * theta__int_build - cumulative_theta__e[heating_hours]
+
+    heat_loss_coefficient = transmission_heat_loss_coefficient + ventilation_heat_loss_coefficient
+    peak_heat_load = np.where(heating_hours > 0, heat_loss_coefficient * (theta__int_build - theta__e_sorted[0]), 0.0)
+    design_heat_load = peak_heat_load if design_heat_load is None else np.asarray(design_heat_load, dtype=np.float64)
+    annual_heat_demand = heat_loss_coefficient * degree_hours  # Wh
+    with np.errstate(divide='ignore', invalid='ignore'):
+        full_load_hours = np.where(design_heat_load > 0, annual_heat_demand / design_heat_load, 0.0)
+
+    return AnnualSimulationResult(
+        annual_transmission_heat_demand=transmission_heat_loss_coefficient * degree_hours / 1000,
+        annual_ventilation_heat_demand=ventilation_heat_loss_coefficient * degree_hours / 1000,
+        peak_heat_load=peak_heat_load,
+        heating_hours=heating_hours,
+        full_load_hours=full_load_hours,
+    )
+
+
+def iter_hourly_heat_demand(heat_loss_coefficient, theta__int_build, theta__e_hourly, heating_limit_temperature=None,
+                            chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Hourly heat demand profiles of many buildings, a chunk of buildings at a time, so memory stays bounded by
+    chunk_size × hours regardless of the number of buildings.
+
+    Args:
+    - heat_loss_coefficient (W/K), theta__int_build (°C): Per building.
+    - theta__e_hourly (°C): Hourly outdoor temperatures.
+    - heating_limit_temperature (°C): Optional outdoor temperature from which no heating is needed, scalar or
+      per building.
+    - chunk_size: Buildings per yielded chunk.
+
+    Yields:
+    - (start, profiles): Index of the first building of the chunk and its heat demand in W, [building, hour].
+    """
+    heat_loss_coefficient = np.atleast_1d(np.asarray(heat_loss_coefficient, dtype=np.float64))
+    theta__int_build = np.broadcast_to(np.asarray(theta__int_build, dtype=np.float64), heat_loss_coefficient.shape)
+    threshold = np.broadcast_to(_heating_threshold(theta__int_build, heating_limit_temperature), heat_loss_coefficient.shape)
+    theta__e_hourly = np.asarray(theta__e_hourly, dtype=np.float64)
+
+    for start in range(0, heat_loss_coefficient.shape[0], chunk_size):
+        stop = start + chunk_size
+        profiles = np.subtract.outer(theta__int_build[start:stop], theta__e_hourly)
+        profiles *= heat_loss_coefficient[start:stop, None]
+        profiles[theta__e_hourly >= threshold[start:stop, None]] = 0.0
+        yield start, profiles
+
+
+def simulate_buildings(buildings: list, theta__e_hourly, heating_limit_temperature=None) -> AnnualSimulationResult:
+    # simulate_annual_heat_demand for calculated `Building` objects, with full-load hours against their design heat load
+    return simulate_annual_heat_demand(
+        [building.building_transmission_heat_loss_coefficient for building in buildings],
+        [building.ventilation_heat_loss_coefficient for building in buildings],
+        [building.theta__int_build for building in buildings],
+        theta__e_hourly,
+        design_heat_load=[building.building_design_heat_load for building in buildings],
+        heating_limit_temperature=heating_limit_temperature,
+    )
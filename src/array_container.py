@@ -0,0 +1,94 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+
+# File layout: magic (8 bytes) | header length (uint64, little endian) | JSON header | arrays, each starting at a
+# multiple of ALIGNMENT so they can be memory-mapped as aligned NumPy arrays
+MAGIC = b'ONVAYO\x00\x01'
+ALIGNMENT = 64
+PREFIX = struct.Struct('<8sQ')
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def write_array_container(path, kind: str, version: int, metadata: dict, arrays: dict):
+    """
+    Write named NumPy arrays and JSON metadata into a self-describing binary file.
+
+    The file is written next to path and moved into place, so readers never see a partial file.
+
+    Args:
+    - path: Target file.
+    - kind: Type of content, checked on reading (e.g. 'din_12831_snapshot').
+    - version: Schema version of the content, for readers to stay compatible with older files.
+    - metadata: JSON-serializable dict stored in the header.
+    - arrays: Dict of name -> NumPy array (numeric dtypes only).
+    """
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    array_headers = {}
+    # Offsets are relative to the start of the data section, which follows the aligned header
+    offset = 0
+    for name, array in arrays.items():
+        if array.dtype.hasobject:
+            raise TypeError(f'Array {name} has an object dtype and cannot be stored.')
+        offset = _aligned(offset)
+        array_headers[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+
+    header = json.dumps({'kind': kind, 'version': version, 'metadata': metadata, 'arrays': array_headers}).encode()
+    data_start = _aligned(PREFIX.size + len(header))
+
+    temporary_path = f'{path}.tmp{os.getpid()}'
+    with open(temporary_path, 'wb') as file:
+        file.write(PREFIX.pack(MAGIC, len(header)))
+        file.write(header)
+        for name, array in arrays.items():
+            file.seek(data_start + array_headers[name]['offset'])
+            file.write(array.tobytes())
+        file.truncate(data_start + offset)
+    os.replace(temporary_path, path)
+
+
+def read_array_container(path, kind: str, mmap: bool = True):
+    """
+    Read a file written by write_array_container.
+
+    With mmap, the arrays are read-only views of a memory map of the file: opening costs only the header parse,
+    pages are loaded on first access and shared between all processes mapping the same file.
+
+    Args:
+    - path: File to read.
+    - kind: Expected type of content.
+    - mmap: Memory-map the arrays instead of reading them into memory.
+
+    Returns:
+    - (version, metadata, arrays): Schema version, metadata dict and dict of name -> NumPy array.
+    """
+    with open(path, 'rb') as file:
+        magic, header_length = PREFIX.unpack(file.read(PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not an array container file.')
+        header = json.loads(file.read(header_length))
+    if header['kind'] != kind:
+        raise ValueError(f"{path} holds {header['kind']!r}, not {kind!r}.")
+
+    data_start = _aligned(PREFIX.size + header_length)
+    if mmap:
+        buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    else:
+        with open(path, 'rb') as file:
+            buffer = np.frombuffer(file.read(), dtype=np.uint8)
+
+    arrays = {}
+    for name, array_header in header['arrays'].items():
+        dtype = np.dtype(array_header['dtype'])
+        shape = tuple(array_header['shape'])
+        start = data_start + array_header['offset']
+        nbytes = dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+        arrays[name] = buffer[start:start + nbytes].view(dtype).reshape(shape)
+    return header['version'], header['metadata'], arrays
@@ -0,0 +1,336 @@
+import argparse
+import json
+import sys
+from itertools import islice
+from time import perf_counter
+
+import numpy as np
+
+from src import batch_validation, instrumentation, location_index, parallel_runner
+from src.data import din_12831_compiled, din_12831_snapshot
+from src.portfolio_calculators import calculate_portfolio, resolve_portfolio_columns, resolve_portfolio_records
+from src.simplified_calculators import Building
+
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Errors raised by Building for invalid input records; any other error is a bug and stops the run
+RECORD_ERRORS = (ValueError, TypeError, KeyError)
+
+
+def iter_ndjson_lines(stream):
+    """
+    Lazily read a newline-delimited JSON stream.
+
+    Yields:
+    - (record_number, line) for each non-empty line, record_number being the 1-based line number.
+    """
+    for record_number, line in enumerate(stream, start=1):
+        if line.strip():
+            yield record_number, line
+
+
+def iter_chunks(items, chunk_size: int):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def building_result(building: Building) -> dict:
+    return {
+        'building_design_heat_load': building.building_design_heat_load,
+        'building_design_transmission_heat_loss': building.building_design_transmission_heat_loss,
+        'ventilation_heat_loss': building.ventilation_heat_loss,
+        'theta__e': building.theta__e,
+        'theta__int_build': building.theta__int_build,
+        'n__build': building.n__build,
+        'delta__utb': building.delta__utb,
+        'building_elements': [{
+            'u__k': element.u__k,
+            'f__x': element.f__x,
+            'design_transmission_loss': element.design_transmission_loss,
+        } for element in building.building_elements],
+    }
+
+
+def load_record(record) -> dict:
+    # record is either a building dict or a raw NDJSON line holding one
+    return json.loads(record) if isinstance(record, str) else record
+
+
+def calculate_record(data: dict) -> dict:
+    result = building_result(Building(data))
+    if 'id' in data:
+        result['id'] = data['id']
+    return result
+
+
+def portfolio_building_results(columns: dict, result) -> list:
+    # Result dicts in the shape of building_result, one per building of a calculate_portfolio run
+    n_elements = np.bincount(columns['building_index'], minlength=result.building_design_heat_load.shape[0])
+    element_ends = np.cumsum(n_elements).tolist()
+    element_results = [{'u__k': u__k, 'f__x': f__x, 'design_transmission_loss': design_transmission_loss}
+                       for u__k, f__x, design_transmission_loss in zip(
+                           columns['u__k'].tolist(), columns['f__x'].tolist(), result.element_design_transmission_loss.tolist())]
+    building_values = zip(result.building_design_heat_load.tolist(), result.building_design_transmission_heat_loss.tolist(),
+                          result.ventilation_heat_loss.tolist(), columns['theta__e'].tolist(), columns['theta__int_build'].tolist(),
+                          columns['n__build'].tolist(), columns['delta__utb'].tolist(), [0] + element_ends[:-1], element_ends)
+    return [{
+        'building_design_heat_load': heat_load,
+        'building_design_transmission_heat_loss': transmission_heat_loss,
+        'ventilation_heat_loss': ventilation_heat_loss,
+        'theta__e': theta__e,
+        'theta__int_build': theta__int_build,
+        'n__build': n__build,
+        'delta__utb': delta__utb,
+        'building_elements': element_results[start:end],
+    } for heat_load, transmission_heat_loss, ventilation_heat_loss, theta__e, theta__int_build, n__build, delta__utb, start, end in building_values]
+
+
+def _calculate_resolved(columns: dict) -> list:
+    # ('result', result dict) per building of resolved calculate_portfolio inputs
+    result = calculate_portfolio(**columns)
+    if not np.all(np.isfinite(result.building_design_heat_load)):
+        raise ValueError('An Annex table lookup yielded no value.')
+    stats = instrumentation.active
+    if stats is not None:
+        start = perf_counter()
+    outcomes = [('result', building_result) for building_result in portfolio_building_results(columns, result)]
+    if stats is not None:
+        stats.lap('result_assembly', start)
+    return outcomes
+
+
+def _calculate_valid_record(data: dict, tables) -> tuple:
+    try:
+        return _calculate_resolved(resolve_portfolio_records([data], tables))[0]
+    except RECORD_ERRORS as error:
+        return 'reject', {'error_type': type(error).__name__, 'error': str(error)}
+
+
+def calculate_records(records: list, tables=None) -> list:
+    """
+    Validate and calculate building records with the vectorized path: one batched theta__e resolution, one
+    validation pass, and one resolve_portfolio_columns/calculate_portfolio run for all valid records on the columns
+    the validation flattened them into.
+
+    Values are looked up in the compiled tables of this process (or tables), so a snapshot loaded with
+    din_12831_snapshot.use_snapshot applies to validation and results alike. Results equal those of `Building`,
+    which reads the same snapshot, or din_12831_data without one.
+
+    Args:
+    - records: List of building dicts.
+    - tables: Compiled Annex tables, defaults to din_12831_compiled.get_compiled_tables().
+
+    Returns:
+    - Per record, ('result', result dict) or ('reject', dict with error_type, error and optionally errors), in
+      input order. Errors in a single record never fail the other records.
+
+    With instrumentation enabled, the BATCH_STAGES of src.instrumentation are recorded.
+    """
+    stats = instrumentation.active
+    if stats is not None:
+        start = perf_counter()
+
+    # The validation columns hold table codes, so validation and calculation use the same tables
+    tables = tables if tables is not None else din_12831_compiled.get_compiled_tables()
+    # Records without theta__e get it from the location index, if one is set, in one batched query
+    records = location_index.fill_theta__e(records)
+    if stats is not None:
+        stats.lap('theta__e_fill', start)
+    report = batch_validation.validate_records(records, tables)
+    outcomes = [None] * len(records)
+    for index, errors in report.errors_by_record.items():
+        outcomes[index] = ('reject', {'error_type': 'ValidationError', 'error': errors[0].message, 'errors': [
+            {'element_index': error.element_index, 'field': error.field, 'message': error.message} for error in errors]})
+
+    valid = np.flatnonzero(report.valid).tolist()
+    try:
+        valid_outcomes = _calculate_resolved(resolve_portfolio_columns(*report.valid_columns(), tables)) if valid else []
+    except RECORD_ERRORS:
+        # A record passed validation but cannot be calculated; calculate the records one by one to isolate it
+        if stats is not None:
+            start = perf_counter()
+        valid_outcomes = [_calculate_valid_record(records[index], tables) for index in valid]
+        if stats is not None:
+            stats.lap('record_fallback', start)
+    for index, outcome in zip(valid, valid_outcomes):
+        outcomes[index] = outcome
+
+    for data, (_, value) in zip(records, outcomes):
+        if isinstance(data, dict) and 'id' in data:
+            value['id'] = data['id']
+    return outcomes
+
+
+def reject_for(record_number: int, data, error_type: str, error: str, **details) -> dict:
+    reject = {'record_number': record_number, 'error_type': error_type, 'error': error, **details}
+    if isinstance(data, dict) and 'id' in data:
+        reject['id'] = data['id']
+    return reject
+
+
+def calculate_chunk(chunk: list):
+    """
+    Calculate one chunk of building records.
+
+    The chunk is validated in one pass first, so a rejected record lists all of its errors, and the valid records
+    are calculated together, see calculate_records.
+
+    Args:
+    - chunk: List of (record_number, record) pairs, record being a building dict or an NDJSON line.
+
+    Returns:
+    - (results, rejects): Result dicts of the valid records and reject dicts with the reason for the invalid ones,
+      both in input order.
+    """
+    results, rejects = [], []
+    loaded = []
+    for record_number, record in chunk:
+        try:
+            loaded.append((record_number, load_record(record)))
+        except RECORD_ERRORS as error:
+            rejects.append(reject_for(record_number, None, type(error).__name__, str(error)))
+
+    outcomes = calculate_records([data for _, data in loaded])
+    for (record_number, data), (outcome, value) in zip(loaded, outcomes):
+        if outcome == 'result':
+            results.append({'record_number': record_number, **value})
+        else:
+            rejects.append(reject_for(record_number, data, **value))
+
+    rejects.sort(key=lambda reject: reject['record_number'])
+    return results, rejects
+
+
+def count_chunk_results(chunk_result: tuple) -> int:
+    # Buildings calculated in a (results, rejects) chunk result, for parallel_runner.ThroughputReport
+    return len(chunk_result[0])
+
+
+def calculate_chunk_as_ndjson(chunk: list):
+    # Like calculate_chunk, but encodes the results in the worker, so a parallel run does not serialize
+    # every result in the parent process
+    results, rejects = calculate_chunk(chunk)
+    return [json.dumps(result) for result in results], [json.dumps(reject) for reject in rejects]
+
+
+def calculate_ndjson(stream, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Calculate the buildings of an NDJSON stream in chunks of chunk_size records.
+
+    Only one chunk is held in memory at a time, regardless of the size of the stream.
+
+    Yields:
+    - (results, rejects) per chunk, see calculate_chunk.
+    """
+    for chunk in iter_chunks(iter_ndjson_lines(stream), chunk_size):
+        yield calculate_chunk(chunk)
+
+
+def calculate_ndjson_parallel(stream, chunk_size: int = DEFAULT_CHUNK_SIZE, max_workers: int = None,
+                              report: parallel_runner.ThroughputReport = None):
+    """
+    Like calculate_ndjson, but the chunks are calculated in a pool of max_workers processes.
+
+    Yields:
+    - (results, rejects) per chunk, in input order.
+    """
+    return parallel_runner.map_chunks_parallel(
+        calculate_chunk, iter_chunks(iter_ndjson_lines(stream), chunk_size), max_workers=max_workers, report=report,
+        count_results=count_chunk_results)
+
+
+def write_ndjson(stream, items):
+    for item in items:
+        stream.write(item if isinstance(item, str) else json.dumps(item))
+        stream.write('\n')
+
+
+def write_chunk_results(chunk_results, output_stream, reject_stream=None):
+    # Results and rejects are dicts or already encoded NDJSON lines
+    counts = {'results': 0, 'rejects': 0}
+    for results, rejects in chunk_results:
+        write_ndjson(output_stream, results)
+        if reject_stream is not None:
+            write_ndjson(reject_stream, rejects)
+        counts['results'] += len(results)
+        counts['rejects'] += len(rejects)
+    return counts
+
+
+def run_ndjson_batch(input_stream, output_stream, reject_stream=None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     max_workers: int = None, report: parallel_runner.ThroughputReport = None, snapshot_path=None,
+                     location_index_path=None) -> dict:
+    """
+    Calculate every building of an NDJSON input stream and write the results as NDJSON.
+
+    Args:
+    - input_stream: Text stream with one building dict per line, in the shape accepted by `Building`.
+    - output_stream: Text stream the results are written to, one line per valid record.
+    - reject_stream: Optional text stream the rejected records are written to, with the reason.
+    - chunk_size: Number of records read and calculated at a time.
+    - max_workers: If given, chunks are calculated in a pool of this many processes, see calculate_ndjson_parallel.
+    - report: Optional ThroughputReport filled in by a parallel run.
+    - snapshot_path: Optional snapshot of the compiled tables (din_12831_snapshot) to validate and calculate the records with.
+    - location_index_path: Optional location index (location_index) to resolve a missing theta__e with.
+
+    Returns:
+    - Dict with the number of results and rejects written.
+    """
+    if max_workers:
+        chunk_results = parallel_runner.map_chunks_parallel(
+            calculate_chunk_as_ndjson, iter_chunks(iter_ndjson_lines(input_stream), chunk_size),
+            max_workers=max_workers, report=report, snapshot_path=snapshot_path, location_index_path=location_index_path,
+            count_results=count_chunk_results)
+    else:
+        if snapshot_path is not None:
+            din_12831_snapshot.use_snapshot(snapshot_path)
+        if location_index_path is not None:
+            location_index.use_location_index(location_index_path)
+        chunk_results = calculate_ndjson(input_stream, chunk_size)
+    return write_chunk_results(chunk_results, output_stream, reject_stream)
+
+
+def open_text(path: str, mode: str, default):
+    if path == '-':
+        return default
+    return open(path, mode, encoding='utf-8')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Calculate the design heat load of every building in an NDJSON file.')
+    parser.add_argument('input', help="NDJSON file with one building per line, '-' for stdin")
+    parser.add_argument('output', help="NDJSON file the results are written to, '-' for stdout")
+    parser.add_argument('--rejects', help='NDJSON file the rejected records are written to; rejects are dropped if omitted')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Number of records calculated at a time')
+    parser.add_argument('--workers', type=int, help='Calculate chunks in a pool of this many processes')
+    parser.add_argument('--snapshot', help='Snapshot of the compiled Annex tables, see src.data.din_12831_snapshot')
+    parser.add_argument('--locations', help='Location table (CSV or .npz) to resolve theta__e of records without it, see src.location_index')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    input_stream = open_text(args.input, 'r', sys.stdin)
+    output_stream = open_text(args.output, 'w', sys.stdout)
+    reject_stream = open_text(args.rejects, 'w', sys.stderr) if args.rejects else None
+    report = parallel_runner.ThroughputReport() if args.workers else None
+    try:
+        counts = run_ndjson_batch(input_stream, output_stream, reject_stream, args.chunk_size, args.workers, report,
+                                  args.snapshot, args.locations)
+    finally:
+        for stream in (input_stream, output_stream, reject_stream):
+            if stream is not None and stream not in (sys.stdin, sys.stdout, sys.stderr):
+                stream.close()
+    print(f"{counts['results']} buildings calculated, {counts['rejects']} rejected", file=sys.stderr)
+    if report is not None:
+        print(report.format(), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
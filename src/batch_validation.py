@@ -0,0 +1,309 @@
+import operator
+from dataclasses import asdict, dataclass
+from itertools import compress, repeat
+from time import perf_counter
+
+import numpy as np
+
+from src import instrumentation, location_index
+from src.data import din_12831_compiled, din_12831_data
+from src.data.din_12831_compiled import NOT_DEFINED
+from src.portfolio_calculators import ELEMENT_NUMBER_FIELDS, RECORD_NAME_FIELDS, RECORD_NUMBER_FIELDS, encode_element_names
+
+
+RECORD_FIELDS = ('build_year', 'v__build', 'theta__e', 'theta__int_build', 'building_type', 'delta__utb',
+                 'delta__utb_selection_criteria', 'n__build', 'air_tightness_level', 'postcode', 'latitude', 'longitude')
+ELEMENT_FIELDS = ('a__k', 'u__k', 'f__x', 'be_adjacent_to', 'be_type', 'be_sub_type')
+# Types of the values of a column that np.array converts to float64 as _numbers does, None becoming NaN
+NUMBER_OR_NONE_TYPES = {int, float, bool, type(None)}
+
+
+@dataclass
+class ValidationError:
+    record_index: int  # Position of the record in the validated batch
+    element_index: int  # Position of the element in building_elements, None for record-level errors
+    field: str
+    message: str
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class ValidationReport:
+    """
+    All validation errors of a batch of building records, and the columns the records were flattened into.
+    """
+    def __init__(self, n_records: int, errors: list, columns: dict = None, record_index=None, element_rows=None):
+        """
+        Args:
+        - n_records: Number of validated records.
+        - errors: ValidationError of all records.
+        - columns: Columns of the dict records, see valid_columns.
+        - record_index: Per row of the record columns, the position of its record in the batch.
+        - element_rows: Per row of the element columns, the row of its record in the record columns.
+        """
+        self.n_records = n_records
+        self.columns = columns
+        self.record_index = record_index
+        self.element_rows = element_rows
+        self.errors = sorted(errors, key=lambda error: (error.record_index, error.element_index is not None, error.element_index or 0))
+        self.errors_by_record = {}
+        for error in self.errors:
+            self.errors_by_record.setdefault(error.record_index, []).append(error)
+        self.valid = np.ones(n_records, dtype=bool)
+        self.valid[list(self.errors_by_record)] = False
+
+
+    def is_valid(self, record_index: int) -> bool:
+        return bool(self.valid[record_index])
+
+
+    def valid_records(self, records: list) -> list:
+        return [record for record, valid in zip(records, self.valid) if valid]
+
+
+    def as_dicts(self) -> list:
+        return [error.as_dict() for error in self.errors]
+
+
+    def valid_columns(self) -> tuple:
+        """
+        Columns of the valid records, so they can be calculated without flattening them again.
+
+        Returns:
+        - (columns, building_index), as accepted by portfolio_calculators.resolve_portfolio_columns, with the records
+          in input order.
+        """
+        valid_rows = self.valid[self.record_index]
+        valid_elements = valid_rows[self.element_rows]
+        building_index = (np.cumsum(valid_rows) - 1)[self.element_rows[valid_elements]]
+        if valid_rows.all():
+            return dict(self.columns), building_index
+        columns = {}
+        for name, column in self.columns.items():
+            mask = valid_rows if name in RECORD_NUMBER_FIELDS or name in RECORD_NAME_FIELDS else valid_elements
+            columns[name] = column[mask] if isinstance(column, np.ndarray) else list(compress(column, mask.tolist()))
+        return columns, building_index
+
+
+def _is_number(value) -> bool:
+    # As in Building, bools are ints
+    return isinstance(value, (int, float))
+
+
+def _numbers(values: list, is_none: np.ndarray = None) -> np.ndarray:
+    # Numbers as float64, anything else (None, strings, ...) as NaN. With the None mask of the values, only the
+    # given values are converted, which is faster for the mostly missing values of fields looked up in the tables.
+    if is_none is not None and is_none.any():
+        numbers = np.full(len(values), np.nan)
+        given = ~is_none
+        numbers[given] = _numbers(list(compress(values, given.tolist())))
+        return numbers
+    if set(map(type, values)) <= NUMBER_OR_NONE_TYPES:
+        return np.array(values, dtype=np.float64)
+    return np.array([value if _is_number(value) else np.nan for value in values], dtype=np.float64)
+
+
+def _non_finite(values: list, numbers: np.ndarray, is_none: np.ndarray = None) -> np.ndarray:
+    # Given numbers that are infinite or NaN. Values that are not numbers are NaN in numbers as well, so only the NaN
+    # rows are checked one by one.
+    non_finite = np.isinf(numbers)
+    nan = np.isnan(numbers)
+    if is_none is not None:
+        nan &= ~is_none
+    rows = np.flatnonzero(nan)
+    non_finite[rows] = [_is_number(values[row]) for row in rows.tolist()]
+    return non_finite
+
+
+def _is_none(values: list, codes: np.ndarray = None) -> np.ndarray:
+    # With the table codes of the values, only values without a code are checked, as None is never a table name
+    if codes is None:
+        return np.fromiter(map(operator.is_, values, repeat(None)), dtype=bool, count=len(values))
+    is_none = np.zeros(len(values), dtype=bool)
+    rows = np.flatnonzero(codes == NOT_DEFINED)
+    is_none[rows] = [values[row] is None for row in rows.tolist()]
+    return is_none
+
+
+def _column(dicts: list, name: str) -> list:
+    # Values of name in each dict, None where it is missing
+    return list(map(dict.get, dicts, repeat(name)))
+
+
+def _errors(mask, field: str, message: str, record_index, element_index=None) -> list:
+    return [ValidationError(int(record_index[row]), None if element_index is None else int(element_index[row]), field, message)
+            for row in np.flatnonzero(mask)]
+
+
+def validate_records(records: list, tables: din_12831_compiled.CompiledTables = None) -> ValidationReport:
+    """
+    Validate a batch of building records, in the shape accepted by `Building`, in one pass.
+
+    Applies the checks of `Building` and `BuildingElement`, and in addition checks that every value that will be
+    looked up in an Annex table is a key of that table, and that Table B.15 has a U-value for the build year range.
+    Unlike `Building`, every error of every record and element is reported, and infinite or NaN numbers are rejected.
+
+    Args:
+    - records: List of building dicts.
+    - tables: Compiled Annex tables, defaults to din_12831_compiled.get_compiled_tables().
+
+    Returns:
+    - ValidationReport with the errors per record and element.
+    """
+    stats = instrumentation.active
+    if stats is not None:
+        start = perf_counter()
+
+    tables = tables if tables is not None else din_12831_compiled.get_compiled_tables()
+    errors = []
+
+    # Flatten the records into columns; this is the only per-record Python loop
+    record_index, element_rows, element_index = [], [], []
+    record_dicts = []
+    n_elements = []
+    element_records = []
+
+    for index, data in enumerate(records):
+        if not isinstance(data, dict):
+            errors.append(ValidationError(index, None, 'record', 'Building record must be a dict.'))
+            continue
+        record_index.append(index)
+        record_dicts.append(data)
+        elements = data.get('building_elements')
+        # -1 marks a building_elements value that is not a list, which is reported here rather than as missing
+        n_elements.append(len(elements) if isinstance(elements, list) else 0 if elements is None else -1)
+        if elements is not None and not isinstance(elements, list):
+            errors.append(ValidationError(index, None, 'building_elements', 'building_elements must be a list.'))
+            continue
+        if not elements:
+            continue
+        if all(map(isinstance, elements, repeat(dict))):
+            positions = range(len(elements))
+        else:
+            positions = [position for position, element in enumerate(elements) if isinstance(element, dict)]
+            errors += [ValidationError(index, position, 'building_element', 'Building element must be a dict.')
+                       for position, element in enumerate(elements) if not isinstance(element, dict)]
+            elements = [elements[position] for position in positions]
+        element_records += elements
+        element_rows += [len(record_dicts) - 1] * len(positions)
+        element_index += positions
+
+    # Record and element columns, one pass per field
+    record_columns = {name: _column(record_dicts, name) for name in RECORD_FIELDS}
+    element_columns = {name: _column(element_records, name) for name in ELEMENT_FIELDS}
+
+    record_index = np.array(record_index, dtype=np.intp)
+    is_none = {name: _is_none(column) for name, column in record_columns.items()}
+    has_key = {name: np.fromiter(map(dict.__contains__, record_dicts, repeat(name)), dtype=bool, count=len(record_dicts))
+               for name in ('build_year', 'delta__utb', 'delta__utb_selection_criteria')}
+
+    # Record-level checks, as in Building
+    build_year_is_int = np.array([isinstance(value, int) for value in record_columns['build_year']], dtype=bool)
+    errors += _errors(~has_key['build_year'], 'build_year', 'No value provided for build_year.', record_index)
+    errors += _errors(has_key['build_year'] & ~build_year_is_int, 'build_year', 'build_year should be of type int', record_index)
+
+    numbers = {'build_year': _numbers(record_columns['build_year'])}
+    v__build = numbers['v__build'] = _numbers(record_columns['v__build'])
+    non_finite = {'v__build': _non_finite(record_columns['v__build'], v__build, is_none['v__build'])}
+    errors += _errors(~(v__build > 0) & ~non_finite['v__build'], 'v__build', 'Volume of building element, v__build, cannot be zero or negative.', record_index)
+
+    theta__e = numbers['theta__e'] = _numbers(record_columns['theta__e'], is_none['theta__e'])
+    non_finite['theta__e'] = _non_finite(record_columns['theta__e'], theta__e, is_none['theta__e'])
+    index = location_index.get_default_index()
+    missing_theta__e = np.flatnonzero(is_none['theta__e'])
+    if index is not None and missing_theta__e.shape[0]:
+        # Like Building, resolve a missing theta__e from the postcode or coordinates, in one batched query
+        theta__e[missing_theta__e] = index.resolve_many(*[[record_columns[name][row] for row in missing_theta__e]
+                                                          for name in ('postcode', 'latitude', 'longitude')])
+    errors += _errors(np.isnan(theta__e) & ~non_finite['theta__e'], 'theta__e', 'No value provided for theta__e, the external mean design temperature.', record_index)
+
+    for name in ('theta__int_build', 'delta__utb', 'n__build'):
+        values = numbers[name] = _numbers(record_columns[name], is_none[name])
+        non_finite[name] = _non_finite(record_columns[name], values, is_none[name])
+        errors += _errors(~is_none[name] & np.isnan(values) & ~non_finite[name], name, f'{name} must be a number.', record_index)
+    for name in ('v__build', 'theta__e', 'theta__int_build', 'delta__utb', 'n__build'):
+        errors += _errors(non_finite[name], name, f'{name} must be a finite number.', record_index)
+
+    errors += _errors(is_none['theta__int_build'] & is_none['building_type'], 'theta__int_build',
+                      'No value provided for theta__int_build or building type. If no value is provided for theta__int_build, a value must be provided for building type.',
+                      record_index)
+    errors += _errors(np.array(n_elements, dtype=np.intp) == 0, 'building_elements', 'No building elements provided.', record_index)
+    errors += _errors(~has_key['delta__utb'] & ~has_key['delta__utb_selection_criteria'], 'delta__utb',
+                      "If delta__utb is not provided in the data, delta__utb_selection_criteria must be included.", record_index)
+
+    # Record-level Annex table membership, only where the value will be looked up. A name that is not in a table
+    # still resolves if the table has a blanket override (snapshots write it into the NOT_DEFINED slot as well).
+    if din_12831_compiled.national_value(tables, din_12831_data.a_4_2_internal_design_temperature) is None:
+        building_type_codes = din_12831_compiled.encode_names(tables.building_temperature_codes, record_columns['building_type'])
+        errors += _errors(is_none['theta__int_build'] & ~is_none['building_type'] & (building_type_codes == NOT_DEFINED)
+                          & np.isnan(tables.building_temperature_values[building_type_codes]),
+                          'building_type', 'building_type is not a building type of Table B.14.', record_index)
+    if din_12831_compiled.national_value(tables, din_12831_data.a_3_2_simplified_thermal_bridges) is None:
+        selection_criteria_codes = din_12831_compiled.encode_names(tables.thermal_bridge_codes, record_columns['delta__utb_selection_criteria'])
+        errors += _errors(is_none['delta__utb'] & ~is_none['delta__utb_selection_criteria'] & (selection_criteria_codes == NOT_DEFINED)
+                          & np.isnan(tables.thermal_bridge_values[selection_criteria_codes]),
+                          'delta__utb_selection_criteria', 'delta__utb_selection_criteria is not a selection criterion of Table B.1.', record_index)
+    if din_12831_compiled.national_value(tables, din_12831_data.a_3_4_simplified_air_change_rate) is None:
+        air_tightness_codes = din_12831_compiled.encode_names(tables.air_change_rate_codes, record_columns['air_tightness_level'])
+        errors += _errors(is_none['n__build'] & ~is_none['air_tightness_level'] & (air_tightness_codes == NOT_DEFINED)
+                          & np.isnan(tables.air_change_rate_values[air_tightness_codes]),
+                          'air_tightness_level', 'air_tightness_level is not an air tightness level of Table B.12.', record_index)
+
+    # Element-level checks, as in BuildingElement
+    element_rows = np.array(element_rows, dtype=np.intp)
+    element_record_index = record_index[element_rows]
+    element_index = np.array(element_index, dtype=np.intp)
+    element_codes = encode_element_names(tables, element_columns['be_type'], element_columns['be_sub_type'], element_columns['be_adjacent_to'])
+    element_is_none = {name: _is_none(element_columns[name]) for name in ('u__k', 'f__x')}
+    for name, codes in (('be_type', 'be_type_codes'), ('be_sub_type', 'be_sub_type_codes'), ('be_adjacent_to', 'adjacency_codes')):
+        element_is_none[name] = _is_none(element_columns[name], element_codes[codes])
+
+    a__k = numbers['a__k'] = _numbers(element_columns['a__k'])
+    element_non_finite = {'a__k': _non_finite(element_columns['a__k'], a__k)}
+    errors += _errors(~(a__k > 0) & ~element_non_finite['a__k'], 'a__k', 'Area of building element, a__k, cannot be zero or negative.',
+                      element_record_index, element_index)
+    for name in ('u__k', 'f__x'):
+        values = numbers[name] = _numbers(element_columns[name], element_is_none[name])
+        element_non_finite[name] = _non_finite(element_columns[name], values, element_is_none[name])
+        errors += _errors(~element_is_none[name] & np.isnan(values) & ~element_non_finite[name], name, f'{name} must be a number.',
+                          element_record_index, element_index)
+    for name in ('a__k', 'u__k', 'f__x'):
+        errors += _errors(element_non_finite[name], name, f'{name} must be a finite number.', element_record_index, element_index)
+
+    u__k_missing_types = element_is_none['u__k'] & (element_is_none['be_type'] | element_is_none['be_sub_type'])
+    errors += _errors(u__k_missing_types, 'u__k',
+                      'No value provided for u__k or building element type/sub-type. If no value is provided for u__k, values must be provided for building element type and sub-type.',
+                      element_record_index, element_index)
+    f__x_missing_adjacency = element_is_none['f__x'] & element_is_none['be_adjacent_to']
+    errors += _errors(f__x_missing_adjacency, 'f__x',
+                      'No value provided for f__x or be_adjacent_to. If no value is provided for f__x, value must be provided for be_adjacent_to.',
+                      element_record_index, element_index)
+
+    # Element-level Annex table membership; the codes are kept for resolve_portfolio_columns
+    if din_12831_compiled.national_value(tables, din_12831_data.a_4_3_simplified_u_value) is None and element_record_index.size:
+        be_type_codes, be_sub_type_codes = element_codes['be_type_codes'], element_codes['be_sub_type_codes']
+        build_years = np.where(build_year_is_int, numbers['build_year'], -1)[element_rows]
+        build_year_range_codes = np.where(build_years >= 0, tables.encode_u_value_build_year_ranges(build_years), NOT_DEFINED)
+        u_values = tables.lookup_u_values(be_type_codes, be_sub_type_codes, build_year_range_codes)
+        looked_up = element_is_none['u__k'] & ~u__k_missing_types & np.isnan(u_values)
+        errors += _errors(looked_up & (be_type_codes == NOT_DEFINED), 'be_type',
+                          'be_type is not a building element type of Table B.15.', element_record_index, element_index)
+        errors += _errors(looked_up & (be_type_codes != NOT_DEFINED) & (be_sub_type_codes == NOT_DEFINED), 'be_sub_type',
+                          'be_sub_type is not a sub-type of be_type in Table B.15.', element_record_index, element_index)
+        errors += _errors(looked_up & (be_sub_type_codes != NOT_DEFINED) & (build_year_range_codes != NOT_DEFINED), 'u__k',
+                          'Table B.15 defines no U-value for be_type/be_sub_type in the build year range of build_year; u__k must be provided.',
+                          element_record_index, element_index)
+    if din_12831_compiled.national_value(tables, din_12831_data.a_3_3_temperature_correction_factor) is None:
+        adjacency_codes = element_codes['adjacency_codes']
+        errors += _errors(element_is_none['f__x'] & ~element_is_none['be_adjacent_to'] & (adjacency_codes == NOT_DEFINED)
+                          & np.isnan(tables.temperature_correction_values[adjacency_codes]), 'be_adjacent_to',
+                          'be_adjacent_to is not an adjacency of Table B.11.', element_record_index, element_index)
+
+    columns = {name: numbers[name] for name in RECORD_NUMBER_FIELDS + ELEMENT_NUMBER_FIELDS}
+    columns.update({name: record_columns[name] for name in RECORD_NAME_FIELDS})
+    columns.update(element_codes)
+    report = ValidationReport(len(records), errors, columns, record_index, element_rows)
+    if stats is not None:
+        stats.lap('batch_validation', start)
+    return report
@@ -0,0 +1,190 @@
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from src import location_index
+from src.data import din_12831_compiled, din_12831_data
+from src.simplified_calculators import Building
+
+
+class LRUCache:
+    """
+    Bounded least-recently-used cache with an optional time to live, counting hits, misses and evictions.
+    """
+    def __init__(self, maxsize: int, ttl: float = None, clock=time.monotonic):
+        if maxsize < 1:
+            raise ValueError('maxsize must be at least 1.')
+        self.maxsize = maxsize
+        self.ttl = ttl  # Seconds an entry stays valid, None for no expiry
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (value, expires_at)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= self.clock():
+            del self.entries[key]
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+
+    def put(self, key, value):
+        self.entries[key] = (value, self.clock() + self.ttl if self.ttl is not None else None)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+
+    def clear(self):
+        self.entries.clear()
+
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+    def stats(self) -> dict:
+        return {'size': len(self.entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'expirations': self.expirations}
+
+
+def _json_value(value):
+    # NumPy scalars and arrays as the Python values Building treats them as
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def building_cache_key(data: dict) -> str:
+    # Canonical hash of the input dict: independent of key order, but keeps the difference between a missing key
+    # and a None value, which Building treats differently. None for dicts that cannot be serialized, which are
+    # calculated without the cache
+    try:
+        serialized = json.dumps(data, sort_keys=True, separators=(',', ':'), default=_json_value)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+def element_cache_key(element_data: dict, build_year: int) -> tuple:
+    # Everything the resolved u__k and f__x of an element depend on. build_year only matters for a u__k looked up in
+    # Table B.15, and only through its build year range. None for elements with unhashable values (e.g. lists from
+    # JSON), which are calculated without the cache
+    u__k = element_data.get('u__k')
+    if u__k is not None:
+        build_year = None
+    elif isinstance(build_year, int):
+        build_year = din_12831_data.get_build_year_range_for_u_values(build_year)
+    key = (u__k, element_data.get('be_type'), element_data.get('be_sub_type'), build_year,
+           element_data.get('f__x'), element_data.get('be_adjacent_to'))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+class BuildingCache:
+    """
+    Cache in front of `Building` for repeated calculation requests.
+
+    Whole buildings are cached by a canonical hash of the input dict. On a miss, the resolved u__k/f__x of elements
+    seen before (in any building) are reused, so near-duplicate buildings skip most Annex lookups.
+
+    Both caches are cleared when the Annex tables or national Annex A values in din_12831_data change, or when
+    another snapshot of the tables is put in use (din_12831_snapshot.use_snapshot). By default
+    the tables are compared with a copy of them on every call; a table_check_interval in seconds checks them at
+    most that often instead. invalidate() clears the caches explicitly.
+
+    Cached Building objects are shared between callers and must be treated as read-only.
+    """
+    def __init__(self, maxsize: int = 1024, ttl: float = None, element_maxsize: int = 16384,
+                 table_check_interval: float = 0, clock=time.monotonic):
+        self.buildings = LRUCache(maxsize, ttl, clock)
+        self.elements = LRUCache(element_maxsize, ttl, clock)
+        self.table_check_interval = table_check_interval
+        self.clock = clock
+        self.tables_state = copy.deepcopy(din_12831_data.annex_tables_state())
+        self.snapshot_tables = din_12831_compiled.get_snapshot_tables()
+        self.tables_checked_at = clock()
+        self.invalidations = 0
+
+
+    def invalidate(self):
+        self.buildings.clear()
+        self.elements.clear()
+        self.tables_state = copy.deepcopy(din_12831_data.annex_tables_state())
+        self.snapshot_tables = din_12831_compiled.get_snapshot_tables()
+        self.tables_checked_at = self.clock()
+        self.invalidations += 1
+
+
+    def check_tables(self):
+        now = self.clock()
+        if now - self.tables_checked_at < self.table_check_interval:
+            return
+        self.tables_checked_at = now
+        if din_12831_compiled.get_snapshot_tables() is not self.snapshot_tables \
+                or din_12831_data.annex_tables_state() != self.tables_state:
+            self.invalidate()
+
+
+    def get_building(self, data: dict, compact: bool = False) -> Building:
+        self.check_tables()
+        if data.get('theta__e') is None:
+            # Key on the theta__e the location index resolves, so a changed index does not return stale buildings
+            data = location_index.fill_theta__e([data])[0]
+        data_key = building_cache_key(data)
+        if data_key is None:
+            self.buildings.misses += 1
+            return self.calculate_building(data, compact)
+        key = (data_key, compact)
+        building = self.buildings.get(key)
+        if building is None:
+            building = self.calculate_building(data, compact)
+            self.buildings.put(key, building)
+        return building
+
+
+    def calculate_building(self, data: dict, compact: bool = False) -> Building:
+        build_year = data.get('build_year')
+        elements_data = data.get('building_elements') or []
+        element_keys = [element_cache_key(element_data, build_year) for element_data in elements_data]
+
+        # Fill in the u__k/f__x resolved for identical elements before; Building then skips their lookups
+        resolved_elements_data = []
+        for element_data, element_key in zip(elements_data, element_keys):
+            if element_key is None:
+                self.elements.misses += 1
+                resolved = None
+            else:
+                resolved = self.elements.get(element_key)
+            if resolved is not None:
+                element_data = {**element_data, 'u__k': resolved[0], 'f__x': resolved[1]}
+            resolved_elements_data.append(element_data)
+
+        building = Building({**data, 'building_elements': resolved_elements_data}, compact)
+
+        for element, element_key in zip(building.building_elements, element_keys):
+            if element_key is not None:
+                self.elements.put(element_key, (element.u__k, element.f__x))
+        return building
+
+
+    def stats(self) -> dict:
+        return {'buildings': self.buildings.stats(), 'elements': self.elements.stats(), 'invalidations': self.invalidations}
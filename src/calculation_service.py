@@ -0,0 +1,438 @@
+import argparse
+import asyncio
+import json
+import math
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from src import location_index, parallel_runner
+from src.data import din_12831_snapshot
+from src.batch_runner import RECORD_ERRORS, calculate_record, calculate_records
+
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_MAX_DELAY = 0.005  # Seconds the first request of a batch waits for more requests
+DEFAULT_MAX_QUEUE_SIZE = 1024
+DEFAULT_MAX_BATCHES_IN_FLIGHT = 2
+LATENCY_WINDOW = 10000  # Latest request latencies the percentiles are computed from
+
+
+class ServiceOverloaded(Exception):
+    # The request queue is full; the client should retry later
+    pass
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class RequestRejected(Exception):
+    # The building record is invalid; reject holds the reason as reported by the batch runner
+    def __init__(self, reject: dict):
+        super().__init__(reject['error'])
+        self.reject = reject
+
+
+def calculate_batch(records: list) -> list:
+    """
+    Calculate a micro-batch of building records with batch_runner.calculate_records: one validation pass, one
+    batched theta__e resolution and one vectorized calculation for all valid records. An invalid record is rejected
+    on its own and never fails the other requests of its batch.
+
+    Module-level, so it can run in the process pool of the service.
+
+    Returns:
+    - Per record, ('result', result dict) or ('reject', reject dict), in input order.
+    """
+    return calculate_records(records)
+
+
+class ServiceMetrics:
+    """
+    Request counters, batch sizes and a sliding window of request latencies (queueing + calculation).
+    """
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started_at = clock()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counts = {'completed': 0, 'rejected': 0, 'expired': 0, 'overloaded': 0, 'batches': 0, 'batched_requests': 0}
+
+
+    def record_batch(self, size: int):
+        self.counts['batches'] += 1
+        self.counts['batched_requests'] += size
+
+
+    def record_request(self, outcome: str, latency: float = None):
+        self.counts[outcome] += 1
+        if latency is not None:
+            self.latencies.append(latency)
+
+
+    def snapshot(self, queue_depth: int = 0) -> dict:
+        elapsed = self.clock() - self.started_at
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            **self.counts,
+            'queue_depth': queue_depth,
+            'uptime_seconds': elapsed,
+            'throughput_per_second': self.counts['completed'] / elapsed if elapsed > 0 else 0.0,
+            'mean_batch_size': self.counts['batched_requests'] / self.counts['batches'] if self.counts['batches'] else 0.0,
+            'latency_p50_ms': float(np.percentile(latencies, 50)) * 1000,
+            'latency_p99_ms': float(np.percentile(latencies, 99)) * 1000,
+        }
+
+
+class CalculationService:
+    """
+    Asynchronous front of the batch calculation path.
+
+    Requests are queued and flushed as one micro-batch to calculate_batch when batch_size requests are waiting or
+    the first waiting request is max_delay seconds old. Batches run in a process pool, so the event loop keeps
+    accepting requests while they are calculated; at most max_batches_in_flight batches run at a time. A full
+    queue rejects new requests with ServiceOverloaded (backpressure), and requests whose deadline passes while
+    queued are dropped.
+
+    Usage:
+        async with CalculationService() as service:
+            result = await service.calculate(data, timeout=0.5)
+    """
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, max_delay: float = DEFAULT_MAX_DELAY,
+                 max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE, executor=None, inline: bool = False,
+                 max_batches_in_flight: int = DEFAULT_MAX_BATCHES_IN_FLIGHT, default_timeout: float = None,
+                 snapshot_path=None, location_index_path=None):
+        """
+        Args:
+        - batch_size: Maximum requests per batch.
+        - max_delay: Seconds a request waits for the batch to fill.
+        - max_queue_size: Queued requests beyond which new requests are rejected.
+        - executor: concurrent.futures executor the batches run in. By default the service starts a process pool of
+          max_batches_in_flight workers, initialized with parallel_runner.initialize_worker, and shuts it down on stop.
+        - inline: Calculate the batches on the event loop instead of an executor (opt-in, e.g. to measure the
+          batching alone); no request is accepted while a batch is calculated, and one batch runs at a time.
+        - max_batches_in_flight: Batches calculated at the same time.
+        - default_timeout: Deadline in seconds of requests without their own.
+        - snapshot_path, location_index_path: Snapshot of the compiled tables and location index for the workers of
+          the default process pool to load, see parallel_runner.initialize_worker.
+        """
+        if inline and executor is not None:
+            raise ValueError('An executor cannot be given for inline batches.')
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_queue_size = max_queue_size
+        self.executor = executor
+        self.inline = inline
+        self.owns_executor = False
+        self.snapshot_path = snapshot_path
+        self.location_index_path = location_index_path
+        self.max_batches_in_flight = max_batches_in_flight
+        self.default_timeout = default_timeout
+        self.metrics = ServiceMetrics()
+        self.queue = None
+        self.batcher = None
+        self.batches = set()
+
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.in_flight = asyncio.Semaphore(self.max_batches_in_flight)
+        if self.executor is None and not self.inline:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_batches_in_flight, initializer=parallel_runner.initialize_worker,
+                                                initargs=(self.snapshot_path, self.location_index_path))
+            self.owns_executor = True
+            # Start the workers before the first request, so it does not wait for them
+            await asyncio.get_running_loop().run_in_executor(self.executor, calculate_batch, [])
+        self.metrics = ServiceMetrics()
+        self.batcher = asyncio.create_task(self._batch_loop())
+
+
+    async def stop(self):
+        if self.batcher is not None:
+            self.batcher.cancel()
+            await asyncio.gather(self.batcher, return_exceptions=True)
+            self.batcher = None
+        if self.batches:
+            await asyncio.gather(*self.batches, return_exceptions=True)
+        if self.owns_executor:
+            self.executor.shutdown()
+            self.executor = None
+            self.owns_executor = False
+
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+
+    async def calculate(self, data: dict, timeout: float = None) -> dict:
+        """
+        Calculate one building.
+
+        Args:
+        - data: Building dict, in the shape accepted by `Building`.
+        - timeout: Seconds until the request's deadline, defaults to default_timeout (None for no deadline).
+
+        Returns:
+        - Result dict, as written by the batch runner.
+
+        Raises:
+        - ServiceOverloaded: The queue is full.
+        - DeadlineExceeded: No result before the deadline.
+        - RequestRejected: The record is invalid.
+        """
+        loop = asyncio.get_running_loop()
+        timeout = timeout if timeout is not None else self.default_timeout
+        now = loop.time()
+        future = loop.create_future()
+        try:
+            self.queue.put_nowait((data, future, now + timeout if timeout is not None else None, now))
+        except asyncio.QueueFull:
+            self.metrics.record_request('overloaded')
+            raise ServiceOverloaded(f'{self.max_queue_size} requests are queued.') from None
+        try:
+            # On timeout wait_for cancels the future, so the batcher drops the request if it is still queued
+            outcome, value = await (future if timeout is None else asyncio.wait_for(future, timeout))
+        except asyncio.TimeoutError:
+            self.metrics.record_request('expired')
+            raise DeadlineExceeded(f'No result within {timeout} s.') from None
+        if outcome == 'reject':
+            raise RequestRejected(value)
+        return value
+
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            flush_at = loop.time() + self.max_delay
+            while len(batch) < self.batch_size:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                remaining = flush_at - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Drop requests whose deadline passed or whose caller gave up while they were queued
+            now = loop.time()
+            batch = [item for item in batch if not item[1].done() and (item[2] is None or item[2] > now)]
+            if not batch:
+                continue
+            await self.in_flight.acquire()
+            task = asyncio.create_task(self._run_batch(batch))
+            self.batches.add(task)
+            task.add_done_callback(self.batches.discard)
+
+
+    async def _run_batch(self, batch: list):
+        loop = asyncio.get_running_loop()
+        try:
+            self.metrics.record_batch(len(batch))
+            records = [data for data, _, _, _ in batch]
+            try:
+                if self.inline:
+                    outcomes = calculate_batch(records)
+                else:
+                    outcomes = await loop.run_in_executor(self.executor, calculate_batch, records)
+            except Exception as error:
+                for _, future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                return
+            now = loop.time()
+            for (_, future, _, enqueued_at), outcome in zip(batch, outcomes):
+                if future.done():
+                    continue
+                future.set_result(outcome)
+                self.metrics.record_request('completed' if outcome[0] == 'result' else 'rejected', now - enqueued_at)
+        finally:
+            self.in_flight.release()
+
+
+    def metrics_snapshot(self) -> dict:
+        return self.metrics.snapshot(self.queue.qsize() if self.queue is not None else 0)
+
+
+class SynchronousCalculationService:
+    """
+    Baseline with the interface of CalculationService: every request calculates one `Building` on the event loop,
+    as a plain per-request handler would.
+    """
+    def __init__(self):
+        self.metrics = ServiceMetrics()
+
+
+    async def start(self):
+        self.metrics = ServiceMetrics()
+
+
+    async def stop(self):
+        pass
+
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+
+    async def calculate(self, data: dict, timeout: float = None) -> dict:
+        started_at = self.metrics.clock()
+        data = location_index.fill_theta__e([data])[0]
+        try:
+            result = calculate_record(data)
+        except RECORD_ERRORS as error:
+            self.metrics.record_request('rejected', self.metrics.clock() - started_at)
+            raise RequestRejected({'error_type': type(error).__name__, 'error': str(error)}) from None
+        self.metrics.record_request('completed', self.metrics.clock() - started_at)
+        return result
+
+
+    def metrics_snapshot(self) -> dict:
+        return self.metrics.snapshot()
+
+
+# Minimal HTTP/1.1 front end: POST /calculate with one building dict as JSON body, GET /metrics
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 422: 'Unprocessable Entity', 500: 'Internal Server Error',
+                503: 'Service Unavailable', 504: 'Gateway Timeout'}
+
+
+async def read_http_request(reader: asyncio.StreamReader):
+    # (method, path, headers, body), or None when the client closed the connection
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    method, path, _ = request_line.decode('latin-1').split(' ', 2)
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return method, path, headers, body
+
+
+def http_response(status: int, payload) -> bytes:
+    body = json.dumps(payload).encode()
+    return (f'HTTP/1.1 {status} {HTTP_REASONS[status]}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n').encode() + body
+
+
+async def handle_http_request(service: CalculationService, method: str, path: str, headers: dict, body: bytes):
+    # (status, payload) of one request
+    if method == 'GET' and path == '/metrics':
+        return 200, service.metrics_snapshot()
+    if method != 'POST' or path != '/calculate':
+        return 404, {'error': f'No route for {method} {path}'}
+    try:
+        data = json.loads(body)
+    except ValueError as error:
+        return 400, {'error': f'Invalid JSON: {error}'}
+    if not isinstance(data, dict):
+        return 400, {'error': 'Building record must be a JSON object.'}
+    timeout = None
+    if 'x-timeout-ms' in headers:
+        try:
+            timeout = float(headers['x-timeout-ms']) / 1000
+        except ValueError:
+            timeout = math.nan
+        if not (math.isfinite(timeout) and timeout > 0):
+            return 400, {'error': f"X-Timeout-Ms must be a positive number of milliseconds, got {headers['x-timeout-ms']!r}."}
+    try:
+        return 200, await service.calculate(data, timeout)
+    except RequestRejected as rejected:
+        return 422, rejected.reject
+    except ServiceOverloaded as error:
+        return 503, {'error': str(error)}
+    except DeadlineExceeded as error:
+        return 504, {'error': str(error)}
+    except Exception as error:
+        # A bug in the calculation, not in the record; answer instead of dropping the connection
+        return 500, {'error_type': type(error).__name__, 'error': str(error)}
+
+
+async def serve_connection(service: CalculationService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    # Requests of one keep-alive connection, answered in order
+    try:
+        while True:
+            try:
+                request = await read_http_request(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                writer.write(http_response(400, {'error': 'Malformed HTTP request.'}))
+                break
+            if request is None:
+                break
+            writer.write(http_response(*await handle_http_request(service, *request)))
+            await writer.drain()
+            if request[2].get('connection', '').lower() == 'close':
+                break
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def start_http_server(service: CalculationService, host: str = '127.0.0.1', port: int = 8080):
+    return await asyncio.start_server(lambda reader, writer: serve_connection(service, reader, writer), host, port)
+
+
+async def serve(host: str, port: int, synchronous: bool = False, **service_options):
+    # Stop on SIGTERM like on Ctrl+C, so the service shuts its worker processes down instead of orphaning them
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    async with (SynchronousCalculationService() if synchronous else CalculationService(**service_options)) as service:
+        server = await start_http_server(service, host, port)
+        print(f"Serving on {', '.join(str(socket.getsockname()) for socket in server.sockets)}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve building calculations over HTTP with request micro-batching.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Maximum requests per batch')
+    parser.add_argument('--max-delay-ms', type=float, default=DEFAULT_MAX_DELAY * 1000, help='Milliseconds a request waits for its batch to fill')
+    parser.add_argument('--max-queue-size', type=int, default=DEFAULT_MAX_QUEUE_SIZE, help='Queued requests beyond which requests get 503')
+    parser.add_argument('--timeout-ms', type=float, help='Default request deadline; requests may set X-Timeout-Ms')
+    parser.add_argument('--synchronous', action='store_true', help='Calculate one Building per request, without batching (baseline)')
+    parser.add_argument('--max-batches-in-flight', type=int, default=DEFAULT_MAX_BATCHES_IN_FLIGHT,
+                        help='Batches calculated at the same time, one worker process each')
+    parser.add_argument('--inline', action='store_true', help='Calculate batches on the event loop instead of in worker processes')
+    parser.add_argument('--snapshot', help='Snapshot of the compiled Annex tables, see src.data.din_12831_snapshot')
+    parser.add_argument('--locations', help='Location table to resolve theta__e of records without it, see src.location_index')
+    args = parser.parse_args(argv)
+    if args.snapshot:
+        din_12831_snapshot.use_snapshot(args.snapshot)
+    if args.locations:
+        location_index.use_location_index(args.locations)
+    service_options = {} if args.synchronous else {
+        'batch_size': args.batch_size, 'max_delay': args.max_delay_ms / 1000, 'max_queue_size': args.max_queue_size,
+        'inline': args.inline, 'max_batches_in_flight': args.max_batches_in_flight,
+        'default_timeout': args.timeout_ms / 1000 if args.timeout_ms else None,
+        'snapshot_path': args.snapshot, 'location_index_path': args.locations}
+    try:
+        asyncio.run(serve(args.host, args.port, args.synchronous, **service_options))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
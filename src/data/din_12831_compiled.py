@@ -0,0 +1,258 @@
+from dataclasses import dataclass, field
+from itertools import repeat
+
+import numpy as np
+
+from src.data import din_12831_data
+
+
+# Code for names, sub-types or build year ranges that are not part of a table. Value lookups for this code,
+# and for cells that are empty (None) in the table, return NOT_DEFINED_VALUE.
+NOT_DEFINED = -1
+NOT_DEFINED_VALUE = np.nan
+
+
+@dataclass
+class CompiledTables:
+    """
+    Integer-indexed form of the DIN 12831 Annex B tables, for batch and vectorized callers.
+
+    Every value array carries one trailing NaN slot, so indexing with NOT_DEFINED (-1) yields NOT_DEFINED_VALUE
+    without any branching.
+    """
+    # Table B.15
+    be_type_codes: dict
+    be_sub_type_codes: tuple  # One dict of sub-type codes per be_type code
+    u_value_build_year_ranges: tuple
+    u_value_build_year_range_last_years: np.ndarray
+    u_values: np.ndarray  # [be_type, be_sub_type, build year range]
+    # Table B.1
+    thermal_bridge_codes: dict
+    thermal_bridge_values: np.ndarray
+    # Table B.11
+    temperature_correction_codes: dict
+    temperature_correction_values: np.ndarray
+    # Table B.12
+    air_change_rate_codes: dict
+    air_change_rate_values: np.ndarray
+    air_change_rate_build_year_range_codes: np.ndarray  # Table B.12 code per build year range
+    air_change_rate_build_year_range_last_years: np.ndarray
+    # Table B.14
+    building_temperature_codes: dict
+    building_temperature_values: np.ndarray
+    # Annex B.3.2 value of delta__utb for buildings without selection criteria; one value, so that the override
+    # layers of a snapshot can be written into it like into the tables
+    default_thermal_bridge_value: np.ndarray
+    # Origin of the tables (fingerprint, override layers) when loaded from a snapshot
+    metadata: dict = None
+    # True if the override layers, including the national Annex A values, are written into the arrays (snapshots)
+    overrides_applied: bool = False
+    # (be_type, be_sub_type) -> be_type code * u_values.shape[1] + be_sub_type code, derived from the Table B.15 codes
+    be_type_pair_codes: dict = field(init=False, repr=False, compare=False)
+
+
+    def __post_init__(self):
+        n_sub_type_codes = self.u_values.shape[1]
+        self.be_type_pair_codes = {
+            (be_type, be_sub_type): type_code * n_sub_type_codes + sub_type_code
+            for be_type, type_code in self.be_type_codes.items()
+            for be_sub_type, sub_type_code in self.be_sub_type_codes[type_code].items()}
+
+
+    def encode_be_types(self, be_types) -> np.ndarray:
+        return encode_names(self.be_type_codes, be_types)
+
+
+    def encode_be_sub_types(self, be_type_codes, be_sub_types) -> np.ndarray:
+        # Sub-type names are only defined per be_type, so each be_type's elements are encoded with its own codes
+        be_type_codes = np.asarray(be_type_codes, dtype=np.intp)
+        be_sub_type_codes = np.full(be_type_codes.shape[0], NOT_DEFINED, dtype=np.intp)
+        for type_code in set(be_type_codes.tolist()) - {NOT_DEFINED}:
+            rows = np.flatnonzero(be_type_codes == type_code)
+            be_sub_type_codes[rows] = encode_names(self.be_sub_type_codes[type_code], [be_sub_types[row] for row in rows.tolist()])
+        return be_sub_type_codes
+
+
+    def encode_be_type_pairs(self, be_types, be_sub_types) -> tuple:
+        """
+        Same as encode_be_types and encode_be_sub_types, with one lookup per (be_type, be_sub_type) pair.
+
+        Returns:
+        - (be_type codes, be_sub_type codes)
+        """
+        try:
+            pair_codes = np.fromiter(map(self.be_type_pair_codes.get, zip(be_types, be_sub_types), repeat(NOT_DEFINED)),
+                                     dtype=np.intp, count=len(be_types))
+        except TypeError:
+            be_type_codes = self.encode_be_types(be_types)
+            return be_type_codes, self.encode_be_sub_types(be_type_codes, be_sub_types)
+        found = pair_codes != NOT_DEFINED
+        be_type_codes, be_sub_type_codes = np.divmod(pair_codes, self.u_values.shape[1])
+        be_sub_type_codes[~found] = NOT_DEFINED
+        # A pair that is not in Table B.15 may still have a known be_type
+        missing = np.flatnonzero(~found)
+        be_type_codes[missing] = self.encode_be_types([be_types[row] for row in missing.tolist()])
+        return be_type_codes, be_sub_type_codes
+
+
+    def encode_u_value_build_year_ranges(self, build_years) -> np.ndarray:
+        return np.searchsorted(self.u_value_build_year_range_last_years, np.asarray(build_years), side='left')
+
+
+    def encode_air_change_rate_build_year_ranges(self, build_years) -> np.ndarray:
+        build_year_range_codes = np.searchsorted(self.air_change_rate_build_year_range_last_years, np.asarray(build_years), side='left')
+        return self.air_change_rate_build_year_range_codes[build_year_range_codes]
+
+
+    def lookup_u_values(self, be_type_codes, be_sub_type_codes, build_year_range_codes) -> np.ndarray:
+        return self.u_values[be_type_codes, be_sub_type_codes, build_year_range_codes]
+
+
+    def lookup_u_values_by_year(self, be_type_codes, be_sub_type_codes, build_years) -> np.ndarray:
+        return self.lookup_u_values(be_type_codes, be_sub_type_codes, self.encode_u_value_build_year_ranges(build_years))
+
+
+    # Scalar lookups for one building or element, as the din_12831_data functions do them: None for an empty cell,
+    # KeyError for a name that is not in the table (unless a blanket override of a snapshot fills the whole table)
+    def u_value(self, be_type: str, be_sub_type: str, build_year: int):
+        type_code = self.be_type_codes.get(be_type, NOT_DEFINED)
+        sub_type_code = self.be_sub_type_codes[type_code].get(be_sub_type, NOT_DEFINED) if type_code != NOT_DEFINED else NOT_DEFINED
+        value = self.u_values[type_code, sub_type_code, int(self.encode_u_value_build_year_ranges(build_year))]
+        return _scalar_value(value, sub_type_code, (be_type, be_sub_type))
+
+
+    def thermal_bridge_value(self, selection_criteria: str = None):
+        if selection_criteria is None:
+            return _scalar_value(self.default_thermal_bridge_value[0])
+        return _lookup_scalar(self.thermal_bridge_codes, self.thermal_bridge_values, selection_criteria)
+
+
+    def temperature_correction_value(self, be_adjacent_to: str):
+        return _lookup_scalar(self.temperature_correction_codes, self.temperature_correction_values, be_adjacent_to)
+
+
+    def air_change_rate_value(self, build_year: int, air_tightness_level: str = None):
+        if air_tightness_level is not None:
+            return _lookup_scalar(self.air_change_rate_codes, self.air_change_rate_values, air_tightness_level)
+        return _scalar_value(self.air_change_rate_values[int(self.encode_air_change_rate_build_year_ranges(build_year))])
+
+
+    def building_temperature_value(self, building_type: str):
+        return _lookup_scalar(self.building_temperature_codes, self.building_temperature_values, building_type)
+
+
+def _lookup_scalar(codes: dict, values: np.ndarray, name):
+    code = codes.get(name, NOT_DEFINED)
+    return _scalar_value(values[code], code, name)
+
+
+def _scalar_value(value, code: int = None, name=None):
+    if np.isnan(value):
+        if code == NOT_DEFINED:
+            raise KeyError(name)
+        return None
+    return float(value)
+
+
+def encode_names(codes: dict, names) -> np.ndarray:
+    # Codes of the names, NOT_DEFINED for names that are not in codes; table names are strings, so any other value
+    # (None, numbers, or lists and dicts from JSON records, which are not even hashable) is NOT_DEFINED
+    try:
+        # Table names are strings, so other hashable values are never found
+        return np.fromiter(map(codes.get, names, repeat(NOT_DEFINED)), dtype=np.intp, count=len(names))
+    except TypeError:
+        return np.fromiter((codes.get(name, NOT_DEFINED) if isinstance(name, str) else NOT_DEFINED for name in names),
+                           dtype=np.intp, count=len(names))
+
+
+def national_value(tables: CompiledTables, national_value_function):
+    # National Annex A value that takes precedence over the table arrays, None if there is none or if the tables
+    # already hold it (snapshots bake it into the arrays, together with the other override layers)
+    return None if tables.overrides_applied else national_value_function()
+
+
+def _compile_lookup_table(table: dict):
+    codes = {name: code for code, name in enumerate(table)}
+    values = np.full(len(codes) + 1, NOT_DEFINED_VALUE)
+    for name, code in codes.items():
+        if table[name] is not None:
+            values[code] = table[name]
+    return codes, values
+
+
+def compile_din_12831_tables() -> CompiledTables:
+    """
+    Compile the Annex B tables of din_12831_data into a CompiledTables instance.
+
+    Returns:
+    - CompiledTables built from the current content of the din_12831_data tables.
+    """
+    u_value_table = din_12831_data.b_4_3_table_b_15_u_values
+    build_year_ranges = din_12831_data.u_value_build_year_ranges
+    build_year_range_codes = {name: code for code, name in enumerate(build_year_ranges)}
+
+    be_type_codes = {be_type: code for code, be_type in enumerate(u_value_table)}
+    be_sub_type_codes = tuple(
+        {be_sub_type: code for code, be_sub_type in enumerate(u_value_table[be_type])} for be_type in be_type_codes)
+
+    u_values = np.full(
+        (len(be_type_codes) + 1, max(len(codes) for codes in be_sub_type_codes) + 1, len(build_year_ranges) + 1),
+        NOT_DEFINED_VALUE)
+    for be_type, type_code in be_type_codes.items():
+        for be_sub_type, sub_type_code in be_sub_type_codes[type_code].items():
+            for build_year_range, u_value in u_value_table[be_type][be_sub_type].items():
+                if u_value is not None:
+                    u_values[type_code, sub_type_code, build_year_range_codes[build_year_range]] = u_value
+
+    thermal_bridge_codes, thermal_bridge_values = _compile_lookup_table(
+        din_12831_data.b_2_1_table_b_1_additional_thermal_transmittance_for_thermal_bridges)
+    temperature_correction_codes, temperature_correction_values = _compile_lookup_table(
+        din_12831_data.b_3_3_table_b_11_temperature_correction_factor)
+    air_change_rate_codes, air_change_rate_values = _compile_lookup_table(
+        din_12831_data.b_3_4_table_b_12_air_change_rate)
+    building_temperature_codes, building_temperature_values = _compile_lookup_table(
+        din_12831_data.b_4_2_table_b_14_building_temperature)
+
+    return CompiledTables(
+        be_type_codes=be_type_codes,
+        be_sub_type_codes=be_sub_type_codes,
+        u_value_build_year_ranges=build_year_ranges,
+        u_value_build_year_range_last_years=np.array(din_12831_data.u_value_build_year_range_last_years),
+        u_values=u_values,
+        thermal_bridge_codes=thermal_bridge_codes,
+        thermal_bridge_values=thermal_bridge_values,
+        temperature_correction_codes=temperature_correction_codes,
+        temperature_correction_values=temperature_correction_values,
+        air_change_rate_codes=air_change_rate_codes,
+        air_change_rate_values=air_change_rate_values,
+        air_change_rate_build_year_range_codes=np.array(
+            [air_change_rate_codes.get(name, NOT_DEFINED) for name in din_12831_data.air_change_rate_build_year_ranges]),
+        air_change_rate_build_year_range_last_years=np.array(din_12831_data.air_change_rate_build_year_range_last_years),
+        building_temperature_codes=building_temperature_codes,
+        building_temperature_values=building_temperature_values,
+        default_thermal_bridge_value=np.array([din_12831_data.b_3_2_simplified_thermal_bridges()], dtype=np.float64),
+    )
+
+
+_compiled_tables = None
+
+
+def get_compiled_tables() -> CompiledTables:
+    # Compiled once per process on first use, unless set_compiled_tables provided them (e.g. from a snapshot)
+    global _compiled_tables
+    if _compiled_tables is None:
+        _compiled_tables = compile_din_12831_tables()
+    return _compiled_tables
+
+
+def set_compiled_tables(tables: CompiledTables = None):
+    # Use tables for all callers of this process; None compiles them from din_12831_data again on next use
+    global _compiled_tables
+    _compiled_tables = tables
+
+
+def get_snapshot_tables() -> CompiledTables:
+    # The compiled tables of this process if they hold the override layers (a snapshot is in use), else None; the
+    # scalar Building lookups then read the snapshot instead of din_12831_data
+    tables = _compiled_tables
+    return tables if tables is not None and tables.overrides_applied else None
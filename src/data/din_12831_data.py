@@ -1,29 +1,41 @@
 
+import hashlib
+import logging
+from bisect import bisect_left
+
+
+# Debug trace of the table lookups; silent unless DEBUG logging is enabled for this logger
+logger = logging.getLogger(__name__)
+
+
+# Build year ranges as used for the keys of Table B.12 and Table B.15, with the last build year of each range
+air_change_rate_build_year_ranges = ("<1977", "<1995", ">=1995")
+air_change_rate_build_year_range_last_years = (1977, 1994)
+
+u_value_build_year_ranges = ("<=1918", "1919-48", "1949-57", "1958-68", "1969-78", "1979-83", "1984-94", ">=1995")
+u_value_build_year_range_last_years = (1918, 1948, 1957, 1968, 1978, 1983, 1994)
+
+
 def get_build_year_range_for_air_change_rate(year):
-    if year <= 1977:
-        return "<1977"
-    elif year < 1995:
-        return "<1995"
-    else:
-        return ">=1995"
+    return air_change_rate_build_year_ranges[bisect_left(air_change_rate_build_year_range_last_years, year)]
 
 def get_build_year_range_for_u_values(year):
-    if year <= 1918:
-        return "<=1918"
-    elif 1919 <= year <= 1948:
-        return "1919-1948"
-    elif 1949 <= year <= 1957:
-        return "1949-1957"
-    elif 1958 <= year <= 1968:
-        return "1958-1968"
-    elif 1969 <= year <= 1978:
-        return "1969-1978"
-    elif 1979 <= year <= 1983:
-        return "1979-1983"
-    elif 1984 <= year <= 1994:
-        return "1984-1994"
-    else:
-        return ">=1995"
+    return u_value_build_year_ranges[bisect_left(u_value_build_year_range_last_years, year)]
+
+
+def annex_tables_state() -> tuple:
+    # The national Annex A values and the Annex B tables; compares unequal to a deep copy once a value changes
+    annex_a_values = [a_3_2_simplified_thermal_bridges(), a_3_3_temperature_correction_factor(), a_3_4_simplified_air_change_rate(),
+                      a_4_2_internal_design_temperature(), a_4_3_simplified_u_value()]
+    annex_b_tables = [b_2_1_table_b_1_additional_thermal_transmittance_for_thermal_bridges, b_2_4_table_b_2_temperature_adjustment_term,
+                      b_3_3_table_b_11_temperature_correction_factor, b_3_4_table_b_12_air_change_rate,
+                      b_4_2_table_b_14_building_temperature, b_4_3_table_b_15_u_values, b_3_2_simplified_thermal_bridges()]
+    return annex_a_values, annex_b_tables
+
+
+def annex_tables_fingerprint() -> str:
+    # Changes whenever a value of the Annex B tables or of the national Annex A values changes
+    return hashlib.sha256(repr(annex_tables_state()).encode()).hexdigest()
 
 
 # Annex definitions
@@ -56,6 +68,11 @@ def b_2_1_simplified_thermal_bridges(delta__utb_selection_criteria: str):
     return b_2_1_table_b_1_additional_thermal_transmittance_for_thermal_bridges[delta__utb_selection_criteria]
 
 
+def b_2_4_temperature_adjustment_term(space_category: str, space_case: str):
+    # Temperature adjustment term of an adjacent unheated space in accordance with Annex B.2.4
+    return b_2_4_table_b_2_temperature_adjustment_term[space_category][space_case]
+
+
 def b_3_2_simplified_thermal_bridges():
     # ΔUTB value in accordance with Annex B.3.2 W/m2KW/(m2∙K)
     return 0.1
@@ -78,7 +95,8 @@ def b_4_2_internal_design_temperature(building_type):
 
 def b_4_3_simplified_u_value(be_type: str, be_sub_type: str, build_year: str):
     build_year_range = get_build_year_range_for_u_values(build_year)
-    print('build_year_range', build_year_range)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('build_year_range %s', build_year_range)
     # U values in accordance with Annex B.4.3 [W/(m2∙K)]
     return b_4_3_table_b_15_u_values[be_type][be_sub_type][build_year_range]
 
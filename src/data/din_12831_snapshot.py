@@ -0,0 +1,256 @@
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from src import array_container
+from src.data import din_12831_compiled, din_12831_data
+
+
+SNAPSHOT_KIND = 'din_12831_snapshot'
+SNAPSHOT_VERSION = 2
+
+# Key of a value that applies to every cell of a table, like the national values of the a_* functions
+BLANKET = '*'
+
+# Table -> (CompiledTables codes attribute, CompiledTables values attribute, national Annex A value function)
+TABLES = {
+    'B.1': ('thermal_bridge_codes', 'thermal_bridge_values', din_12831_data.a_3_2_simplified_thermal_bridges),
+    'B.11': ('temperature_correction_codes', 'temperature_correction_values', din_12831_data.a_3_3_temperature_correction_factor),
+    'B.12': ('air_change_rate_codes', 'air_change_rate_values', din_12831_data.a_3_4_simplified_air_change_rate),
+    'B.14': ('building_temperature_codes', 'building_temperature_values', din_12831_data.a_4_2_internal_design_temperature),
+    'B.15': ('be_type_codes', 'u_values', din_12831_data.a_4_3_simplified_u_value),  # keys are (be_type, be_sub_type, build_year_range)
+}
+
+ANNEX_B_TABLES = {
+    'B.1': din_12831_data.b_2_1_table_b_1_additional_thermal_transmittance_for_thermal_bridges,
+    'B.11': din_12831_data.b_3_3_table_b_11_temperature_correction_factor,
+    'B.12': din_12831_data.b_3_4_table_b_12_air_change_rate,
+    'B.14': din_12831_data.b_4_2_table_b_14_building_temperature,
+}
+
+
+class AnnexOverrideRegistry:
+    """
+    Layers of values that take precedence over the Annex B tables, e.g. national Annex A values and
+    customer-specific values.
+
+    Each layer maps a table ('B.1', 'B.11', 'B.12', 'B.14', 'B.15') to {key: value}, where the key is a table key,
+    (be_type, be_sub_type, build_year_range) for Table B.15, or BLANKET for a value that applies to the whole table.
+    Layers added later take precedence over earlier ones, and all layers over Annex B; within a layer, keys take
+    precedence over its blanket value. resolve() is O(1); snapshots bake the precedence into the table arrays.
+    """
+    def __init__(self):
+        self.layers = []  # (name, values), lowest precedence first
+        self.specific = {table: {} for table in TABLES}  # table -> key -> (value, source, layer index)
+        self.blanket = {}  # table -> (value, source, layer index)
+
+
+    def add_layer(self, name: str, values: dict):
+        unknown_tables = set(values) - set(TABLES)
+        if unknown_tables:
+            raise KeyError(f'Unknown tables {sorted(unknown_tables)}, expected some of {list(TABLES)}.')
+        layer_index = len(self.layers)
+        self.layers.append((name, values))
+        for table, table_values in values.items():
+            for key, value in table_values.items():
+                if key == BLANKET:
+                    self.blanket[table] = (value, name, layer_index)
+                    continue
+                key = tuple(key) if table == 'B.15' else key
+                if not is_annex_b_key(table, key):
+                    raise KeyError(f'{key!r} is not a key of Table {table}.')
+                self.specific[table][key] = (value, name, layer_index)
+
+
+    def resolve(self, table: str, key):
+        """
+        Resolve the value of one table cell.
+
+        Returns:
+        - (value, source): The value of the highest layer defining the cell or the whole table, else the Annex B
+          value with source 'annex_b' (None if the cell is empty).
+        """
+        specific = self.specific[table].get(key)
+        blanket = self.blanket.get(table)
+        if specific is not None and (blanket is None or specific[2] >= blanket[2]):
+            return specific[0], specific[1]
+        if blanket is not None:
+            return blanket[0], blanket[1]
+        return annex_b_value(table, key), 'annex_b'
+
+
+def is_annex_b_key(table: str, key) -> bool:
+    if table == 'B.15':
+        be_type, be_sub_type, build_year_range = key
+        return (be_sub_type in din_12831_data.b_4_3_table_b_15_u_values.get(be_type, {})
+                and build_year_range in din_12831_data.u_value_build_year_ranges)
+    return key in ANNEX_B_TABLES[table]
+
+
+def annex_b_value(table: str, key):
+    if table == 'B.15':
+        be_type, be_sub_type, build_year_range = key
+        return din_12831_data.b_4_3_table_b_15_u_values.get(be_type, {}).get(be_sub_type, {}).get(build_year_range)
+    return ANNEX_B_TABLES[table].get(key)
+
+
+def national_annex_a_values() -> dict:
+    # The national values of the a_* placeholder functions, as blanket values of their tables
+    values = {}
+    for table, (_, _, national_value) in TABLES.items():
+        value = national_value()
+        if value is not None:
+            values[table] = {BLANKET: value}
+    return values
+
+
+def default_registry() -> AnnexOverrideRegistry:
+    registry = AnnexOverrideRegistry()
+    registry.add_layer('national_annex_a', national_annex_a_values())
+    return registry
+
+
+def load_override_layers(path, registry: AnnexOverrideRegistry = None) -> AnnexOverrideRegistry:
+    """
+    Add the layers of a JSON override file to a registry.
+
+    The file holds {"layers": [{"name": ..., "values": {table: {key: value}}}]}, lowest precedence first. Table B.15
+    keys are written as "be_type|be_sub_type|build_year_range".
+
+    Returns:
+    - The registry, by default a new one holding the national Annex A values as its first layer.
+    """
+    registry = registry if registry is not None else default_registry()
+    with open(path, encoding='utf-8') as file:
+        layers = json.load(file)['layers']
+    for layer in layers:
+        values = {table: {tuple(key.split('|')) if table == 'B.15' and key != BLANKET else key: value
+                          for key, value in table_values.items()}
+                  for table, table_values in layer['values'].items()}
+        registry.add_layer(layer['name'], values)
+    return registry
+
+
+def apply_registry(tables: din_12831_compiled.CompiledTables, registry: AnnexOverrideRegistry):
+    # Write the layers into the table arrays, lowest precedence first, so every cell ends up with its resolved value
+    for _, values in registry.layers:
+        for table, table_values in values.items():
+            codes_attribute, values_attribute, _ = TABLES[table]
+            array = getattr(tables, values_attribute)
+            if BLANKET in table_values:
+                array[...] = table_values[BLANKET]
+                if table == 'B.1':
+                    # The Annex B.3.2 default is the delta__utb of the buildings outside Table B.1, covered by the blanket too
+                    tables.default_thermal_bridge_value[...] = table_values[BLANKET]
+            for key, value in table_values.items():
+                if key == BLANKET:
+                    continue
+                if table == 'B.15':
+                    array[u_value_cell(tables, key)] = value
+                else:
+                    codes = getattr(tables, codes_attribute)
+                    if key not in codes:
+                        raise KeyError(f'{key!r} is not a key of Table {table}.')
+                    array[codes[key]] = value
+
+
+def u_value_cell(tables: din_12831_compiled.CompiledTables, key) -> tuple:
+    be_type, be_sub_type, build_year_range = key
+    type_code = tables.be_type_codes.get(be_type)
+    sub_type_code = tables.be_sub_type_codes[type_code].get(be_sub_type) if type_code is not None else None
+    if sub_type_code is None or build_year_range not in tables.u_value_build_year_ranges:
+        raise KeyError(f'{key!r} is not a cell of Table B.15.')
+    return type_code, sub_type_code, tables.u_value_build_year_ranges.index(build_year_range)
+
+
+# CompiledTables fields stored as arrays; all other fields are code maps stored in the header
+ARRAY_FIELDS = ('u_value_build_year_range_last_years', 'u_values', 'thermal_bridge_values', 'temperature_correction_values',
+                'air_change_rate_values', 'air_change_rate_build_year_range_codes', 'air_change_rate_build_year_range_last_years',
+                'building_temperature_values', 'default_thermal_bridge_value')
+
+
+def build_snapshot(path, registry: AnnexOverrideRegistry = None) -> din_12831_compiled.CompiledTables:
+    """
+    Compile the Annex tables with their overrides into a versioned, memory-mappable snapshot file.
+
+    Args:
+    - path: Snapshot file to write.
+    - registry: Override layers, defaults to the national Annex A values of din_12831_data.
+
+    Returns:
+    - The compiled tables as written.
+    """
+    registry = registry if registry is not None else default_registry()
+    tables = din_12831_compiled.compile_din_12831_tables()
+    apply_registry(tables, registry)
+    tables.overrides_applied = True
+    metadata = {
+        'source_fingerprint': din_12831_data.annex_tables_fingerprint(),
+        'layers': [name for name, _ in registry.layers],
+        'be_type_codes': tables.be_type_codes,
+        'be_sub_type_codes': list(tables.be_sub_type_codes),
+        'u_value_build_year_ranges': list(tables.u_value_build_year_ranges),
+        'thermal_bridge_codes': tables.thermal_bridge_codes,
+        'temperature_correction_codes': tables.temperature_correction_codes,
+        'air_change_rate_codes': tables.air_change_rate_codes,
+        'building_temperature_codes': tables.building_temperature_codes,
+    }
+    array_container.write_array_container(
+        path, SNAPSHOT_KIND, SNAPSHOT_VERSION, metadata, {name: getattr(tables, name) for name in ARRAY_FIELDS})
+    return tables
+
+
+def load_snapshot(path, mmap: bool = True) -> din_12831_compiled.CompiledTables:
+    """
+    Load a snapshot written by build_snapshot.
+
+    Only the header (code maps and array offsets) is parsed; with mmap the arrays are read-only views of the file,
+    shared between all processes that load it.
+
+    Returns:
+    - CompiledTables backed by the snapshot file.
+    """
+    version, metadata, arrays = array_container.read_array_container(path, SNAPSHOT_KIND, mmap)
+    if version > SNAPSHOT_VERSION:
+        raise ValueError(f'{path} has snapshot version {version}, this code reads up to version {SNAPSHOT_VERSION}.')
+    if version < 2:
+        # Version 1 did not store the Annex B.3.2 default; take it as Building resolves it without a snapshot
+        national_thermal_bridges = din_12831_data.a_3_2_simplified_thermal_bridges()
+        arrays['default_thermal_bridge_value'] = np.array([national_thermal_bridges if national_thermal_bridges is not None
+                                                          else din_12831_data.b_3_2_simplified_thermal_bridges()], dtype=np.float64)
+    return din_12831_compiled.CompiledTables(
+        be_type_codes=metadata['be_type_codes'],
+        be_sub_type_codes=tuple(metadata['be_sub_type_codes']),
+        u_value_build_year_ranges=tuple(metadata['u_value_build_year_ranges']),
+        thermal_bridge_codes=metadata['thermal_bridge_codes'],
+        temperature_correction_codes=metadata['temperature_correction_codes'],
+        air_change_rate_codes=metadata['air_change_rate_codes'],
+        building_temperature_codes=metadata['building_temperature_codes'],
+        metadata=metadata,
+        overrides_applied=True,
+        **arrays,
+    )
+
+
+def use_snapshot(path) -> din_12831_compiled.CompiledTables:
+    # Make a snapshot the compiled tables of this process
+    tables = load_snapshot(path)
+    din_12831_compiled.set_compiled_tables(tables)
+    return tables
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compile the DIN 12831 Annex tables into a memory-mappable snapshot.')
+    parser.add_argument('output', help='Snapshot file to write')
+    parser.add_argument('--overrides', help='JSON file with override layers, applied on top of the national Annex A values')
+    args = parser.parse_args(argv)
+    registry = load_override_layers(args.overrides) if args.overrides else default_registry()
+    build_snapshot(args.output, registry)
+    print(f"Snapshot written to {args.output} with layers {[name for name, _ in registry.layers]}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+from array import array
+
+import numpy as np
+
+from src.data import din_12831_data
+from src.portfolio_calculators import PortfolioResult, calculate_portfolio
+from src.simplified_calculators import Building, BuildingElement
+
+
+class ElementTemplate:
+    # Resolved u__k/f__x shared by all building elements with the same template key
+    __slots__ = ('template_id', 'be_type', 'be_sub_type', 'be_adjacent_to', 'u__k', 'f__x')
+
+    def __init__(self, template_id: int, be_type: str, be_sub_type: str, be_adjacent_to: str, u__k: float, f__x: float):
+        self.template_id = template_id
+        self.be_type = be_type
+        self.be_sub_type = be_sub_type
+        self.be_adjacent_to = be_adjacent_to
+        self.u__k = u__k
+        self.f__x = f__x
+
+
+class ElementTemplateRegistry:
+    """
+    Interned building element templates of a portfolio.
+
+    Elements with the same be_type, be_sub_type, be_adjacent_to and given u__k/f__x, and with a build year in the
+    same Table B.15 range where u__k is looked up, resolve to one template. The Annex lookups run once per
+    template, so their cost scales with the number of distinct templates, not of elements. Templates are resolved
+    when first interned; use a new registry after the Annex tables or the snapshot in use change.
+    """
+    def __init__(self):
+        self.templates = []
+        self.template_ids = {}
+        self.u__k = array('d')  # Per template id, for vectorized callers
+        self.f__x = array('d')
+
+
+    @staticmethod
+    def template_key(element_data: dict, build_year: int) -> tuple:
+        u__k = element_data.get('u__k')
+        f__x = element_data.get('f__x')
+        # The build year only matters through its Table B.15 range, and only when u__k is looked up
+        build_year_range = din_12831_data.get_build_year_range_for_u_values(build_year) \
+            if u__k is None and isinstance(build_year, int) else None
+        return (element_data.get('be_type'), element_data.get('be_sub_type'), build_year_range,
+                element_data.get('be_adjacent_to'), u__k, f__x)
+
+
+    def intern(self, element_data: dict, build_year: int) -> int:
+        """
+        Template id of a building element, resolving a new template if no element with its key was seen before.
+
+        Args:
+        - element_data: Building element dict, in the shape accepted by `BuildingElement`.
+        - build_year: Build year of the building of the element.
+
+        Returns:
+        - Template id, an index into templates, u__k and f__x.
+        """
+        key = ElementTemplateRegistry.template_key(element_data, build_year)
+        template_id = self.template_ids.get(key)
+        if template_id is None:
+            template_id = self._add(key, element_data, build_year)
+        return template_id
+
+
+    def _add(self, key: tuple, element_data: dict, build_year: int) -> int:
+        be_type, be_sub_type, _, be_adjacent_to, u__k, f__x = key
+        BuildingElement.check_values_static(
+            element_data.get('a__k'), u__k, f__x, be_adjacent_to, be_type, be_sub_type, build_year)
+        if u__k is None:
+            u__k = BuildingElement.get_simplified_thermal_transmittance_u_static(be_type, be_sub_type, build_year)
+        if f__x is None:
+            f__x = BuildingElement.get_simplified_temperature_adjustment_term_static(be_adjacent_to)
+
+        template_id = len(self.templates)
+        self.templates.append(ElementTemplate(template_id, be_type, be_sub_type, be_adjacent_to, u__k, f__x))
+        self.u__k.append(u__k)
+        self.f__x.append(f__x)
+        self.template_ids[key] = template_id
+        return template_id
+
+
+    def __len__(self) -> int:
+        return len(self.templates)
+
+
+class TemplatedBuilding:
+    """
+    Building whose elements are stored as their areas and template ids only, about 12 bytes per element.
+
+    Building values are resolved and checked as in `Building`, and the results carry the same names and values.
+    """
+    __slots__ = ('registry', 'build_year', 'v__build', 'theta__e', 'theta__int_build', 'delta__utb', 'n__build',
+                 'a__k', 'template_ids', 'building_transmission_heat_loss_coefficient', 'ventilation_heat_loss_coefficient',
+                 'building_design_transmission_heat_loss', 'ventilation_heat_loss', 'building_design_heat_load')
+
+    def __init__(self, data: dict, registry: ElementTemplateRegistry):
+        self.registry = registry
+        self.build_year = data.get('build_year')
+        self.v__build = data.get('v__build')
+        self.theta__e = data.get('theta__e')
+        if self.theta__e is None:
+            self.theta__e = Building.get_external_design_temperature_static(data.get('postcode'), data.get('latitude'), data.get('longitude'))
+        elements_data = data.get('building_elements') or []
+
+        if not isinstance(self.build_year, int):
+            raise TypeError("build_year should be of type int")
+
+        if self.v__build is None or self.v__build <= 0:
+            raise ValueError('Volume of building element, v__build, cannot be zero or negative.')
+
+        if self.theta__e is None:
+            raise ValueError('No value provided for theta__e, the external mean design temperature.')
+
+        if data.get('theta__int_build') is None and data.get('building_type') is None:
+            raise ValueError('No value provided for theta__int_build or building type. If no value is provided for theta__int_build, a value must be provided for building type.')
+
+        if len(elements_data) < 1:
+            raise ValueError('No building elements provided.')
+
+        if 'delta__utb' not in data and 'delta__utb_selection_criteria' not in data:
+            raise ValueError("If delta__utb is not provided in the data, delta__utb_selection_criteria must be included.")
+
+        self.delta__utb = data.get('delta__utb')
+        if self.delta__utb is None:
+            self.delta__utb = Building.get_simplified_additional_thermal_transmittance_for_thermal_bridges_static(data.get('delta__utb_selection_criteria'))
+        self.n__build = data.get('n__build')
+        if self.n__build is None:
+            self.n__build = Building.get_simplified_air_change_rate_static(self.build_year, data.get('air_tightness_level'))
+        self.theta__int_build = data.get('theta__int_build')
+        if self.theta__int_build is None:
+            self.theta__int_build = Building.get_simplified_internal_design_temperature_static(data.get('building_type'))
+
+        self.a__k = array('d')
+        self.template_ids = array('I')
+        for element_data in elements_data:
+            a__k = element_data.get('a__k')
+            if a__k is None or a__k <= 0:
+                raise ValueError('Area of building element, a__k, cannot be zero or negative.')
+            self.template_ids.append(registry.intern(element_data, self.build_year))
+            self.a__k.append(a__k)
+
+        # Same arithmetic and summation order as Building
+        templates = registry.templates
+        coefficients = [BuildingElement.calculate_simplified_be_transmission_heat_loss_coefficient_static(
+            a__k, templates[template_id].u__k, self.delta__utb, templates[template_id].f__x)
+            for a__k, template_id in zip(self.a__k, self.template_ids)]
+        delta__theta = self.theta__int_build - self.theta__e
+        self.building_transmission_heat_loss_coefficient = sum(coefficients)
+        self.building_design_transmission_heat_loss = sum(coefficient * delta__theta for coefficient in coefficients)
+        self.ventilation_heat_loss_coefficient = Building.calculate_simplified_building_ventilation_heat_loss_coefficient_static(self.v__build, self.n__build)
+        self.ventilation_heat_loss = self.ventilation_heat_loss_coefficient * delta__theta
+        self.building_design_heat_load = self.building_design_transmission_heat_loss + self.ventilation_heat_loss
+
+
+    @property
+    def heat_loss_coefficient(self) -> float:
+        return self.building_transmission_heat_loss_coefficient + self.ventilation_heat_loss_coefficient
+
+
+    @property
+    def building_elements(self) -> list:
+        # (a__k, template) per element
+        return [(a__k, self.registry.templates[template_id]) for a__k, template_id in zip(self.a__k, self.template_ids)]
+
+
+def calculate_templated_portfolio(buildings: list, registry: ElementTemplateRegistry) -> PortfolioResult:
+    """
+    Calculate TemplatedBuildings of one registry at once with calculate_portfolio, gathering u__k/f__x of every
+    element from the template arrays.
+
+    Returns:
+    - PortfolioResult, in the order of buildings.
+    """
+    n_elements = np.array([len(building.a__k) for building in buildings], dtype=np.intp)
+    template_ids = np.concatenate([np.frombuffer(building.template_ids, dtype=np.uint32) for building in buildings]) \
+        if buildings else np.zeros(0, dtype=np.uint32)
+    return calculate_portfolio(
+        a__k=np.concatenate([np.frombuffer(building.a__k, dtype=np.float64) for building in buildings]) if buildings else np.zeros(0),
+        u__k=np.frombuffer(registry.u__k, dtype=np.float64)[template_ids],
+        f__x=np.frombuffer(registry.f__x, dtype=np.float64)[template_ids],
+        building_index=np.repeat(np.arange(len(buildings)), n_elements),
+        v__build=[building.v__build for building in buildings],
+        n__build=[building.n__build for building in buildings],
+        theta__int_build=[building.theta__int_build for building in buildings],
+        theta__e=[building.theta__e for building in buildings],
+        delta__utb=[building.delta__utb for building in buildings],
+    )
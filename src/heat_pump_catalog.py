@@ -0,0 +1,158 @@
+import csv
+from dataclasses import dataclass
+
+import numpy as np
+
+
+CAPACITY_COLUMN_PREFIX = 'capacity_at_'
+NO_MATCH = -1
+
+
+@dataclass
+class CatalogMatch:
+    model_index: np.ndarray  # Per building, index of the cheapest feasible model, NO_MATCH if there is none
+    price: np.ndarray  # Per building, NaN without a match
+    capacity: np.ndarray  # Per building, capacity of the matched model at the building's theta__e in W, NaN without a match
+
+
+class HeatPumpCatalog:
+    """
+    Heat pump products indexed for matching against design heat loads.
+
+    Capacities are rated at a few outdoor temperatures and interpolated linearly in between (held constant beyond
+    the first and last rating temperature). For every distinct theta__e an index is built once: the models sorted
+    by capacity at theta__e, with the cheapest model of every capacity suffix. A building is then matched by one
+    binary search for its design heat load.
+    """
+    def __init__(self, models: list, prices, bivalence_points, rating_temperatures, capacities):
+        """
+        Args:
+        - models: Model names.
+        - prices: Per model.
+        - bivalence_points (°C): Per model, outdoor temperature below which the model needs a second heat generator.
+        - rating_temperatures (°C): Outdoor temperatures the capacities are rated at.
+        - capacities (W): [model, rating temperature].
+        """
+        rating_temperatures = np.asarray(rating_temperatures, dtype=np.float64)
+        order = np.argsort(rating_temperatures)
+        self.models = list(models)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.bivalence_points = np.asarray(bivalence_points, dtype=np.float64)
+        self.rating_temperatures = rating_temperatures[order]
+        self.capacities = np.asarray(capacities, dtype=np.float64)[:, order]
+
+        n_models = len(self.models)
+        if self.prices.shape != (n_models,) or self.bivalence_points.shape != (n_models,) \
+                or self.capacities.shape != (n_models, self.rating_temperatures.shape[0]):
+            raise ValueError('Catalog prices, bivalence points and capacities must have one entry per model.')
+        if np.isnan(self.capacities).any():
+            raise ValueError('Catalog capacities must be given at every rating temperature.')
+
+        self._indexes = {}  # (theta__e, monovalent) -> (sorted capacities, model order, cheapest model per suffix, capacities)
+
+
+    def capacity_at(self, theta__e: float) -> np.ndarray:
+        # Capacity of every model at theta__e in W
+        temperatures = self.rating_temperatures
+        if temperatures.shape[0] == 1:
+            return self.capacities[:, 0].copy()
+        position = np.clip(np.searchsorted(temperatures, theta__e), 1, temperatures.shape[0] - 1)
+        lower, upper = temperatures[position - 1], temperatures[position]
+        weight = np.clip((theta__e - lower) / (upper - lower), 0.0, 1.0)
+        return self.capacities[:, position - 1] * (1 - weight) + self.capacities[:, position] * weight
+
+
+    def _index(self, theta__e: float, monovalent: bool):
+        key = (float(theta__e), monovalent)
+        index = self._indexes.get(key)
+        if index is None:
+            capacities = self.capacity_at(theta__e)
+            candidates = np.flatnonzero(self.bivalence_points <= theta__e) if monovalent else np.arange(len(self.models))
+            order = candidates[np.argsort(capacities[candidates], kind='stable')]
+            sorted_capacities = capacities[order]
+            # cheapest[i] is the cheapest model among order[i:], with NO_MATCH past the end: a running minimum over
+            # the reversed prices, and the last position where the minimum was reached
+            reversed_prices = self.prices[order[::-1]]
+            is_minimum = reversed_prices <= np.minimum.accumulate(reversed_prices)
+            minimum_position = np.maximum.accumulate(np.where(is_minimum, np.arange(order.shape[0]), 0))
+            cheapest = np.append(order[::-1][minimum_position][::-1], NO_MATCH)
+            index = self._indexes[key] = (sorted_capacities, order, cheapest, capacities)
+        return index
+
+
+    def feasible_models(self, design_heat_load: float, theta__e: float, monovalent: bool = False) -> np.ndarray:
+        """
+        Models whose capacity at theta__e covers design_heat_load.
+
+        Args:
+        - design_heat_load (W), theta__e (°C): Of the building.
+        - monovalent: Only models that need no second heat generator at theta__e (bivalence point <= theta__e).
+
+        Returns:
+        - Model indices, by ascending capacity at theta__e.
+        """
+        sorted_capacities, order, _, _ = self._index(theta__e, monovalent)
+        return order[np.searchsorted(sorted_capacities, design_heat_load, side='left'):]
+
+
+    def match(self, design_heat_load, theta__e, monovalent: bool = False) -> CatalogMatch:
+        """
+        Match buildings to the cheapest model whose capacity at their theta__e covers their design heat load.
+
+        Buildings are grouped by theta__e, so a portfolio costs one index per distinct theta__e (cached across calls,
+        e.g. for retrofit scenarios) and one binary search per building.
+
+        Args:
+        - design_heat_load (W), theta__e (°C): Per building, or scalars.
+        - monovalent: Only models that need no second heat generator at theta__e.
+
+        Returns:
+        - CatalogMatch with the matched model, its price and its capacity per building.
+        """
+        design_heat_load = np.atleast_1d(np.asarray(design_heat_load, dtype=np.float64))
+        theta__e = np.broadcast_to(np.asarray(theta__e, dtype=np.float64), design_heat_load.shape)
+
+        model_index = np.full(design_heat_load.shape, NO_MATCH, dtype=np.intp)
+        capacity = np.full(design_heat_load.shape, np.nan)
+        distinct_theta__e, group = np.unique(theta__e, return_inverse=True)
+        for group_index, group_theta__e in enumerate(distinct_theta__e):
+            members = np.flatnonzero(group == group_index)
+            sorted_capacities, _, cheapest, capacities = self._index(group_theta__e, monovalent)
+            models = cheapest[np.searchsorted(sorted_capacities, design_heat_load[members], side='left')]
+            model_index[members] = models
+            matched = models != NO_MATCH
+            capacity[members[matched]] = capacities[models[matched]]
+
+        price = np.where(model_index != NO_MATCH, self.prices[model_index], np.nan)
+        return CatalogMatch(model_index=model_index, price=price, capacity=capacity)
+
+
+    def model_names(self, model_index) -> list:
+        return [self.models[index] if index != NO_MATCH else None for index in np.atleast_1d(model_index)]
+
+
+def load_heat_pump_catalog(path) -> HeatPumpCatalog:
+    """
+    Load a heat pump catalog from a CSV file.
+
+    The file has the columns model, price, bivalence_point (°C) and one capacity_at_<temperature> column (kW) per
+    rating temperature, e.g. capacity_at_-7, capacity_at_2, capacity_at_7.
+
+    Returns:
+    - HeatPumpCatalog with the capacities in W.
+    """
+    with open(path, newline='', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    if not rows:
+        raise ValueError(f'{path} holds no heat pump models.')
+    capacity_columns = [column for column in rows[0] if column.startswith(CAPACITY_COLUMN_PREFIX)]
+    if not capacity_columns:
+        raise ValueError(f'{path} has no {CAPACITY_COLUMN_PREFIX}<temperature> columns.')
+
+    return HeatPumpCatalog(
+        models=[row['model'] for row in rows],
+        prices=[float(row['price']) for row in rows],
+        bivalence_points=[float(row['bivalence_point']) for row in rows],
+        rating_temperatures=[float(column[len(CAPACITY_COLUMN_PREFIX):]) for column in capacity_columns],
+        capacities=[[float(row[column]) * 1000 for column in capacity_columns] for row in rows],
+    )
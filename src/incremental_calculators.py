@@ -0,0 +1,271 @@
+from src.simplified_calculators import Building, BuildingElement
+
+
+# Element inputs that the resolved u__k and f__x depend on
+U__K_INPUTS = frozenset(('u__k', 'be_type', 'be_sub_type'))
+F__X_INPUTS = frozenset(('f__x', 'be_adjacent_to'))
+ELEMENT_INPUTS = frozenset(('a__k',)) | U__K_INPUTS | F__X_INPUTS
+
+
+class IncrementalBuildingElement:
+    """
+    Building element of an IncrementalBuilding. Holds the element inputs and the resolved u__k/f__x; the design
+    transmission loss is derived from the parent building on access, so it never goes stale.
+    """
+    __slots__ = ('building', 'data', 'a__k', 'u__k', 'f__x')
+
+    def __init__(self, building: 'IncrementalBuilding', data: dict):
+        self.building = building
+        self.data = {key: data.get(key) for key in ELEMENT_INPUTS}
+        self.a__k = None
+        self.u__k = None
+        self.f__x = None
+
+
+    @property
+    def be_type(self) -> str:
+        return self.data['be_type']
+
+
+    @property
+    def be_sub_type(self) -> str:
+        return self.data['be_sub_type']
+
+
+    @property
+    def be_adjacent_to(self) -> str:
+        return self.data['be_adjacent_to']
+
+
+    def resolved_values(self, data: dict, build_year: int, changed_inputs=ELEMENT_INPUTS) -> tuple:
+        """
+        Resolve the element values for data without modifying the element; values that do not depend on the
+        changed inputs are taken over from the element.
+
+        Returns:
+        - Tuple of a__k, u__k and f__x.
+        """
+        BuildingElement.check_values_static(
+            data['a__k'], data['u__k'], data['f__x'], data['be_adjacent_to'], data['be_type'], data['be_sub_type'], build_year)
+        u__k = self.u__k
+        if not U__K_INPUTS.isdisjoint(changed_inputs):
+            u__k = data['u__k'] if data['u__k'] is not None else \
+                BuildingElement.get_simplified_thermal_transmittance_u_static(data['be_type'], data['be_sub_type'], build_year)
+        f__x = self.f__x
+        if not F__X_INPUTS.isdisjoint(changed_inputs):
+            f__x = data['f__x'] if data['f__x'] is not None else \
+                BuildingElement.get_simplified_temperature_adjustment_term_static(data['be_adjacent_to'])
+        return data['a__k'], IncrementalBuildingElement.check_u__k_static(u__k), f__x
+
+
+    @staticmethod
+    def check_u__k_static(u__k: float) -> float:
+        # Empty cells of Table B.15 resolve to None
+        if u__k is None:
+            raise ValueError('Table B.15 defines no U-value for be_type/be_sub_type in the build year range of build_year; u__k must be provided.')
+        return u__k
+
+
+    @staticmethod
+    def area_weighted_values_static(a__k: float, u__k: float, f__x: float) -> tuple:
+        # Contributions of an element to the building sums, see the properties below
+        return a__k * u__k * f__x, a__k * f__x
+
+
+    @property
+    def area_weighted_transmittance(self) -> float:
+        # a__k * u__k * f__x in W/K
+        return self.a__k * self.u__k * self.f__x
+
+
+    @property
+    def area_weighted_adjustment(self) -> float:
+        # a__k * f__x in m^2, multiplied by delta__utb for the thermal bridge share
+        return self.a__k * self.f__x
+
+
+    @property
+    def design_transmission_loss(self) -> float:
+        building = self.building
+        return BuildingElement.calculate_simplified_be_design_transmission_loss_static(
+            self.a__k, self.u__k, building.delta__utb, self.f__x, building.theta__int_build, building.theta__e)
+
+
+class IncrementalBuilding:
+    """
+    Mutable building model for interactive editing.
+
+    The input dict is validated and resolved once, like `Building`. After that, every edit only recomputes the
+    values depending on it:
+    - Element edits re-resolve u__k/f__x of that element if their inputs changed, and adjust the building sums
+      a__k∙u__k∙f__x and a__k∙f__x by the difference.
+    - theta__e, theta__int_build, delta__utb, v__build and n__build edits are O(1): the losses are derived from the
+      sums, which do not depend on them.
+    - build_year edits re-resolve only the defaulted u__k values and n__build.
+
+    Setting a building value to None resolves it from the Annex tables again, as in `Building`.
+    """
+    def __init__(self, data: dict):
+        building = Building(data)
+
+        self.build_year = building.build_year
+        self.v__build = building.v__build
+        self.building_type = building.building_type
+        self.delta__utb_selection_criteria = building.delta__utb_selection_criteria
+        self.air_tightness_level = building.air_tightness_level
+        self.theta__e = building.theta__e
+        self.theta__int_build = building.theta__int_build
+        self.delta__utb = building.delta__utb
+        self.n__build = building.n__build
+
+        # Whether the value was given, as opposed to resolved from the Annex tables
+        self.n__build_given = data.get('n__build') is not None
+
+        self.building_elements = []
+        self._sum_a_u_f = 0.0
+        self._sum_a_f = 0.0
+        for element, element_data in zip(building.building_elements, data['building_elements']):
+            incremental_element = IncrementalBuildingElement(self, element_data)
+            incremental_element.a__k = element.a__k
+            incremental_element.u__k = element.u__k
+            incremental_element.f__x = element.f__x
+            self.building_elements.append(incremental_element)
+            self._add_to_sums(incremental_element, 1)
+
+
+    def _add_to_sums(self, element: IncrementalBuildingElement, sign: int):
+        self._sum_a_u_f += sign * element.area_weighted_transmittance
+        self._sum_a_f += sign * element.area_weighted_adjustment
+
+
+    def _sums_with(self, removed: list, added: list) -> tuple:
+        # Building sums with the contributions of the removed elements replaced by the added (a__k, u__k, f__x)
+        # values; computed up front, so a failing edit leaves the model untouched
+        sum_a_u_f, sum_a_f = self._sum_a_u_f, self._sum_a_f
+        for element in removed:
+            sum_a_u_f -= element.area_weighted_transmittance
+            sum_a_f -= element.area_weighted_adjustment
+        for values in added:
+            a_u_f, a_f = IncrementalBuildingElement.area_weighted_values_static(*values)
+            sum_a_u_f += a_u_f
+            sum_a_f += a_f
+        return sum_a_u_f, sum_a_f
+
+
+    def recalculate(self):
+        # Re-sum from the elements, dropping any rounding accumulated by incremental updates
+        self._sum_a_u_f = sum(element.area_weighted_transmittance for element in self.building_elements)
+        self._sum_a_f = sum(element.area_weighted_adjustment for element in self.building_elements)
+
+
+    # Element edits; each one resolves and checks all new values before it changes the model
+    def update_element(self, index: int, **changes):
+        unknown_inputs = set(changes) - ELEMENT_INPUTS
+        if unknown_inputs:
+            raise KeyError(f'Unknown building element inputs: {sorted(unknown_inputs)}')
+
+        element = self.building_elements[index]
+        data = {**element.data, **changes}
+        values = element.resolved_values(data, self.build_year, changes)
+        sums = self._sums_with([element], [values])
+
+        element.data = data
+        element.a__k, element.u__k, element.f__x = values
+        self._sum_a_u_f, self._sum_a_f = sums
+
+
+    def add_element(self, element_data: dict) -> int:
+        element = IncrementalBuildingElement(self, element_data)
+        values = element.resolved_values(element.data, self.build_year)
+        sums = self._sums_with([], [values])
+
+        element.a__k, element.u__k, element.f__x = values
+        self.building_elements.append(element)
+        self._sum_a_u_f, self._sum_a_f = sums
+        return len(self.building_elements) - 1
+
+
+    def remove_element(self, index: int):
+        if len(self.building_elements) < 2:
+            raise ValueError('No building elements provided.')
+        self._add_to_sums(self.building_elements.pop(index), -1)
+
+
+    # Building edits
+    def set_theta__e(self, theta__e: float):
+        if theta__e is None:
+            raise ValueError('No value provided for theta__e, the external mean design temperature.')
+        self.theta__e = theta__e
+
+
+    def set_theta__int_build(self, theta__int_build: float = None):
+        self.theta__int_build = theta__int_build if theta__int_build is not None else \
+            Building.get_simplified_internal_design_temperature_static(self.building_type)
+
+
+    def set_delta__utb(self, delta__utb: float = None):
+        self.delta__utb = delta__utb if delta__utb is not None else \
+            Building.get_simplified_additional_thermal_transmittance_for_thermal_bridges_static(self.delta__utb_selection_criteria)
+
+
+    def set_n__build(self, n__build: float = None):
+        self.n__build_given = n__build is not None
+        self.n__build = n__build if n__build is not None else \
+            Building.get_simplified_air_change_rate_static(self.build_year, self.air_tightness_level)
+
+
+    def set_v__build(self, v__build: float):
+        if v__build is None or v__build <= 0:
+            raise ValueError('Volume of building element, v__build, cannot be zero or negative.')
+        self.v__build = v__build
+
+
+    def set_build_year(self, build_year: int):
+        if not isinstance(build_year, int):
+            raise TypeError("build_year should be of type int")
+        defaulted_elements = [element for element in self.building_elements if element.data['u__k'] is None]
+        u_values = [IncrementalBuildingElement.check_u__k_static(BuildingElement.get_simplified_thermal_transmittance_u_static(
+            element.data['be_type'], element.data['be_sub_type'], build_year)) for element in defaulted_elements]
+        n__build = self.n__build if self.n__build_given else \
+            Building.get_simplified_air_change_rate_static(build_year, self.air_tightness_level)
+        sums = self._sums_with(defaulted_elements, [(element.a__k, u__k, element.f__x)
+                                                    for element, u__k in zip(defaulted_elements, u_values)])
+
+        self.build_year = build_year
+        self.n__build = n__build
+        for element, u__k in zip(defaulted_elements, u_values):
+            element.u__k = u__k
+        self._sum_a_u_f, self._sum_a_f = sums
+
+
+    # Results
+    @property
+    def building_transmission_heat_loss_coefficient(self) -> float:
+        # Σ a__k∙(u__k + delta__utb)∙f__x in W/K
+        return self._sum_a_u_f + self.delta__utb * self._sum_a_f
+
+
+    @property
+    def ventilation_heat_loss_coefficient(self) -> float:
+        return Building.calculate_simplified_building_ventilation_heat_loss_coefficient_static(self.v__build, self.n__build)
+
+
+    @property
+    def heat_loss_coefficient(self) -> float:
+        return self.building_transmission_heat_loss_coefficient + self.ventilation_heat_loss_coefficient
+
+
+    @property
+    def building_design_transmission_heat_loss(self) -> float:
+        return self.building_transmission_heat_loss_coefficient * (self.theta__int_build - self.theta__e)
+
+
+    @property
+    def ventilation_heat_loss(self) -> float:
+        return Building.calculate_simplified_building_ventilation_loss_static(
+            self.v__build, self.n__build, self.theta__int_build, self.theta__e)
+
+
+    @property
+    def building_design_heat_load(self) -> float:
+        return self.building_design_transmission_heat_loss + self.ventilation_heat_loss
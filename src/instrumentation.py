@@ -0,0 +1,76 @@
+from contextlib import contextmanager
+from time import perf_counter
+
+
+# Stages recorded by Building and BuildingElement
+BUILDING_STAGES = ('validation', 'delta__utb_lookup', 'n__build_lookup', 'theta__int_build_lookup', 'elements', 'aggregation')
+ELEMENT_STAGES = ('element_validation', 'u__k_lookup', 'f__x_lookup', 'element_loss')
+# Stages recorded by the vectorized batch path (batch_runner.calculate_records and the functions it calls); the
+# record_fallback stage includes the stages of the records it calculates one by one
+BATCH_STAGES = ('theta__e_fill', 'batch_validation', 'annex_resolution', 'arithmetic', 'result_assembly', 'record_fallback')
+
+
+class CalculationStats:
+    """
+    Counters and cumulative timings per calculation stage.
+
+    Hooks are called with (stage, seconds) for every recorded stage, e.g. to forward them to a metrics system.
+    """
+    def __init__(self, hooks=None):
+        self.counts = {}
+        self.seconds = {}
+        self.hooks = list(hooks or [])
+
+
+    def lap(self, stage: str, start: float) -> float:
+        # Record the time since start for stage and return the current time as start of the next stage
+        now = perf_counter()
+        seconds = now - start
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        for hook in self.hooks:
+            hook(stage, seconds)
+        return now
+
+
+    def snapshot(self) -> dict:
+        return {stage: {'count': self.counts[stage], 'seconds': self.seconds[stage]} for stage in self.counts}
+
+
+    def reset(self):
+        self.counts.clear()
+        self.seconds.clear()
+
+
+# Stats the calculation currently records into; None while instrumentation is disabled, so the calculation path
+# only pays an `is not None` check per stage
+active = None
+
+
+def enable(hooks=None) -> CalculationStats:
+    global active
+    active = CalculationStats(hooks)
+    return active
+
+
+def disable():
+    global active
+    active = None
+
+
+@contextmanager
+def instrumented(hooks=None):
+    """
+    Record the stages of every calculation inside the block.
+
+    Yields:
+    - CalculationStats, whose snapshot() holds the counts and cumulative seconds per stage.
+    """
+    global active
+    previous = active
+    stats = CalculationStats(hooks)
+    active = stats
+    try:
+        yield stats
+    finally:
+        active = previous
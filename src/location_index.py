@@ -0,0 +1,230 @@
+import csv
+import math
+
+import numpy as np
+
+
+LOCATIONS_PER_CELL = 2  # Average number of locations per grid cell when the cell size is derived from the data
+BRUTE_FORCE_CHUNK_SIZE = 1024  # Queries per chunk of the brute-force fallback
+
+# 3x3 neighbourhood of a grid cell
+NEIGHBOUR_OFFSETS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+
+
+class LocationIndex:
+    """
+    Reference locations with their external design temperature theta__e, indexed by postcode and position.
+
+    Positions are projected equirectangularly (longitude scaled by the cosine of the mean latitude), which is
+    accurate for distances within a country, and binned into a grid of square cells. A nearest-location query
+    only looks at the 3x3 cells around the query; queries whose nearest candidate is farther than one cell, or
+    that have no candidate, fall back to comparing against all locations. Queries are answered in batches.
+
+    The index holds only NumPy arrays and plain dicts, so it pickles to worker processes; save() and
+    load_location_index() store it as an .npz file.
+    """
+    def __init__(self, latitudes, longitudes, theta__e, postcodes=None, cell_size: float = None):
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.theta__e = np.asarray(theta__e, dtype=np.float64)
+        self.postcodes = [None] * self.theta__e.shape[0] if postcodes is None else [
+            normalize_postcode(postcode) for postcode in postcodes]
+
+        n_locations = self.theta__e.shape[0]
+        if self.latitudes.shape != (n_locations,) or self.longitudes.shape != (n_locations,) or len(self.postcodes) != n_locations:
+            raise ValueError('Location latitudes, longitudes, theta__e and postcodes must have one entry per location.')
+        if n_locations == 0:
+            raise ValueError('A location index needs at least one location.')
+
+        self.postcode_rows = {postcode: row for row, postcode in enumerate(self.postcodes) if postcode is not None}
+
+        self.longitude_scale = math.cos(math.radians(float(np.mean(self.latitudes))))
+        self.x, self.y = self._project(self.latitudes, self.longitudes)
+        self.x_min, self.y_min = self.x.min(), self.y.min()
+        if cell_size is None:
+            # Cells of LOCATIONS_PER_CELL locations on average: smaller cells mean fewer candidates per query, but
+            # more queries in sparse areas that fall back to comparing against all locations
+            area = max((self.x.max() - self.x_min) * (self.y.max() - self.y_min), 1e-6)
+            cell_size = math.sqrt(area * LOCATIONS_PER_CELL / n_locations)
+        self.cell_size = float(cell_size)
+        cell_x, cell_y = self._cells(self.x, self.y)
+        self.n_cells_x, self.n_cells_y = int(cell_x.max()) + 1, int(cell_y.max()) + 1
+        # Locations sorted by cell id, so the locations of a cell are one slice
+        cell_ids = self._cell_ids(cell_x, cell_y)
+        self.cell_order = np.argsort(cell_ids, kind='stable')
+        self.sorted_cell_ids = cell_ids[self.cell_order]
+
+
+    def _project(self, latitudes, longitudes):
+        return np.asarray(longitudes, dtype=np.float64) * self.longitude_scale, np.asarray(latitudes, dtype=np.float64)
+
+
+    def _cells(self, x, y):
+        return np.floor((x - self.x_min) / self.cell_size).astype(np.intp), np.floor((y - self.y_min) / self.cell_size).astype(np.intp)
+
+
+    def _cell_ids(self, cell_x, cell_y):
+        # Unique ids for cells up to two cells outside the grid; queries farther out are clipped (see nearest)
+        return (cell_x + 2) * (self.n_cells_y + 4) + (cell_y + 2)
+
+
+    def nearest(self, latitudes, longitudes) -> np.ndarray:
+        """
+        Nearest reference location of every query position, in one batched query.
+
+        Args:
+        - latitudes, longitudes: Query positions in degrees, arrays of equal length or scalars.
+
+        Returns:
+        - Row of the nearest reference location per query.
+        """
+        query_x, query_y = self._project(np.atleast_1d(latitudes), np.atleast_1d(longitudes))
+        n_queries = query_x.shape[0]
+        cell_x, cell_y = self._cells(query_x, query_y)
+        # Queries more than one cell outside the grid are farther than one cell from every location, so clipping
+        # their cell only changes which candidates they see before the fallback
+        cell_x = np.clip(cell_x, -1, self.n_cells_x)
+        cell_y = np.clip(cell_y, -1, self.n_cells_y)
+
+        # Candidate (query, location) pairs of the 3x3 neighbourhoods
+        neighbour_ids = np.stack([self._cell_ids(cell_x + dx, cell_y + dy) for dx, dy in NEIGHBOUR_OFFSETS], axis=1).ravel()
+        starts = np.searchsorted(self.sorted_cell_ids, neighbour_ids, side='left')
+        counts = np.searchsorted(self.sorted_cell_ids, neighbour_ids, side='right') - starts
+        pair_query = np.repeat(np.repeat(np.arange(n_queries), len(NEIGHBOUR_OFFSETS)), counts)
+        pair_position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+        pair_location = self.cell_order[pair_position]
+        pair_distance = (self.x[pair_location] - query_x[pair_query]) ** 2 + (self.y[pair_location] - query_y[pair_query]) ** 2
+
+        # Closest candidate per query; the pairs are grouped by query, so this is a segmented minimum
+        rows = np.full(n_queries, -1, dtype=np.intp)
+        distances = np.full(n_queries, np.inf)
+        query_counts = counts.reshape(n_queries, len(NEIGHBOUR_OFFSETS)).sum(axis=1)
+        has_candidates = query_counts > 0
+        if pair_distance.shape[0]:
+            segment_starts = (np.cumsum(query_counts) - query_counts)[has_candidates]
+            distances[has_candidates] = np.minimum.reduceat(pair_distance, segment_starts)
+            closest = pair_distance == distances[pair_query]
+            rows[pair_query[closest]] = pair_location[closest]
+
+        fallback = np.flatnonzero(distances > self.cell_size ** 2)
+        for start in range(0, fallback.shape[0], BRUTE_FORCE_CHUNK_SIZE):
+            queries = fallback[start:start + BRUTE_FORCE_CHUNK_SIZE]
+            all_distances = (self.x[None, :] - query_x[queries, None]) ** 2 + (self.y[None, :] - query_y[queries, None]) ** 2
+            rows[queries] = np.argmin(all_distances, axis=1)
+        return rows
+
+
+    def resolve(self, postcode=None, latitude: float = None, longitude: float = None):
+        # theta__e of the postcode if it is in the index, else of the location nearest to latitude/longitude, else None
+        row = self.postcode_rows.get(normalize_postcode(postcode))
+        if row is not None:
+            return float(self.theta__e[row])
+        if latitude is not None and longitude is not None:
+            return float(self.theta__e[self.nearest(latitude, longitude)[0]])
+        return None
+
+
+    def resolve_many(self, postcodes, latitudes, longitudes) -> np.ndarray:
+        """
+        Resolve theta__e for many records: by postcode where it is in the index, else by one batched
+        nearest-location query for all records with coordinates.
+
+        Args:
+        - postcodes, latitudes, longitudes: Per record, None where not known.
+
+        Returns:
+        - theta__e per record in °C, NaN where neither the postcode nor coordinates resolve it.
+        """
+        rows = np.array([self.postcode_rows.get(normalize_postcode(postcode), -1) for postcode in postcodes], dtype=np.intp)
+        latitudes = np.array([_coordinate(latitude) for latitude in latitudes], dtype=np.float64)
+        longitudes = np.array([_coordinate(longitude) for longitude in longitudes], dtype=np.float64)
+        by_position = np.flatnonzero((rows == -1) & ~np.isnan(latitudes) & ~np.isnan(longitudes))
+        if by_position.shape[0]:
+            rows[by_position] = self.nearest(latitudes[by_position], longitudes[by_position])
+        return np.where(rows != -1, self.theta__e[rows], np.nan)
+
+
+    def save(self, path):
+        np.savez(path, latitudes=self.latitudes, longitudes=self.longitudes, theta__e=self.theta__e,
+                 postcodes=np.array(['' if postcode is None else postcode for postcode in self.postcodes], dtype=str),
+                 cell_size=self.cell_size)
+
+
+def normalize_postcode(postcode):
+    if postcode is None:
+        return None
+    postcode = str(postcode).strip()
+    return postcode or None
+
+
+def _coordinate(value) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+
+
+def load_location_index(path, cell_size: float = None) -> LocationIndex:
+    """
+    Load a location index from an .npz file written by LocationIndex.save, or build it from a CSV reference table
+    with the columns latitude, longitude and theta__e, and optionally postcode.
+
+    Returns:
+    - LocationIndex
+    """
+    if str(path).endswith('.npz'):
+        with np.load(path) as arrays:
+            return LocationIndex(arrays['latitudes'], arrays['longitudes'], arrays['theta__e'], list(arrays['postcodes']),
+                                 cell_size if cell_size is not None else float(arrays['cell_size']))
+
+    with open(path, newline='', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    return LocationIndex(
+        latitudes=[float(row['latitude']) for row in rows],
+        longitudes=[float(row['longitude']) for row in rows],
+        theta__e=[float(row['theta__e']) for row in rows],
+        postcodes=[row.get('postcode') for row in rows],
+        cell_size=cell_size,
+    )
+
+
+# Index used by Building for records without theta__e; None until set_default_index or use_location_index
+_default_index = None
+
+
+def get_default_index() -> LocationIndex:
+    return _default_index
+
+
+def set_default_index(index: LocationIndex = None):
+    global _default_index
+    _default_index = index
+
+
+def use_location_index(path) -> LocationIndex:
+    # Load an index and make it the default index of this process
+    index = load_location_index(path)
+    set_default_index(index)
+    return index
+
+
+def fill_theta__e(records: list, index: LocationIndex = None) -> list:
+    """
+    Resolve theta__e of all records without one in one batched query.
+
+    Args:
+    - records: List of building dicts, with postcode and/or latitude/longitude where theta__e is missing.
+    - index: Location index, defaults to the default index.
+
+    Returns:
+    - The records, with copies carrying the resolved theta__e in place of the records it was resolved for.
+    """
+    index = index if index is not None else _default_index
+    missing = [position for position, data in enumerate(records) if isinstance(data, dict) and data.get('theta__e') is None]
+    if index is None or not missing:
+        return records
+    theta__e = index.resolve_many([records[position].get('postcode') for position in missing],
+                                  [records[position].get('latitude') for position in missing],
+                                  [records[position].get('longitude') for position in missing])
+    records = list(records)
+    for position, value in zip(missing, theta__e):
+        if not np.isnan(value):
+            records[position] = {**records[position], 'theta__e': float(value)}
+    return records
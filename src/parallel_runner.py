@@ -0,0 +1,125 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from src import location_index
+from src.data import din_12831_compiled, din_12831_snapshot
+
+
+DEFAULT_MAX_PENDING_CHUNKS_PER_WORKER = 2
+
+
+class ThroughputReport:
+    """
+    Records read, buildings calculated and time spent per worker process of a parallel run. Records that are
+    rejected count as records, but not as buildings.
+    """
+    def __init__(self):
+        self.workers = {}  # worker pid -> {'chunks', 'records', 'buildings', 'busy_seconds'}
+        self.wall_seconds = 0.0
+
+
+    def record(self, pid: int, records: int, buildings: int, busy_seconds: float):
+        worker = self.workers.setdefault(pid, {'chunks': 0, 'records': 0, 'buildings': 0, 'busy_seconds': 0.0})
+        worker['chunks'] += 1
+        worker['records'] += records
+        worker['buildings'] += buildings
+        worker['busy_seconds'] += busy_seconds
+
+
+    @property
+    def total_records(self) -> int:
+        return sum(worker['records'] for worker in self.workers.values())
+
+
+    @property
+    def total_buildings(self) -> int:
+        return sum(worker['buildings'] for worker in self.workers.values())
+
+
+    def buildings_per_second_per_worker(self) -> dict:
+        return {pid: worker['buildings'] / worker['busy_seconds'] if worker['busy_seconds'] else 0.0
+                for pid, worker in self.workers.items()}
+
+
+    def as_dict(self) -> dict:
+        rates = self.buildings_per_second_per_worker()
+        return {
+            'total_records': self.total_records,
+            'total_buildings': self.total_buildings,
+            'wall_seconds': self.wall_seconds,
+            'buildings_per_second': self.total_buildings / self.wall_seconds if self.wall_seconds else 0.0,
+            'workers': [{'pid': pid, **worker, 'buildings_per_second': rates[pid]} for pid, worker in self.workers.items()],
+        }
+
+
+    def format(self) -> str:
+        report = self.as_dict()
+        lines = [f"{report['total_buildings']} buildings of {report['total_records']} records in {report['wall_seconds']:.2f} s "
+                 f"({report['buildings_per_second']:.0f} buildings/s, {len(report['workers'])} workers)"]
+        for worker in report['workers']:
+            lines.append(f"  worker {worker['pid']}: {worker['buildings']} buildings of {worker['records']} records in {worker['chunks']} chunks, "
+                         f"{worker['buildings_per_second']:.0f} buildings/s")
+        return '\n'.join(lines)
+
+
+def initialize_worker(snapshot_path=None, location_index_path=None):
+    # Runs once per worker process; the Annex tables are loaded here (at import of din_12831_data, or by mapping
+    # a snapshot file whose pages all workers share) and never travel with the tasks, which only carry building records
+    if snapshot_path is not None:
+        din_12831_snapshot.use_snapshot(snapshot_path)
+    if location_index_path is not None:
+        location_index.use_location_index(location_index_path)
+    din_12831_compiled.get_compiled_tables()
+
+
+def run_timed_chunk(function, chunk: list):
+    start = perf_counter()
+    result = function(chunk)
+    return os.getpid(), len(chunk), perf_counter() - start, result
+
+
+def map_chunks_parallel(function, chunks, max_workers: int = None, report: ThroughputReport = None,
+                        max_pending_chunks: int = None, snapshot_path=None,
+                        location_index_path=None, count_results=None):
+    """
+    Apply function to every chunk in a pool of worker processes.
+
+    Chunks are submitted lazily, with at most max_pending_chunks in flight, so memory stays bounded for
+    arbitrarily long chunk iterables.
+
+    Args:
+    - function: Module-level function taking a chunk, e.g. batch_runner.calculate_chunk.
+    - chunks: Iterable of chunks, each a picklable list of records.
+    - max_workers: Number of worker processes, defaults to the number of CPUs.
+    - report: Optional ThroughputReport that is filled in while the results are consumed.
+    - max_pending_chunks: Chunks submitted ahead of the one being consumed, defaults to two per worker.
+    - snapshot_path: Optional snapshot of the compiled tables (din_12831_snapshot) for the workers to map.
+    - location_index_path: Optional location index (location_index) for the workers to resolve theta__e with.
+    - count_results: Function returning the number of buildings calculated in a chunk result for the report, e.g.
+      batch_runner.count_chunk_results; by default every record of a chunk counts as a building.
+
+    Yields:
+    - function(chunk) for every chunk, in input order.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending_chunks = max_pending_chunks or max_workers * DEFAULT_MAX_PENDING_CHUNKS_PER_WORKER
+    start = perf_counter()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=initialize_worker,
+                             initargs=(snapshot_path, location_index_path)) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(run_timed_chunk, function, chunk))
+            if len(pending) >= max_pending_chunks:
+                yield _collect(pending.popleft(), report, start, count_results)
+        while pending:
+            yield _collect(pending.popleft(), report, start, count_results)
+
+
+def _collect(future, report: ThroughputReport, start: float, count_results=None):
+    pid, records, busy_seconds, result = future.result()
+    if report is not None:
+        report.record(pid, records, count_results(result) if count_results is not None else records, busy_seconds)
+        report.wall_seconds = perf_counter() - start
+    return result
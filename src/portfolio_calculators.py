@@ -0,0 +1,235 @@
+from dataclasses import dataclass
+from itertools import repeat
+from time import perf_counter
+
+import numpy as np
+
+from src import instrumentation
+from src.data import din_12831_compiled, din_12831_data
+from src.simplified_calculators import Building, BuildingElement
+
+
+@dataclass
+class PortfolioResult:
+    element_design_transmission_loss: np.ndarray  # Per element, in W, aligned with the element input arrays
+    building_design_transmission_heat_loss: np.ndarray  # Per building, in W
+    ventilation_heat_loss: np.ndarray  # Per building, in W
+    building_design_heat_load: np.ndarray  # Per building, in W
+    element_transmission_heat_loss_coefficient: np.ndarray  # Per element, in W/K
+    building_transmission_heat_loss_coefficient: np.ndarray  # Per building, in W/K
+    ventilation_heat_loss_coefficient: np.ndarray  # Per building, in W/K
+
+    @property
+    def heat_loss_coefficient(self) -> np.ndarray:
+        # Per building, in W/K
+        return self.building_transmission_heat_loss_coefficient + self.ventilation_heat_loss_coefficient
+
+
+def calculate_portfolio(a__k, u__k, f__x, building_index,
+                        v__build, n__build, theta__int_build, theta__e, delta__utb) -> PortfolioResult:
+    """
+    Calculate the design heat load of many buildings at once from columnar inputs.
+
+    Element inputs are flat arrays of equal length; building_index maps each element to the
+    position of its building in the per-building arrays. All values must already be resolved
+    (no None/defaults), e.g. as found on the attributes of a `Building`.
+
+    Args:
+    - a__k (m^2), u__k (W/(m^2∙K)), f__x (-): Per element values.
+    - building_index (int): Per element index into the per-building arrays.
+    - v__build (m^3), n__build (h^-1), theta__int_build (°C), theta__e (°C), delta__utb (W/(m^2∙K)): Per building values.
+
+    Returns:
+    - PortfolioResult with element transmission losses and per-building loss totals in Watts, and the
+      corresponding specific heat losses in W/K.
+    """
+    stats = instrumentation.active
+    if stats is not None:
+        start = perf_counter()
+
+    a__k = np.asarray(a__k, dtype=np.float64)
+    u__k = np.asarray(u__k, dtype=np.float64)
+    f__x = np.asarray(f__x, dtype=np.float64)
+    building_index = np.asarray(building_index, dtype=np.intp)
+    v__build = np.asarray(v__build, dtype=np.float64)
+    n__build = np.asarray(n__build, dtype=np.float64)
+    theta__int_build = np.asarray(theta__int_build, dtype=np.float64)
+    theta__e = np.asarray(theta__e, dtype=np.float64)
+    delta__utb = np.asarray(delta__utb, dtype=np.float64)
+
+    n_elements = a__k.shape[0]
+    n_buildings = v__build.shape[0]
+
+    if any(array.shape != (n_elements,) for array in (u__k, f__x, building_index)):
+        raise ValueError('Element arrays a__k, u__k, f__x and building_index must be one-dimensional and of equal length.')
+
+    if any(array.shape != (n_buildings,) for array in (n__build, theta__int_build, theta__e, delta__utb)):
+        raise ValueError('Building arrays v__build, n__build, theta__int_build, theta__e and delta__utb must be one-dimensional and of equal length.')
+
+    if n_elements and (building_index.min() < 0 or building_index.max() >= n_buildings):
+        raise ValueError('building_index refers to a building that is not present in the building arrays.')
+
+    if np.any(a__k <= 0):
+        raise ValueError('Area of building element, a__k, cannot be zero or negative.')
+
+    if np.any(v__build <= 0):
+        raise ValueError('Volume of building element, v__build, cannot be zero or negative.')
+
+    delta__theta = theta__int_build - theta__e
+
+    # Same formulas as BuildingElement, with the building-level values broadcast onto the elements
+    element_transmission_heat_loss_coefficient = BuildingElement.calculate_simplified_be_transmission_heat_loss_coefficient_static(
+        a__k, u__k, delta__utb[building_index], f__x)
+    element_design_transmission_loss = element_transmission_heat_loss_coefficient * delta__theta[building_index]
+
+    # Segmented sums of the element values per building; bincount adds in element order, like sum() in Building
+    building_design_transmission_heat_loss = np.bincount(
+        building_index, weights=element_design_transmission_loss, minlength=n_buildings)
+    building_transmission_heat_loss_coefficient = np.bincount(
+        building_index, weights=element_transmission_heat_loss_coefficient, minlength=n_buildings)
+
+    ventilation_heat_loss_coefficient = Building.calculate_simplified_building_ventilation_heat_loss_coefficient_static(
+        v__build, n__build)
+    ventilation_heat_loss = ventilation_heat_loss_coefficient * delta__theta
+
+    if stats is not None:
+        stats.lap('arithmetic', start)
+    return PortfolioResult(
+        element_design_transmission_loss=element_design_transmission_loss,
+        building_design_transmission_heat_loss=building_design_transmission_heat_loss,
+        ventilation_heat_loss=ventilation_heat_loss,
+        building_design_heat_load=building_design_transmission_heat_loss + ventilation_heat_loss,
+        element_transmission_heat_loss_coefficient=element_transmission_heat_loss_coefficient,
+        building_transmission_heat_loss_coefficient=building_transmission_heat_loss_coefficient,
+        ventilation_heat_loss_coefficient=ventilation_heat_loss_coefficient,
+    )
+
+
+def _given(values: list) -> np.ndarray:
+    # Given values as float64, NaN where the value is None and has to be resolved from the Annex tables
+    return np.array(values, dtype=np.float64)
+
+
+def _column(dicts: list, name: str) -> list:
+    # Values of name in each dict, None where it is missing
+    return list(map(dict.get, dicts, repeat(name)))
+
+
+def _resolve(given: np.ndarray, national_value, table_values) -> np.ndarray:
+    # Given values take precedence over the national Annex A value, which takes precedence over the Annex B values
+    missing = np.isnan(given)
+    if national_value is not None:
+        return np.where(missing, national_value, given)
+    return np.where(missing, table_values, given)
+
+
+RECORD_NUMBER_FIELDS = ('build_year', 'v__build', 'theta__e', 'theta__int_build', 'delta__utb', 'n__build')
+RECORD_NAME_FIELDS = ('building_type', 'delta__utb_selection_criteria', 'air_tightness_level')
+ELEMENT_NUMBER_FIELDS = ('a__k', 'u__k', 'f__x')
+ELEMENT_CODE_FIELDS = ('be_type_codes', 'be_sub_type_codes', 'adjacency_codes')
+
+
+def resolve_portfolio_records(records: list, tables: din_12831_compiled.CompiledTables = None) -> dict:
+    """
+    Resolve building records into the columnar inputs of calculate_portfolio, with vectorized Annex lookups in the
+    compiled tables instead of one lookup per building and element.
+
+    Values are resolved as in `Building` and `BuildingElement`; with tables from a snapshot, its override layers
+    take the place of the national Annex A values. The records must be valid, e.g. checked with
+    batch_validation.validate_records, and carry theta__e (see location_index.fill_theta__e).
+
+    Args:
+    - records: List of building dicts, in the shape accepted by `Building`.
+    - tables: Compiled Annex tables, defaults to din_12831_compiled.get_compiled_tables().
+
+    Returns:
+    - Dict with the keyword arguments of calculate_portfolio.
+    """
+    tables = tables if tables is not None else din_12831_compiled.get_compiled_tables()
+    elements = [element for data in records for element in data['building_elements']]
+    building_index = np.repeat(np.arange(len(records)), [len(data['building_elements']) for data in records])
+    columns = {name: _given(_column(records, name)) for name in RECORD_NUMBER_FIELDS}
+    columns.update({name: _column(records, name) for name in RECORD_NAME_FIELDS})
+    columns.update({name: _given(_column(elements, name)) for name in ELEMENT_NUMBER_FIELDS})
+    columns.update(encode_element_names(tables, _column(elements, 'be_type'), _column(elements, 'be_sub_type'),
+                                        _column(elements, 'be_adjacent_to')))
+    return resolve_portfolio_columns(columns, building_index, tables)
+
+
+def encode_element_names(tables: din_12831_compiled.CompiledTables, be_types: list, be_sub_types: list, be_adjacent_to: list) -> dict:
+    # Codes of the element names in Tables B.15 and B.11, the ELEMENT_CODE_FIELDS columns of resolve_portfolio_columns
+    be_type_codes, be_sub_type_codes = tables.encode_be_type_pairs(be_types, be_sub_types)
+    return {
+        'be_type_codes': be_type_codes,
+        'be_sub_type_codes': be_sub_type_codes,
+        'adjacency_codes': din_12831_compiled.encode_names(tables.temperature_correction_codes, be_adjacent_to),
+    }
+
+
+def resolve_portfolio_columns(columns: dict, building_index, tables: din_12831_compiled.CompiledTables = None) -> dict:
+    """
+    Like resolve_portfolio_records, for valid records that are already flattened into columns, e.g. by
+    batch_validation.validate_records (see ValidationReport.valid_columns).
+
+    Args:
+    - columns: Per field of RECORD_NUMBER_FIELDS and ELEMENT_NUMBER_FIELDS a float64 array, NaN where the value is
+      None; per field of RECORD_NAME_FIELDS a list of the values; the ELEMENT_CODE_FIELDS arrays of
+      encode_element_names, encoded with the same tables.
+    - building_index (int): Per element index into the record columns.
+    - tables: Compiled Annex tables, defaults to din_12831_compiled.get_compiled_tables().
+
+    Returns:
+    - Dict with the keyword arguments of calculate_portfolio.
+    """
+    stats = instrumentation.active
+    if stats is not None:
+        start = perf_counter()
+
+    tables = tables if tables is not None else din_12831_compiled.get_compiled_tables()
+    building_index = np.asarray(building_index, dtype=np.intp)
+    build_year = columns['build_year'].astype(np.intp)
+
+    # Element values, in accordance with annex A.4.3/B.4.3 and A.3.3/B.3.3
+    u__k = columns['u__k']
+    national_u__k = din_12831_compiled.national_value(tables, din_12831_data.a_4_3_simplified_u_value)
+    if national_u__k is None and np.isnan(u__k).any():
+        table_u__k = tables.lookup_u_values_by_year(columns['be_type_codes'], columns['be_sub_type_codes'], build_year[building_index])
+    else:
+        table_u__k = np.nan
+    u__k = _resolve(u__k, national_u__k, table_u__k)
+
+    f__x = _resolve(columns['f__x'], din_12831_compiled.national_value(tables, din_12831_data.a_3_3_temperature_correction_factor),
+                    tables.temperature_correction_values[columns['adjacency_codes']])
+
+    # Building values, in accordance with annex A.3.2/B.3.2/B.2.1, A.3.4/B.3.4 and A.4.2/B.4.2
+    selection_criteria = columns['delta__utb_selection_criteria']
+    thermal_bridge_values = np.where(
+        [criteria is None for criteria in selection_criteria], tables.default_thermal_bridge_value[0],
+        tables.thermal_bridge_values[din_12831_compiled.encode_names(tables.thermal_bridge_codes, selection_criteria)])
+    delta__utb = _resolve(columns['delta__utb'], din_12831_compiled.national_value(tables, din_12831_data.a_3_2_simplified_thermal_bridges),
+                          thermal_bridge_values)
+
+    air_tightness_levels = columns['air_tightness_level']
+    air_change_rate_codes = np.where(
+        [level is None for level in air_tightness_levels], tables.encode_air_change_rate_build_year_ranges(build_year),
+        din_12831_compiled.encode_names(tables.air_change_rate_codes, air_tightness_levels))
+    n__build = _resolve(columns['n__build'], din_12831_compiled.national_value(tables, din_12831_data.a_3_4_simplified_air_change_rate),
+                        tables.air_change_rate_values[air_change_rate_codes])
+
+    building_type_codes = din_12831_compiled.encode_names(tables.building_temperature_codes, columns['building_type'])
+    theta__int_build = _resolve(columns['theta__int_build'], din_12831_compiled.national_value(tables, din_12831_data.a_4_2_internal_design_temperature),
+                                tables.building_temperature_values[building_type_codes])
+
+    if stats is not None:
+        stats.lap('annex_resolution', start)
+    return {
+        'a__k': columns['a__k'],
+        'u__k': u__k,
+        'f__x': f__x,
+        'building_index': building_index,
+        'v__build': columns['v__build'],
+        'n__build': n__build,
+        'theta__int_build': theta__int_build,
+        'theta__e': columns['theta__e'],
+        'delta__utb': delta__utb,
+    }
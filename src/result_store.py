@@ -0,0 +1,185 @@
+import numpy as np
+
+from src import array_container
+from src.portfolio_calculators import PortfolioResult
+
+
+RESULTS_KIND = 'portfolio_results'
+RESULTS_VERSION = 1
+
+# Per building, in W, W/K and the units of the resolved inputs
+BUILDING_FIELDS = ('building_design_heat_load', 'building_design_transmission_heat_loss', 'ventilation_heat_loss',
+                   'building_transmission_heat_loss_coefficient', 'ventilation_heat_loss_coefficient',
+                   'v__build', 'n__build', 'theta__int_build', 'theta__e', 'delta__utb')
+# Per element, grouped by building: the elements of building i are element_offsets[i]:element_offsets[i + 1]
+ELEMENT_FIELDS = ('a__k', 'u__k', 'f__x', 'transmission_heat_loss_coefficient', 'design_transmission_loss')
+
+UNITS = {
+    'building_design_heat_load': 'W', 'building_design_transmission_heat_loss': 'W', 'ventilation_heat_loss': 'W',
+    'building_transmission_heat_loss_coefficient': 'W/K', 'ventilation_heat_loss_coefficient': 'W/K',
+    'v__build': 'm^3', 'n__build': 'h^-1', 'theta__int_build': '°C', 'theta__e': '°C', 'delta__utb': 'W/(m^2∙K)',
+    'a__k': 'm^2', 'u__k': 'W/(m^2∙K)', 'f__x': '-', 'transmission_heat_loss_coefficient': 'W/K', 'design_transmission_loss': 'W',
+}
+
+# Version -> function upgrading the (metadata, arrays) of a file of that version to the next version. Readers
+# upgrade older files step by step, so every result file written so far stays readable.
+UPGRADES = {}
+
+
+class PortfolioResults:
+    """
+    Columnar results of a portfolio run, as loaded by load_results.
+
+    Building fields are arrays with one value per building, element fields are flat arrays with the elements of
+    each building stored contiguously. With a memory-mapped file all arrays are read-only views of the file, so
+    slicing loads only the pages touched.
+    """
+    def __init__(self, metadata: dict, arrays: dict):
+        self.metadata = metadata
+        self.arrays = arrays
+        self.element_offsets = arrays['element_offsets']
+
+
+    def __len__(self) -> int:
+        return self.element_offsets.shape[0] - 1
+
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+
+    @property
+    def n_elements(self) -> int:
+        return int(self.element_offsets[-1])
+
+
+    @property
+    def run_metadata(self) -> dict:
+        # The metadata passed to write_results
+        return self.metadata['run_metadata']
+
+
+    @property
+    def building_ids(self) -> np.ndarray:
+        # Per building, None if the file was written without ids
+        return self.arrays.get('building_ids')
+
+
+    def element_range(self, building: int) -> slice:
+        return slice(int(self.element_offsets[building]), int(self.element_offsets[building + 1]))
+
+
+    def building_elements(self, building: int) -> dict:
+        # Element field -> values of the elements of one building, as views
+        elements = self.element_range(building)
+        return {name: self.arrays[name][elements] for name in self.metadata['element_fields']}
+
+
+    def element_building_index(self) -> np.ndarray:
+        # Per element, position of its building
+        return np.repeat(np.arange(len(self)), np.diff(self.element_offsets))
+
+
+def _element_offsets(building_index: np.ndarray, n_buildings: int) -> np.ndarray:
+    offsets = np.zeros(n_buildings + 1, dtype=np.int64)
+    np.cumsum(np.bincount(building_index, minlength=n_buildings), out=offsets[1:])
+    return offsets
+
+
+def write_results(path, columns: dict, result, building_ids=None, metadata: dict = None):
+    """
+    Write the results of calculate_portfolio into a columnar, memory-mappable result file.
+
+    Args:
+    - path: Target file.
+    - columns: The calculate_portfolio inputs, e.g. from resolve_portfolio_records.
+    - result: `PortfolioResult` of columns.
+    - building_ids: Optional integer id per building, e.g. record numbers.
+    - metadata: Optional JSON-serializable dict stored with the results (e.g. the snapshot the run used), kept
+      apart from the schema keys of the file and read back as PortfolioResults.run_metadata.
+    """
+    building_index = np.asarray(columns['building_index'], dtype=np.intp)
+    n_buildings = np.asarray(columns['v__build']).shape[0]
+    # Group the elements by building; the stable sort keeps the element order within a building
+    element_order = None if np.all(building_index[1:] >= building_index[:-1]) else np.argsort(building_index, kind='stable')
+
+    element_values = {
+        'a__k': columns['a__k'],
+        'u__k': columns['u__k'],
+        'f__x': columns['f__x'],
+        'transmission_heat_loss_coefficient': result.element_transmission_heat_loss_coefficient,
+        'design_transmission_loss': result.element_design_transmission_loss,
+    }
+    building_values = {
+        'building_design_heat_load': result.building_design_heat_load,
+        'building_design_transmission_heat_loss': result.building_design_transmission_heat_loss,
+        'ventilation_heat_loss': result.ventilation_heat_loss,
+        'building_transmission_heat_loss_coefficient': result.building_transmission_heat_loss_coefficient,
+        'ventilation_heat_loss_coefficient': result.ventilation_heat_loss_coefficient,
+        **{name: columns[name] for name in ('v__build', 'n__build', 'theta__int_build', 'theta__e', 'delta__utb')},
+    }
+    arrays = {name: np.broadcast_to(np.asarray(values, dtype=np.float64), (n_buildings,)) for name, values in building_values.items()}
+    for name, values in element_values.items():
+        values = np.asarray(values, dtype=np.float64)
+        arrays[name] = values if element_order is None else values[element_order]
+    arrays['element_offsets'] = _element_offsets(building_index, n_buildings)
+    if building_ids is not None:
+        building_ids = np.asarray(building_ids)
+        if building_ids.shape != (n_buildings,) or building_ids.dtype.kind not in 'iu':
+            raise ValueError('building_ids must hold one integer per building.')
+        arrays['building_ids'] = building_ids.astype(np.int64)
+
+    array_container.write_array_container(path, RESULTS_KIND, RESULTS_VERSION, {
+        'building_fields': list(BUILDING_FIELDS),
+        'element_fields': list(ELEMENT_FIELDS),
+        'units': UNITS,
+        'n_buildings': n_buildings,
+        'n_elements': int(arrays['element_offsets'][-1]),
+        'run_metadata': metadata or {},
+    }, arrays)
+
+
+def write_building_results(path, buildings: list, building_ids=None, metadata: dict = None):
+    """
+    Write the results of calculated `Building` objects into a columnar result file, see write_results.
+    """
+    elements = [element for building in buildings for element in building.building_elements]
+    building_index = np.repeat(np.arange(len(buildings)), [len(building.building_elements) for building in buildings])
+
+    result = PortfolioResult(
+        element_design_transmission_loss=np.array([element.design_transmission_loss for element in elements], dtype=np.float64),
+        building_design_transmission_heat_loss=np.array([building.building_design_transmission_heat_loss for building in buildings], dtype=np.float64),
+        ventilation_heat_loss=np.array([building.ventilation_heat_loss for building in buildings], dtype=np.float64),
+        building_design_heat_load=np.array([building.building_design_heat_load for building in buildings], dtype=np.float64),
+        element_transmission_heat_loss_coefficient=np.array([element.transmission_heat_loss_coefficient for element in elements], dtype=np.float64),
+        building_transmission_heat_loss_coefficient=np.array([building.building_transmission_heat_loss_coefficient for building in buildings], dtype=np.float64),
+        ventilation_heat_loss_coefficient=np.array([building.ventilation_heat_loss_coefficient for building in buildings], dtype=np.float64),
+    )
+    columns = {
+        'a__k': [element.a__k for element in elements],
+        'u__k': [element.u__k for element in elements],
+        'f__x': [element.f__x for element in elements],
+        'building_index': building_index,
+        **{name: np.array([getattr(building, name) for building in buildings], dtype=np.float64)
+           for name in ('v__build', 'n__build', 'theta__int_build', 'theta__e', 'delta__utb')},
+    }
+    write_results(path, columns, result, building_ids, metadata)
+
+
+def load_results(path, mmap: bool = True) -> PortfolioResults:
+    """
+    Load a result file written by write_results, upgrading files of older schema versions.
+
+    Only the header is parsed; with mmap the arrays are read-only views of the file, so opening costs the same for
+    any number of results.
+
+    Returns:
+    - PortfolioResults
+    """
+    version, metadata, arrays = array_container.read_array_container(path, RESULTS_KIND, mmap)
+    if version > RESULTS_VERSION:
+        raise ValueError(f'{path} has result version {version}, this code reads up to version {RESULTS_VERSION}.')
+    while version < RESULTS_VERSION:
+        metadata, arrays = UPGRADES[version](metadata, arrays)
+        version += 1
+    return PortfolioResults(metadata, arrays)
@@ -0,0 +1,341 @@
+from contextlib import contextmanager
+
+from src.data import din_12831_data
+from src.simplified_calculators import Building, BuildingElement
+
+
+# Room inputs; theta__int and n__room default to the theta__int_build and n__build of the building
+ROOM_INPUTS = frozenset(('theta__int', 'v__room', 'n__room'))
+
+# Building values read by the rooms; restored when an edit of them fails
+BUILDING_VALUES = ('build_year', 'theta__e', 'theta__int_build', 'delta__utb', 'n__build', 'n__build_given')
+
+
+class HeatedSpace:
+    """
+    Node of a room → zone → building hierarchy, holding the totals of all rooms below it.
+
+    The totals are kept up to date incrementally: a changed room passes the difference of its totals to its
+    ancestors only, so an edit costs O(depth) instead of a pass over the whole building.
+    """
+    def __init__(self, name: str, parent: 'HeatedSpace' = None):
+        self.name = name
+        self.parent = parent
+        self.transmission_heat_loss_coefficient = 0.0  # W/K
+        self.ventilation_heat_loss_coefficient = 0.0  # W/K
+        self.design_transmission_heat_loss = 0.0  # W
+        self.ventilation_heat_loss = 0.0  # W
+
+
+    @property
+    def totals(self) -> tuple:
+        return (self.transmission_heat_loss_coefficient, self.ventilation_heat_loss_coefficient,
+                self.design_transmission_heat_loss, self.ventilation_heat_loss)
+
+
+    def _add_totals(self, totals: tuple, sign: int = 1):
+        self.transmission_heat_loss_coefficient += sign * totals[0]
+        self.ventilation_heat_loss_coefficient += sign * totals[1]
+        self.design_transmission_heat_loss += sign * totals[2]
+        self.ventilation_heat_loss += sign * totals[3]
+
+
+    def _propagate(self, previous_totals: tuple, totals: tuple):
+        # Replace the contribution previous_totals of a child by totals in this node and all its ancestors
+        node = self
+        while node is not None:
+            node._add_totals(previous_totals, -1)
+            node._add_totals(totals)
+            node = node.parent
+
+
+    @property
+    def heat_loss_coefficient(self) -> float:
+        return self.transmission_heat_loss_coefficient + self.ventilation_heat_loss_coefficient
+
+
+    @property
+    def design_heat_load(self) -> float:
+        # Sum of the room design heat loads in W
+        return self.design_transmission_heat_loss + self.ventilation_heat_loss
+
+
+class Room(HeatedSpace):
+    """
+    Heated room with its own internal design temperature, volume and building elements.
+
+    Its building elements are BuildingElement instances with the room as parent, so they are calculated at the
+    room temperature theta__int. Elements adjacent to an unheated space may give the space category and case of
+    Table B.2 (adjacent_space_category, adjacent_space_case) instead of f__x or be_adjacent_to.
+    """
+    def __init__(self, data: dict, parent: HeatedSpace):
+        super().__init__(data.get('name'), parent)
+        self.building = parent.building
+        self.data = {key: data.get(key) for key in ROOM_INPUTS}
+        self.element_data = list(data.get('building_elements') or [])
+        self.building_elements = []
+        self._commit(*self._calculate(self.data, self.element_data))
+
+
+    # Building measurements, read by the building elements
+    @property
+    def build_year(self) -> int:
+        return self.building.build_year
+
+
+    @property
+    def delta__utb(self) -> float:
+        return self.building.delta__utb
+
+
+    @property
+    def theta__int_build(self) -> float:
+        # Internal design temperature of the room in °C
+        theta__int = self.data['theta__int']
+        return theta__int if theta__int is not None else self.building.theta__int_build
+
+
+    @property
+    def theta__e(self) -> float:
+        return self.building.theta__e
+
+
+    @property
+    def v__room(self) -> float:
+        return self.data['v__room']
+
+
+    @property
+    def n__room(self) -> float:
+        n__room = self.data['n__room']
+        return n__room if n__room is not None else self.building.n__build
+
+
+    def _calculate(self, data: dict, element_data: list):
+        # Calculate the room from inputs without changing it, so a failing edit leaves the room as it was
+        if data['v__room'] is None or data['v__room'] <= 0:
+            raise ValueError('Volume of room, v__room, cannot be zero or negative.')
+        if len(element_data) < 1:
+            raise ValueError(f'No building elements provided for room {self.name!r}.')
+
+        previous_data, self.data = self.data, data
+        try:
+            building_elements = [BuildingElement(Room.resolve_adjacent_space_static(element), self) for element in element_data]
+            transmission_heat_loss_coefficient = sum(element.transmission_heat_loss_coefficient for element in building_elements)
+            ventilation_heat_loss_coefficient = Building.calculate_simplified_building_ventilation_heat_loss_coefficient_static(
+                self.v__room, self.n__room)
+            delta__theta = self.theta__int_build - self.theta__e
+        finally:
+            self.data = previous_data
+        totals = (transmission_heat_loss_coefficient, ventilation_heat_loss_coefficient,
+                  transmission_heat_loss_coefficient * delta__theta, ventilation_heat_loss_coefficient * delta__theta)
+        return data, element_data, building_elements, totals
+
+
+    def _commit(self, data: dict, element_data: list, building_elements: list, totals: tuple):
+        previous_totals = self.totals
+        self.data = data
+        self.element_data = element_data
+        self.building_elements = building_elements
+        self._propagate(previous_totals, totals)
+
+
+    def recalculate(self):
+        self._commit(*self._calculate(self.data, self.element_data))
+
+
+    # Room edits; only this room and its ancestors are updated
+    def update(self, **changes):
+        unknown_inputs = set(changes) - ROOM_INPUTS
+        if unknown_inputs:
+            raise KeyError(f'Unknown room inputs: {sorted(unknown_inputs)}')
+        self._commit(*self._calculate({**self.data, **changes}, self.element_data))
+
+
+    def update_element(self, index: int, **changes):
+        element_data = list(self.element_data)
+        element_data[index] = {**element_data[index], **changes}
+        self._commit(*self._calculate(self.data, element_data))
+
+
+    def add_element(self, element_data: dict) -> int:
+        self._commit(*self._calculate(self.data, self.element_data + [element_data]))
+        return len(self.element_data) - 1
+
+
+    def remove_element(self, index: int):
+        element_data = list(self.element_data)
+        del element_data[index]
+        self._commit(*self._calculate(self.data, element_data))
+
+
+    @staticmethod
+    def resolve_adjacent_space_static(element_data: dict) -> dict:
+        # f__x from Table B.2 for elements that give the adjacent unheated space instead of f__x or be_adjacent_to
+        if element_data.get('f__x') is not None or element_data.get('be_adjacent_to') is not None \
+                or element_data.get('adjacent_space_category') is None:
+            return element_data
+        return {**element_data, 'f__x': Room.get_temperature_adjustment_term_for_adjacent_space_static(
+            element_data['adjacent_space_category'], element_data.get('adjacent_space_case'))}
+
+
+    # In accordance with annex A.3.3 and B.2.4 of DIN 12831
+    @staticmethod
+    def get_temperature_adjustment_term_for_adjacent_space_static(space_category: str, space_case: str):
+        f__x = din_12831_data.a_3_3_temperature_correction_factor()
+        return f__x if f__x is not None else din_12831_data.b_2_4_temperature_adjustment_term(space_category, space_case)
+
+
+class Zone(HeatedSpace):
+    """
+    Group of rooms and zones, e.g. an apartment or a storey.
+    """
+    def __init__(self, data: dict, parent: HeatedSpace):
+        super().__init__(data.get('name'), parent)
+        self.building = parent.building
+        self.children = _build_children(self, data)
+
+
+    def iter_rooms(self):
+        return _iter_rooms(self)
+
+
+class RoomBuilding(HeatedSpace):
+    """
+    Building calculated room by room, in a room → zone → building hierarchy.
+
+    The building data is that of `Building`, except that v__build and building_elements are replaced by 'rooms'
+    and 'zones': lists of room dicts (name, theta__int, v__room, n__room, building_elements) and zone dicts (name,
+    rooms, zones). Every level holds the totals of the rooms below it. Room edits update only the room and its
+    ancestors; edits of building values affect every room and recalculate the whole building.
+    """
+    def __init__(self, data: dict):
+        super().__init__(data.get('name'))
+        self.building = self
+
+        self.build_year = data.get('build_year')
+        self.theta__e = data.get('theta__e')
+        if self.theta__e is None:
+            self.theta__e = Building.get_external_design_temperature_static(data.get('postcode'), data.get('latitude'), data.get('longitude'))
+        self.building_type = data.get('building_type')
+        self.delta__utb_selection_criteria = data.get('delta__utb_selection_criteria')
+        self.air_tightness_level = data.get('air_tightness_level')
+
+        if not isinstance(self.build_year, int):
+            raise TypeError("build_year should be of type int")
+
+        if self.theta__e is None:
+            raise ValueError('No value provided for theta__e, the external mean design temperature.')
+
+        if data.get('theta__int_build') is None and self.building_type is None:
+            raise ValueError('No value provided for theta__int_build or building type. If no value is provided for theta__int_build, a value must be provided for building type.')
+
+        if 'delta__utb' not in data and 'delta__utb_selection_criteria' not in data:
+            raise ValueError("If delta__utb is not provided in the data, delta__utb_selection_criteria must be included.")
+
+        self._resolve_delta__utb(data.get('delta__utb'))
+        self._resolve_n__build(data.get('n__build'))
+        self._resolve_theta__int_build(data.get('theta__int_build'))
+
+        self.children = _build_children(self, data)
+        if not any(True for _ in self.iter_rooms()):
+            raise ValueError('No rooms provided.')
+
+
+    def _resolve_delta__utb(self, delta__utb: float = None):
+        self.delta__utb = delta__utb if delta__utb is not None else \
+            Building.get_simplified_additional_thermal_transmittance_for_thermal_bridges_static(self.delta__utb_selection_criteria)
+
+
+    def _resolve_n__build(self, n__build: float = None):
+        self.n__build_given = n__build is not None
+        self.n__build = n__build if n__build is not None else \
+            Building.get_simplified_air_change_rate_static(self.build_year, self.air_tightness_level)
+
+
+    def _resolve_theta__int_build(self, theta__int_build: float = None):
+        self.theta__int_build = theta__int_build if theta__int_build is not None else \
+            Building.get_simplified_internal_design_temperature_static(self.building_type)
+
+
+    def iter_rooms(self):
+        return _iter_rooms(self)
+
+
+    def recalculate(self):
+        # Recalculate every room, dropping any rounding accumulated by incremental updates; the rooms are only
+        # changed once all of them are calculated, so a failing room leaves the whole building as it was
+        calculations = [(room, room._calculate(room.data, room.element_data)) for room in self.iter_rooms()]
+        for room, calculation in calculations:
+            room._commit(*calculation)
+        _resum(self)
+
+
+    @contextmanager
+    def _building_edit(self):
+        # Recalculate the building after the edit in the with block; restore the building values if either fails
+        previous_values = {name: getattr(self, name) for name in BUILDING_VALUES}
+        try:
+            yield
+            self.recalculate()
+        except Exception:
+            for name, value in previous_values.items():
+                setattr(self, name, value)
+            raise
+
+
+    # Building edits; setting a value to None resolves it from the Annex tables again
+    def set_theta__e(self, theta__e: float):
+        if theta__e is None:
+            raise ValueError('No value provided for theta__e, the external mean design temperature.')
+        with self._building_edit():
+            self.theta__e = theta__e
+
+
+    def set_theta__int_build(self, theta__int_build: float = None):
+        with self._building_edit():
+            self._resolve_theta__int_build(theta__int_build)
+
+
+    def set_delta__utb(self, delta__utb: float = None):
+        with self._building_edit():
+            self._resolve_delta__utb(delta__utb)
+
+
+    def set_n__build(self, n__build: float = None):
+        with self._building_edit():
+            self._resolve_n__build(n__build)
+
+
+    def set_build_year(self, build_year: int):
+        if not isinstance(build_year, int):
+            raise TypeError("build_year should be of type int")
+        with self._building_edit():
+            self.build_year = build_year
+            if not self.n__build_given:
+                self._resolve_n__build()
+
+
+def _build_children(parent: HeatedSpace, data: dict) -> list:
+    # Rooms and zones of a zone or building; each child adds its totals to all its ancestors while it is built
+    return [Room(room_data, parent) for room_data in data.get('rooms') or []] + \
+        [Zone(zone_data, parent) for zone_data in data.get('zones') or []]
+
+
+def _iter_rooms(node: HeatedSpace):
+    for child in node.children:
+        if isinstance(child, Room):
+            yield child
+        else:
+            yield from _iter_rooms(child)
+
+
+def _resum(node: HeatedSpace) -> tuple:
+    # Set the totals of node and the zones below it to the exact sums of their children
+    if isinstance(node, Room):
+        return node.totals
+    node.transmission_heat_loss_coefficient = node.ventilation_heat_loss_coefficient = 0.0
+    node.design_transmission_heat_loss = node.ventilation_heat_loss = 0.0
+    for child in node.children:
+        node._add_totals(_resum(child))
+    return node.totals
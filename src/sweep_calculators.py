@@ -0,0 +1,97 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.simplified_calculators import Building
+
+
+@dataclass
+class RetrofitSweepResult:
+    building_transmission_heat_loss_coefficient: np.ndarray  # Per variant, in W/K
+    ventilation_heat_loss_coefficient: float  # In W/K, the same for every variant
+    building_design_heat_load: np.ndarray  # [variant, temperature pair], in W
+
+    @property
+    def heat_loss_coefficient(self) -> np.ndarray:
+        # Per variant, in W/K
+        return self.building_transmission_heat_loss_coefficient + self.ventilation_heat_loss_coefficient
+
+
+def sweep_design_temperatures(heat_loss_coefficient, theta__int, theta__e) -> np.ndarray:
+    """
+    Evaluate design heat losses for many pairs of internal and external design temperatures at once.
+
+    Every loss of the simplified method is a specific heat loss times (theta__int - theta__e), so a sweep is
+    one outer product.
+
+    Args:
+    - heat_loss_coefficient (W/K): Specific heat loss per building (or per element/variant), any 1-D array or scalar.
+    - theta__int (°C), theta__e (°C): Temperature pairs, arrays of equal length or scalars.
+
+    Returns:
+    - Heat losses in Watts, [heat_loss_coefficient, temperature pair].
+    """
+    heat_loss_coefficient = np.atleast_1d(np.asarray(heat_loss_coefficient, dtype=np.float64))
+    delta__theta = np.atleast_1d(np.asarray(theta__int, dtype=np.float64) - np.asarray(theta__e, dtype=np.float64))
+    return np.multiply.outer(heat_loss_coefficient, delta__theta)
+
+
+def retrofit_u_value_matrix(building: Building, variants: list) -> np.ndarray:
+    """
+    Build the element U-values of every retrofit variant.
+
+    Args:
+    - building: Calculated building the variants start from.
+    - variants: List of dicts mapping be_type, or (be_type, be_sub_type), to the new u__k of those elements.
+      A (be_type, be_sub_type) key takes precedence over a be_type key.
+
+    Returns:
+    - U-values in W/(m^2∙K), [variant, building element].
+    """
+    u__k = np.array([element.u__k for element in building.building_elements], dtype=np.float64)
+    u_values = np.tile(u__k, (len(variants), 1))
+
+    # Element indices per (be_type, be_sub_type), so each variant assigns one value per group instead of per element
+    element_groups = {}
+    for element_index, element in enumerate(building.building_elements):
+        element_groups.setdefault((element.be_type, element.be_sub_type), []).append(element_index)
+    element_groups = {key: np.array(indices, dtype=np.intp) for key, indices in element_groups.items()}
+
+    for variant_index, variant in enumerate(variants):
+        for (be_type, be_sub_type), element_indices in element_groups.items():
+            u_value = variant.get((be_type, be_sub_type), variant.get(be_type))
+            if u_value is not None:
+                u_values[variant_index, element_indices] = u_value
+    return u_values
+
+
+def sweep_retrofit_variants(building: Building, variants: list, theta__int=None, theta__e=None) -> RetrofitSweepResult:
+    """
+    Evaluate the design heat load of many retrofit variants of a building, optionally for many temperature pairs.
+
+    Args:
+    - building: Calculated building the variants start from.
+    - variants: List of dicts mapping be_type, or (be_type, be_sub_type), to a new u__k, see retrofit_u_value_matrix.
+      An empty dict is the building as is.
+    - theta__int (°C), theta__e (°C): Temperature pairs, default to the building's own design temperatures.
+
+    Returns:
+    - RetrofitSweepResult with the specific heat losses per variant and the design heat loads per variant and
+      temperature pair.
+    """
+    theta__int = building.theta__int_build if theta__int is None else theta__int
+    theta__e = building.theta__e if theta__e is None else theta__e
+
+    a__k_f__x = np.array([element.a__k * element.f__x for element in building.building_elements], dtype=np.float64)
+    u_values = retrofit_u_value_matrix(building, variants)
+
+    # Σ a__k∙(u__k + delta__utb)∙f__x for all variants as one matrix-vector product
+    building_transmission_heat_loss_coefficient = (u_values + building.delta__utb) @ a__k_f__x
+    ventilation_heat_loss_coefficient = building.ventilation_heat_loss_coefficient
+
+    return RetrofitSweepResult(
+        building_transmission_heat_loss_coefficient=building_transmission_heat_loss_coefficient,
+        ventilation_heat_loss_coefficient=ventilation_heat_loss_coefficient,
+        building_design_heat_load=sweep_design_temperatures(
+            building_transmission_heat_loss_coefficient + ventilation_heat_loss_coefficient, theta__int, theta__e),
+    )
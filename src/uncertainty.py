@@ -0,0 +1,206 @@
+from bisect import bisect_left
+from dataclasses import dataclass
+from functools import partial
+
+import numpy as np
+
+from src import parallel_runner
+from src.batch_runner import iter_chunks
+from src.data import din_12831_data
+from src.simplified_calculators import Building, BuildingElement
+
+
+DEFAULT_SAMPLES = 2000
+DEFAULT_PERCENTILES = (5, 50, 95)
+DEFAULT_CHUNK_SIZE = 100  # Buildings per task of a parallel run
+
+
+@dataclass
+class UncertaintyBands:
+    design_heat_load: float  # Point value of `Building`, in W
+    percentiles: tuple
+    design_heat_load_percentiles: np.ndarray  # One per percentile, in W
+    uncertain_inputs: list  # Defaulted inputs drawn from distributions, e.g. ['delta__utb', 'u__k[2]']
+
+
+@dataclass
+class PortfolioUncertaintyBands:
+    design_heat_load: np.ndarray  # Per building, point value of `Building`, in W
+    percentiles: tuple
+    design_heat_load_percentiles: np.ndarray  # [building, percentile], in W
+
+
+def _neighbouring_range_years(range_last_years: tuple, build_year: int) -> list:
+    # One build year of the build year range of build_year and of each of its neighbouring ranges
+    years = list(range_last_years) + [range_last_years[-1] + 1]
+    range_index = bisect_left(range_last_years, build_year)
+    return years[max(range_index - 1, 0):range_index + 2]
+
+
+def u__k_options(be_type: str, be_sub_type: str, build_year: int) -> list:
+    # U-values of Table B.15 in the build year range of build_year and its neighbouring ranges, resolved like
+    # Building does (national Annex A values, or the snapshot in use)
+    u_values = [BuildingElement.get_simplified_thermal_transmittance_u_static(be_type, be_sub_type, year)
+                for year in _neighbouring_range_years(din_12831_data.u_value_build_year_range_last_years, build_year)]
+    return [u_value for u_value in u_values if u_value is not None]
+
+
+def f__x_options(be_adjacent_to: str) -> list:
+    # Elements against unheated spaces may face any of the unheated spaces of Table B.2; other adjacencies are exact
+    if be_adjacent_to != 'unheated spaces or another building entity (u)' or din_12831_data.a_3_3_temperature_correction_factor() is not None:
+        return []
+    return [value for cases in din_12831_data.b_2_4_table_b_2_temperature_adjustment_term.values() for value in cases.values()]
+
+
+def delta__utb_options(delta__utb_selection_criteria: str = None) -> list:
+    # With a selection criterion the Table B.1 value is exact; without one, any criterion of Table B.1 may apply
+    if delta__utb_selection_criteria is not None:
+        return []
+    return [Building.get_simplified_additional_thermal_transmittance_for_thermal_bridges_static(selection_criteria)
+            for selection_criteria in din_12831_data.b_2_1_table_b_1_additional_thermal_transmittance_for_thermal_bridges]
+
+
+def n__build_options(build_year: int, air_tightness_level: str = None) -> list:
+    # Air change rates of Table B.12 in the build year range of build_year and its neighbouring ranges; with an
+    # air tightness level the Table B.12 value is exact
+    if air_tightness_level is not None:
+        return []
+    return [Building.get_simplified_air_change_rate_static(year)
+            for year in _neighbouring_range_years(din_12831_data.air_change_rate_build_year_range_last_years, build_year)]
+
+
+def _is_uncertain(options: list) -> bool:
+    # A national Annex A value or a blanket override of the snapshot in use resolves every option to the same value
+    return len(set(options)) > 1
+
+
+def _draw(rng: np.random.Generator, options: list, n_samples: int) -> np.ndarray:
+    return np.asarray(options, dtype=np.float64)[rng.integers(0, len(options), n_samples)]
+
+
+def sample_design_heat_load(data: dict, n_samples: int = DEFAULT_SAMPLES, rng: np.random.Generator = None):
+    """
+    Draw design heat loads of a building whose defaulted inputs are drawn from the Annex tables.
+
+    Inputs left out of data are drawn uniformly from:
+    - u__k: the Table B.15 U-values of the element in the build year range and its neighbouring ranges.
+    - f__x: the Table B.2 adjustment terms, for elements against unheated spaces.
+    - delta__utb: the Table B.1 values, if no delta__utb_selection_criteria is given either.
+    - n__build: the Table B.12 values of the build year range and its neighbouring ranges, if no
+      air_tightness_level is given either.
+    Given inputs, inputs selected by a given table key, and inputs with a national Annex A value or a blanket
+    override of the snapshot in use, are exact. All samples are one array computation.
+
+    Args:
+    - data: Building dict, in the shape accepted by `Building`.
+    - n_samples: Number of samples.
+    - rng: NumPy random generator, e.g. np.random.default_rng(seed) for reproducible samples.
+
+    Returns:
+    - (building, samples, uncertain_inputs): The calculated `Building`, the design heat load samples in W and the
+      names of the inputs drawn.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    building = Building(data)
+    elements = building.building_elements
+    uncertain_inputs = []
+
+    a__k = np.array([element.a__k for element in elements], dtype=np.float64)
+    u__k = np.tile(np.array([element.u__k for element in elements], dtype=np.float64), (n_samples, 1))
+    f__x = np.tile(np.array([element.f__x for element in elements], dtype=np.float64), (n_samples, 1))
+    for index, (element, element_data) in enumerate(zip(elements, data['building_elements'])):
+        if element_data.get('u__k') is None:
+            options = u__k_options(element.be_type, element.be_sub_type, building.build_year)
+            if _is_uncertain(options):
+                u__k[:, index] = _draw(rng, options, n_samples)
+                uncertain_inputs.append(f'u__k[{index}]')
+        if element_data.get('f__x') is None:
+            options = f__x_options(element.be_adjacent_to)
+            if _is_uncertain(options):
+                f__x[:, index] = _draw(rng, options, n_samples)
+                uncertain_inputs.append(f'f__x[{index}]')
+
+    delta__utb = np.full(n_samples, building.delta__utb, dtype=np.float64)
+    if data.get('delta__utb') is None:
+        options = delta__utb_options(building.delta__utb_selection_criteria)
+        if _is_uncertain(options):
+            delta__utb = _draw(rng, options, n_samples)
+            uncertain_inputs.append('delta__utb')
+
+    n__build = np.full(n_samples, building.n__build, dtype=np.float64)
+    if data.get('n__build') is None:
+        options = n__build_options(building.build_year, building.air_tightness_level)
+        if _is_uncertain(options):
+            n__build = _draw(rng, options, n_samples)
+            uncertain_inputs.append('n__build')
+
+    # Σ a__k∙(u__k + delta__utb)∙f__x + v__build∙n__build∙0.34, per sample
+    a__k_f__x = a__k * f__x
+    transmission_heat_loss_coefficient = (a__k_f__x * u__k).sum(axis=1) + delta__utb * a__k_f__x.sum(axis=1)
+    ventilation_heat_loss_coefficient = Building.calculate_simplified_building_ventilation_heat_loss_coefficient_static(
+        building.v__build, n__build)
+    samples = (transmission_heat_loss_coefficient + ventilation_heat_loss_coefficient) * (building.theta__int_build - building.theta__e)
+    return building, samples, uncertain_inputs
+
+
+def uncertainty_bands(data: dict, n_samples: int = DEFAULT_SAMPLES, percentiles: tuple = DEFAULT_PERCENTILES,
+                      seed=None) -> UncertaintyBands:
+    """
+    Percentile bands of the design heat load of a building with defaulted inputs, see sample_design_heat_load.
+
+    Args:
+    - data: Building dict, in the shape accepted by `Building`.
+    - n_samples: Number of samples.
+    - percentiles: Percentiles of the bands, 0-100.
+    - seed: Seed (int or np.random.SeedSequence) for reproducible bands.
+
+    Returns:
+    - UncertaintyBands with the point design heat load, its percentiles and the inputs drawn.
+    """
+    building, samples, uncertain_inputs = sample_design_heat_load(data, n_samples, np.random.default_rng(seed))
+    return UncertaintyBands(
+        design_heat_load=building.building_design_heat_load,
+        percentiles=tuple(percentiles),
+        design_heat_load_percentiles=np.percentile(samples, percentiles),
+        uncertain_inputs=uncertain_inputs,
+    )
+
+
+def uncertainty_bands_chunk(chunk: list, n_samples: int, percentiles: tuple) -> list:
+    # (design heat load, percentiles) of every (data, seed) pair of a chunk
+    bands = [uncertainty_bands(data, n_samples, percentiles, seed) for data, seed in chunk]
+    return [(band.design_heat_load, band.design_heat_load_percentiles) for band in bands]
+
+
+def portfolio_uncertainty_bands(records: list, n_samples: int = DEFAULT_SAMPLES, percentiles: tuple = DEFAULT_PERCENTILES,
+                                seed=None, max_workers: int = None,
+                                chunk_size: int = DEFAULT_CHUNK_SIZE) -> PortfolioUncertaintyBands:
+    """
+    Percentile bands of the design heat load of every building of a portfolio.
+
+    Every building gets its own seed spawned from seed, so the bands are the same with and without a process pool
+    and for any chunk size.
+
+    Args:
+    - records: List of building dicts.
+    - n_samples, percentiles, seed: See uncertainty_bands.
+    - max_workers: If given, buildings are sampled in a pool of this many processes.
+    - chunk_size: Buildings per task of a parallel run.
+
+    Returns:
+    - PortfolioUncertaintyBands with the point design heat loads and their percentiles per building.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(len(records))
+    chunks = iter_chunks(zip(records, seeds), chunk_size)
+    function = partial(uncertainty_bands_chunk, n_samples=n_samples, percentiles=tuple(percentiles))
+    if max_workers:
+        chunk_results = parallel_runner.map_chunks_parallel(function, chunks, max_workers=max_workers)
+    else:
+        chunk_results = map(function, chunks)
+
+    results = [result for chunk_result in chunk_results for result in chunk_result]
+    return PortfolioUncertaintyBands(
+        design_heat_load=np.array([design_heat_load for design_heat_load, _ in results], dtype=np.float64),
+        percentiles=tuple(percentiles),
+        design_heat_load_percentiles=np.array([bands for _, bands in results], dtype=np.float64).reshape(len(results), len(percentiles)),
+    )
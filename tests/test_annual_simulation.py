@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_portfolio import generate_portfolio
+from src.annual_simulation import iter_hourly_heat_demand, load_hourly_temperatures, simulate_annual_heat_demand, simulate_buildings
+from src.simplified_calculators import Building
+
+
+@pytest.fixture(scope='module')
+def theta__e_hourly():
+    # A year of hourly temperatures with a seasonal cycle, with repeated values from rounding
+    rng = np.random.default_rng(31)
+    hours = np.arange(8760)
+    return (8 - 10 * np.cos(2 * np.pi * hours / 8760) + rng.normal(0, 4, 8760)).round(1)
+
+
+@pytest.mark.parametrize('heating_limit_temperature', [None, 15.0, [12.0, 16.0, 30.0, -50.0, 14.0]])
+def test_annual_totals_match_the_hourly_sums(theta__e_hourly, heating_limit_temperature):
+    transmission_heat_loss_coefficient = np.array([120.0, 250.0, 80.0, 300.0, 0.0])
+    ventilation_heat_loss_coefficient = np.array([40.0, 90.0, 20.0, 100.0, 50.0])
+    theta__int_build = np.array([20.0, 22.0, 18.0, 20.0, 24.0])
+    result = simulate_annual_heat_demand(transmission_heat_loss_coefficient, ventilation_heat_loss_coefficient,
+                                         theta__int_build, theta__e_hourly, heating_limit_temperature=heating_limit_temperature)
+
+    heat_loss_coefficient = transmission_heat_loss_coefficient + ventilation_heat_loss_coefficient
+    profiles = np.concatenate([profiles for _, profiles in iter_hourly_heat_demand(
+        heat_loss_coefficient, theta__int_build, theta__e_hourly, heating_limit_temperature, chunk_size=2)])
+    assert profiles.shape == (5, 8760)
+    assert result.annual_heat_demand == pytest.approx(profiles.sum(axis=1) / 1000, rel=1e-9)
+    assert result.annual_transmission_heat_demand == pytest.approx(
+        profiles.sum(axis=1) * transmission_heat_loss_coefficient / heat_loss_coefficient / 1000, rel=1e-9)
+    assert result.peak_heat_load == pytest.approx(profiles.max(axis=1), rel=1e-12)
+    assert result.heating_hours.tolist() == (profiles > 0).sum(axis=1).tolist()
+
+
+def test_full_load_hours_of_buildings(theta__e_hourly):
+    buildings = [Building(data) for data in generate_portfolio(10, seed=32)]
+    result = simulate_buildings(buildings, theta__e_hourly)
+    design_heat_load = np.array([building.building_design_heat_load for building in buildings])
+    assert result.full_load_hours == pytest.approx(result.annual_heat_demand * 1000 / design_heat_load, rel=1e-12)
+
+
+def test_load_hourly_temperatures(tmp_path, theta__e_hourly):
+    npy_path = tmp_path / 'year.npy'
+    np.save(npy_path, theta__e_hourly)
+    assert load_hourly_temperatures(npy_path).tolist() == theta__e_hourly.tolist()
+
+    csv_path = tmp_path / 'year.csv'
+    csv_path.write_text('hour,theta__e,wind\n0,-3.5,2\n1,-4.0,3\n', encoding='utf-8')
+    assert load_hourly_temperatures(csv_path, 'theta__e').tolist() == [-3.5, -4.0]
+    assert load_hourly_temperatures(csv_path).tolist() == [2.0, 3.0]
@@ -0,0 +1,102 @@
+import copy
+import random
+
+from benchmarks.synthetic_portfolio import generate_portfolio
+from src.batch_runner import calculate_chunk
+from src.batch_validation import validate_records
+from src.simplified_calculators import Building
+
+
+RECORD_FIELDS = ['build_year', 'v__build', 'theta__e', 'theta__int_build', 'building_type', 'delta__utb',
+                 'delta__utb_selection_criteria', 'building_elements']
+# Values of the wrong JSON type for the fields that are looked up in the Annex tables
+UNHASHABLE_VALUES = [['Residential'], {'name': 'Doors'}, []]
+
+
+def mutate(rng: random.Random, data: dict) -> dict:
+    data = copy.deepcopy(data)
+    for _ in range(rng.randint(0, 3)):
+        choice = rng.random()
+        if choice < 0.1:
+            data.pop(rng.choice(RECORD_FIELDS), None)
+        elif choice < 0.2:
+            data[rng.choice(['v__build', 'theta__e'])] = rng.choice([None, 0, -3, 5, '5'])
+        elif choice < 0.3:
+            data['build_year'] = rng.choice([1930, 1990, 'x', 1800, 1990.0, True])
+        elif choice < 0.35:
+            data['building_type'] = rng.choice(['Nope', None, *UNHASHABLE_VALUES])
+            data['theta__int_build'] = None
+        elif choice < 0.4:
+            data['building_elements'] = rng.choice([[], None, 'elements'])
+        elif choice < 0.45:
+            data['delta__utb'] = None
+            data['delta__utb_selection_criteria'] = rng.choice(['bad', None, *UNHASHABLE_VALUES])
+        elif choice < 0.5:
+            data['n__build'] = None
+            data['air_tightness_level'] = rng.choice(['bad', None, 'buildings with tight windows', *UNHASHABLE_VALUES])
+        elif isinstance(data.get('building_elements'), list) and data['building_elements']:
+            element = rng.choice(data['building_elements'])
+            element_choice = rng.random()
+            if element_choice < 0.2:
+                element['a__k'] = rng.choice([0, None, -1, True, False])
+            elif element_choice < 0.4:
+                element['u__k'] = None
+                element['be_type'] = rng.choice([None, 'Doors', 'Windows, French doors', 'bad', *UNHASHABLE_VALUES])
+                element['be_sub_type'] = rng.choice([None, 'all', 'Wooden frame, single glazing', 'x', *UNHASHABLE_VALUES])
+            elif element_choice < 0.6:
+                element['f__x'] = None
+                element['be_adjacent_to'] = rng.choice([None, 'ground', 'bad', *UNHASHABLE_VALUES])
+    return data
+
+
+def building_accepts(data: dict) -> bool:
+    # Building fails on malformed structure (e.g. building_elements as a string) with other errors than RECORD_ERRORS;
+    # the batch runner never passes such records to Building, so any error counts as a rejection here
+    try:
+        Building(data)
+    except Exception:
+        return False
+    return True
+
+
+def test_validate_records_agrees_with_building():
+    rng = random.Random(5)
+    records = [mutate(rng, data) for data in generate_portfolio(3000, seed=9)]
+    report = validate_records(records)
+    disagreements = [index for index, data in enumerate(records) if building_accepts(data) != report.is_valid(index)]
+    assert disagreements == []
+    assert 0 < report.valid.sum() < len(records)
+
+
+def test_unhashable_table_names_are_rejected_not_raised():
+    data = next(generate_portfolio(1, seed=1))
+    records = [
+        {**data, 'theta__int_build': None, 'building_type': ['Residential']},
+        {**data, 'delta__utb': None, 'delta__utb_selection_criteria': {'a': 1}},
+        {**data, 'building_elements': [{'a__k': 10, 'be_type': ['Doors'], 'be_sub_type': {'all': 1}, 'be_adjacent_to': ['ground']}]},
+        data,
+    ]
+    results, rejects = calculate_chunk(list(enumerate(records, start=1)))
+    assert [result['record_number'] for result in results] == [4]
+    assert [reject['record_number'] for reject in rejects] == [1, 2, 3]
+    assert all(reject['error_type'] == 'ValidationError' for reject in rejects)
+
+
+def test_non_finite_numbers_are_rejected_per_field():
+    data = next(generate_portfolio(1, seed=1))
+    element = data['building_elements'][0]
+    records = [
+        {**data, 'v__build': float('inf')},
+        {**data, 'theta__e': float('nan')},
+        {**data, 'n__build': float('-inf')},
+        {**data, 'building_elements': [{**element, 'a__k': float('inf')}]},
+        {**data, 'building_elements': [{**element, 'u__k': float('nan')}]},
+    ]
+    report = validate_records(records)
+    assert [[(error.field, error.message) for error in report.errors_by_record[index]] for index in range(len(records))] == [
+        [('v__build', 'v__build must be a finite number.')],
+        [('theta__e', 'theta__e must be a finite number.')],
+        [('n__build', 'n__build must be a finite number.')],
+        [('a__k', 'a__k must be a finite number.')],
+        [('u__k', 'u__k must be a finite number.')],
+    ]
@@ -0,0 +1,31 @@
+import pytest
+
+from src.calculation_cache import BuildingCache
+from src.simplified_calculators import Building
+
+
+def building_data(build_year: int = 1950, **element) -> dict:
+    return {
+        'build_year': build_year, 'v__build': 300, 'theta__e': -12, 'building_type': 'Residential', 'delta__utb': 0.05,
+        'building_elements': [{'a__k': 20, 'be_type': 'Doors', 'be_sub_type': 'all', 'be_adjacent_to': 'external air', **element}],
+    }
+
+
+def test_unhashable_element_values_are_calculated_without_the_cache():
+    # Building ignores be_type where u__k is given, so a list from JSON is accepted
+    data = building_data(u__k=1.2, be_type=['Doors'])
+    cache = BuildingCache()
+    assert cache.get_building(data).building_design_heat_load == pytest.approx(Building(data).building_design_heat_load)
+    assert len(cache.elements) == 0
+
+
+def test_elements_are_shared_within_a_table_b_15_build_year_range():
+    cache = BuildingCache()
+    cache.get_building(building_data(1950))
+    building = cache.get_building(building_data(1955))
+    assert cache.elements.stats()['hits'] == 1
+    assert building.building_design_heat_load == pytest.approx(Building(building_data(1955)).building_design_heat_load)
+
+    # 1960 falls into the next range of Table B.15
+    cache.get_building(building_data(1960))
+    assert cache.elements.stats()['hits'] == 1
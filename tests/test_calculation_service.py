@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.synthetic_portfolio import generate_portfolio
+from src.batch_runner import calculate_record
+from src.calculation_service import CalculationService, RequestRejected, handle_http_request
+
+
+def test_invalid_record_does_not_fail_its_batch():
+    valid = list(generate_portfolio(2, seed=4))
+    invalid = {**valid[0], 'v__build': 0}
+    unhashable = {**valid[0], 'theta__int_build': None, 'building_type': ['Residential']}
+
+    async def run():
+        async with CalculationService(batch_size=4, max_delay=1.0) as service:
+            outcomes = await asyncio.gather(*[service.calculate(data) for data in (valid[0], invalid, unhashable, valid[1])],
+                                            return_exceptions=True)
+            return outcomes, service.metrics_snapshot()
+
+    outcomes, metrics = asyncio.run(run())
+    assert metrics['batches'] == 1
+    for outcome, data in ((outcomes[0], valid[0]), (outcomes[3], valid[1])):
+        expected = calculate_record(data)
+        assert outcome['building_design_heat_load'] == pytest.approx(expected['building_design_heat_load'])
+    assert [type(outcome) for outcome in outcomes[1:3]] == [RequestRejected, RequestRejected]
+    assert outcomes[1].reject['errors'][0]['field'] == 'v__build'
+    assert outcomes[2].reject['errors'][0]['field'] == 'building_type'
+
+
+def test_http_status_codes():
+    data = next(generate_portfolio(1, seed=4))
+
+    async def run():
+        async with CalculationService(max_delay=0.001) as service:
+            return [
+                (await handle_http_request(service, 'POST', '/calculate', headers, json.dumps(body).encode()))[0]
+                for headers, body in [({}, data), ({}, {**data, 'v__build': -1}), ({'x-timeout-ms': 'soon'}, data),
+                                      ({'x-timeout-ms': '0'}, data), ({'x-timeout-ms': '500'}, data)]
+            ]
+
+    assert asyncio.run(run()) == [200, 422, 400, 400, 200]
+
+
+def test_requests_are_accepted_while_a_batch_is_calculated():
+    large = next(generate_portfolio(1, seed=4, n_elements=100000))
+    small = next(generate_portfolio(1, seed=5))
+
+    async def run():
+        async with CalculationService(batch_size=1, max_delay=0.0, max_batches_in_flight=2) as service:
+            first = asyncio.create_task(service.calculate(large))
+            await asyncio.sleep(0.02)  # The batch of the large building is being calculated in a worker
+            second = asyncio.create_task(service.calculate(small))
+            done, _ = await asyncio.wait({first, second}, return_when=asyncio.FIRST_COMPLETED)
+            await first
+            return done == {second}, second.result()
+
+    second_finished_first, result = asyncio.run(run())
+    assert second_finished_first
+    assert result['building_design_heat_load'] == pytest.approx(calculate_record(small)['building_design_heat_load'])
@@ -0,0 +1,77 @@
+import pytest
+
+from benchmarks.synthetic_portfolio import generate_portfolio
+from src.element_templates import ElementTemplateRegistry, TemplatedBuilding
+from src.incremental_calculators import IncrementalBuilding
+from src.portfolio_calculators import calculate_portfolio, resolve_portfolio_records
+from src.simplified_calculators import Building
+
+
+RESULT_FIELDS = ('building_design_heat_load', 'building_design_transmission_heat_loss', 'ventilation_heat_loss',
+                 'building_transmission_heat_loss_coefficient', 'ventilation_heat_loss_coefficient')
+
+
+@pytest.fixture(scope='module')
+def records():
+    return list(generate_portfolio(60, seed=7))
+
+
+@pytest.fixture(scope='module')
+def expected(records):
+    buildings = [Building(data) for data in records]
+    return {name: [getattr(building, name) for building in buildings] for name in RESULT_FIELDS}
+
+
+def edited_incremental_building(data: dict) -> IncrementalBuilding:
+    # Start from a different building and edit it into data
+    elements = data['building_elements']
+    building = IncrementalBuilding({**data, 'theta__e': data['theta__e'] + 3, 'building_elements': [
+        {**elements[0], 'a__k': elements[0]['a__k'] * 2}, *elements[1:], {'a__k': 5, 'u__k': 1.1, 'f__x': 1.0}]})
+    building.update_element(0, a__k=elements[0]['a__k'])
+    building.update_element(1, u__k=9.9, f__x=0.1)
+    building.update_element(1, **elements[1])
+    building.remove_element(len(elements))
+    building.set_theta__e(data['theta__e'])
+    building.set_build_year(data['build_year'])
+    building.set_n__build(data['n__build'])
+    return building
+
+
+def calculate_portfolio_path(records):
+    result = calculate_portfolio(**resolve_portfolio_records(records))
+    return {name: list(getattr(result, name)) for name in RESULT_FIELDS}
+
+
+def templated_path(records):
+    registry = ElementTemplateRegistry()
+    buildings = [TemplatedBuilding(data, registry) for data in records]
+    return {name: [getattr(building, name) for building in buildings] for name in RESULT_FIELDS}
+
+
+def compact_path(records):
+    buildings = [Building(data, compact=True) for data in records]
+    return {name: [getattr(building, name) for building in buildings] for name in RESULT_FIELDS}
+
+
+def incremental_path(records):
+    buildings = [edited_incremental_building(data) for data in records]
+    return {name: [getattr(building, name) for building in buildings] for name in RESULT_FIELDS}
+
+
+@pytest.mark.parametrize('calculate', [calculate_portfolio_path, templated_path, compact_path, incremental_path])
+def test_calculation_paths_match_building(records, expected, calculate):
+    results = calculate(records)
+    for name in RESULT_FIELDS:
+        assert results[name] == pytest.approx(expected[name], rel=1e-12), name
+
+
+def test_compact_building_accepts_the_same_inputs():
+    data = {'build_year': 1990, 'v__build': 300, 'theta__e': -12, 'building_type': 'Residential', 'delta__utb': 0.05,
+            'building_elements': [{'a__k': 2, 'u__k': 1.0, 'f__x': 1.0, 'be_type': ['Doors'], 'be_sub_type': 3},
+                                  {'a__k': 2, 'be_type': 'Doors', 'be_sub_type': 'all', 'be_adjacent_to': 'external air'}]}
+    building = Building(data)
+    compact = Building(data, compact=True)
+    assert compact.building_design_heat_load == pytest.approx(building.building_design_heat_load, rel=1e-12)
+    assert [element.be_type for element in compact.building_elements] == [['Doors'], 'Doors']
+    # Each store interns the names in its own table
+    assert compact.building_elements.names is not Building(data, compact=True).building_elements.names
@@ -0,0 +1,53 @@
+import numpy as np
+
+from src.data import din_12831_compiled, din_12831_data
+
+
+YEARS = range(1800, 2031)
+
+
+def u_value_build_year_range(year: int) -> str:
+    # The ranges of Table B.15, spelled out
+    for last_year, build_year_range in ((1918, '<=1918'), (1948, '1919-48'), (1957, '1949-57'), (1968, '1958-68'),
+                                        (1978, '1969-78'), (1983, '1979-83'), (1994, '1984-94')):
+        if year <= last_year:
+            return build_year_range
+    return '>=1995'
+
+
+def air_change_rate_build_year_range(year: int) -> str:
+    # The build year keys of Table B.12, with 1977 itself counted to the oldest range
+    if year <= 1977:
+        return '<1977'
+    return '<1995' if year < 1995 else '>=1995'
+
+
+def test_build_year_range_labels_are_table_keys():
+    u_value_keys = {build_year_range for sub_types in din_12831_data.b_4_3_table_b_15_u_values.values()
+                    for u_values in sub_types.values() for build_year_range in u_values}
+    assert set(din_12831_data.u_value_build_year_ranges) == u_value_keys
+    assert set(din_12831_data.air_change_rate_build_year_ranges) <= set(din_12831_data.b_3_4_table_b_12_air_change_rate)
+
+    for year in YEARS:
+        assert din_12831_data.get_build_year_range_for_u_values(year) == u_value_build_year_range(year), year
+        assert din_12831_data.get_build_year_range_for_air_change_rate(year) == air_change_rate_build_year_range(year), year
+
+
+def test_compiled_build_year_ranges_match_the_labels():
+    tables = din_12831_compiled.compile_din_12831_tables()
+    years = np.array(YEARS)
+    u_value_codes = tables.encode_u_value_build_year_ranges(years)
+    assert [tables.u_value_build_year_ranges[code] for code in u_value_codes] == [
+        u_value_build_year_range(year) for year in YEARS]
+    assert tables.air_change_rate_values[tables.encode_air_change_rate_build_year_ranges(years)].tolist() == [
+        din_12831_data.b_3_4_table_b_12_air_change_rate[air_change_rate_build_year_range(year)] for year in YEARS]
+
+
+def test_compiled_u_values_match_table_b_15():
+    tables = din_12831_compiled.compile_din_12831_tables()
+    for be_type, sub_types in din_12831_data.b_4_3_table_b_15_u_values.items():
+        for be_sub_type, u_values in sub_types.items():
+            for year in (1900, 1930, 1950, 1960, 1970, 1980, 1990, 2000):
+                # Missing and empty cells both mean that Table B.15 defines no U-value
+                expected = u_values.get(u_value_build_year_range(year))
+                assert tables.u_value(be_type, be_sub_type, year) == expected, (be_type, be_sub_type, year)
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from src.heat_pump_catalog import NO_MATCH, HeatPumpCatalog, load_heat_pump_catalog
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    rng = np.random.default_rng(21)
+    n_models = 120
+    capacity_at_7 = rng.uniform(3000, 20000, n_models)
+    capacities = np.stack([capacity_at_7 * rng.uniform(0.6, 0.8, n_models), capacity_at_7 * rng.uniform(0.8, 0.95, n_models),
+                           capacity_at_7], axis=1)
+    # Rating temperatures out of order, and prices rounded so that equal prices occur
+    return HeatPumpCatalog([f'model {model}' for model in range(n_models)], rng.uniform(5, 20, n_models).round() * 1000,
+                           rng.choice([-20.0, -15.0, -10.0], n_models), [2, -7, 7], capacities[:, [1, 0, 2]])
+
+
+def brute_force_match(catalog: HeatPumpCatalog, design_heat_load: float, theta__e: float, monovalent: bool):
+    # Cheapest price and the capacity at theta__e of every feasible model, comparing against the whole catalog
+    capacities = catalog.capacity_at(theta__e)
+    feasible = capacities >= design_heat_load
+    if monovalent:
+        feasible &= catalog.bivalence_points <= theta__e
+    return (catalog.prices[feasible].min() if feasible.any() else None), capacities
+
+
+@pytest.mark.parametrize('monovalent', [False, True])
+def test_match_agrees_with_brute_force(catalog, monovalent):
+    rng = np.random.default_rng(22)
+    design_heat_load = rng.uniform(1000, 25000, 2000)
+    theta__e = rng.choice([-16.0, -14.0, -12.5, -10.0, -7.0, 0.0, 8.0], 2000)
+    result = catalog.match(design_heat_load, theta__e, monovalent)
+
+    for building in range(design_heat_load.shape[0]):
+        price, capacities = brute_force_match(catalog, design_heat_load[building], theta__e[building], monovalent)
+        model = result.model_index[building]
+        if price is None:
+            assert model == NO_MATCH and np.isnan(result.price[building]) and np.isnan(result.capacity[building])
+            continue
+        # Equally cheap models may be chosen differently, so the match is checked for price and feasibility
+        assert result.price[building] == price
+        assert result.capacity[building] == capacities[model] >= design_heat_load[building]
+        if monovalent:
+            assert catalog.bivalence_points[model] <= theta__e[building]
+
+
+def test_feasible_models_agree_with_brute_force(catalog):
+    capacities = catalog.capacity_at(-12.0)
+    feasible = catalog.feasible_models(9000, -12.0)
+    assert sorted(feasible.tolist()) == np.flatnonzero(capacities >= 9000).tolist()
+    assert np.all(np.diff(capacities[feasible]) >= 0)
+
+
+def test_capacities_are_interpolated_and_held_beyond_the_rating_temperatures():
+    catalog = HeatPumpCatalog(['a'], [1000], [-20], [-7, 7], [[4000, 8000]])
+    assert catalog.capacity_at(0).tolist() == [6000]
+    assert catalog.capacity_at(-15).tolist() == [4000]
+    assert catalog.capacity_at(12).tolist() == [8000]
+
+
+def test_load_heat_pump_catalog_reads_capacities_in_kw(tmp_path):
+    path = tmp_path / 'catalog.csv'
+    path.write_text('model,price,bivalence_point,capacity_at_-7,capacity_at_7\n'
+                    'small,8000,-15,4,6\nlarge,12000,-20,9,12\n', encoding='utf-8')
+    catalog = load_heat_pump_catalog(path)
+    result = catalog.match([5000, 8000, 20000], -7)
+    assert catalog.model_names(result.model_index) == ['large', 'large', None]
+    assert catalog.model_names(catalog.match(3000, -7).model_index) == ['small']
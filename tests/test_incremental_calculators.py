@@ -0,0 +1,52 @@
+import pytest
+
+from src.incremental_calculators import IncrementalBuilding
+from src.simplified_calculators import Building
+
+
+SINGLE_GLAZING = {'be_type': 'Windows, French doors', 'be_sub_type': 'Wooden frame, single glazing'}  # No U-value from 1995
+
+
+def building_data():
+    return {
+        'build_year': 2000, 'v__build': 300, 'theta__e': -12, 'building_type': 'Residential', 'delta__utb': 0.05,
+        'building_elements': [
+            {'a__k': 2, 'be_type': 'Doors', 'be_sub_type': 'all', 'be_adjacent_to': 'external air'},
+            {'a__k': 60, 'u__k': 0.3, 'be_adjacent_to': 'external air'},
+            {'a__k': 80, 'u__k': 0.4, 'f__x': 0.6},
+        ],
+    }
+
+
+def assert_matches_building(building: IncrementalBuilding, data: dict):
+    expected = Building(data)
+    assert building.building_design_heat_load == pytest.approx(expected.building_design_heat_load)
+    assert building.building_transmission_heat_loss_coefficient == pytest.approx(expected.building_transmission_heat_loss_coefficient)
+    assert [element.u__k for element in building.building_elements] == [element.u__k for element in expected.building_elements]
+
+
+def test_failing_edits_leave_the_building_unchanged():
+    data = building_data()
+    building = IncrementalBuilding(data)
+
+    building.update_element(1, a__k=40)
+    data['building_elements'][1]['a__k'] = 40
+    with pytest.raises(ValueError):
+        building.update_element(0, **SINGLE_GLAZING)
+    with pytest.raises(ValueError):
+        building.update_element(2, a__k=0)
+    with pytest.raises(ValueError):
+        building.add_element({'a__k': 3, 'be_adjacent_to': 'external air', **SINGLE_GLAZING})
+    assert_matches_building(building, data)
+
+    building.add_element({'a__k': 3, 'u__k': 2.0, 'be_adjacent_to': 'external air', **SINGLE_GLAZING})
+    with pytest.raises(ValueError):
+        building.update_element(3, u__k=None)
+    building.set_build_year(1930)
+    building.update_element(3, u__k=None)
+    data['build_year'] = 1930
+    data['building_elements'].append({'a__k': 3, 'be_adjacent_to': 'external air', **SINGLE_GLAZING})
+    with pytest.raises(ValueError):
+        building.set_build_year(2000)
+    assert building.build_year == 1930
+    assert_matches_building(building, data)
@@ -0,0 +1,31 @@
+from benchmarks.synthetic_portfolio import generate_portfolio
+from src import batch_runner, instrumentation
+
+
+def chunk(n_buildings: int = 20) -> list:
+    return list(enumerate(generate_portfolio(n_buildings, seed=3), start=1))
+
+
+def test_batch_run_reports_stage_timings():
+    with instrumentation.instrumented() as stats:
+        results, rejects = batch_runner.calculate_chunk(chunk())
+    assert len(results) == 20 and not rejects
+
+    snapshot = stats.snapshot()
+    assert set(snapshot) == set(instrumentation.BATCH_STAGES) - {'record_fallback'}
+    assert all(stage['count'] == 1 and stage['seconds'] >= 0 for stage in snapshot.values())
+
+
+def test_record_fallback_is_reported(monkeypatch):
+    def failing_resolution(*args):
+        raise ValueError('An Annex table lookup yielded no value.')
+
+    # Only the batch resolution fails, so every record is calculated by the per-record fallback
+    monkeypatch.setattr(batch_runner, 'resolve_portfolio_columns', failing_resolution)
+    with instrumentation.instrumented() as stats:
+        results, rejects = batch_runner.calculate_chunk(chunk(5))
+    assert len(results) == 5 and not rejects
+
+    snapshot = stats.snapshot()
+    assert snapshot['record_fallback']['count'] == 1
+    assert snapshot['annex_resolution']['count'] == 5
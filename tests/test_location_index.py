@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from src.location_index import LocationIndex, load_location_index
+
+
+@pytest.fixture(scope='module')
+def index():
+    rng = np.random.default_rng(11)
+    # Clustered and sparse locations over Germany, so queries hit dense cells, empty cells and the fallback
+    latitudes = np.concatenate([rng.uniform(47.3, 55.0, 300), rng.normal(52.5, 0.05, 200)])
+    longitudes = np.concatenate([rng.uniform(5.9, 15.0, 300), rng.normal(13.4, 0.05, 200)])
+    theta__e = rng.uniform(-16, -8, latitudes.shape[0]).round(1)
+    postcodes = [f'{10000 + row}' for row in range(latitudes.shape[0])]
+    return LocationIndex(latitudes, longitudes, theta__e, postcodes)
+
+
+def brute_force_distances(index: LocationIndex, latitudes, longitudes) -> np.ndarray:
+    query_x, query_y = index._project(latitudes, longitudes)
+    return ((index.x[None, :] - query_x[:, None]) ** 2 + (index.y[None, :] - query_y[:, None]) ** 2).min(axis=1)
+
+
+def test_nearest_matches_brute_force(index):
+    rng = np.random.default_rng(12)
+    # Queries inside the grid, around the cluster and far outside of it
+    latitudes = np.concatenate([rng.uniform(47.3, 55.0, 2000), rng.normal(52.5, 0.1, 500), rng.uniform(30, 70, 100)])
+    longitudes = np.concatenate([rng.uniform(5.9, 15.0, 2000), rng.normal(13.4, 0.1, 500), rng.uniform(-10, 40, 100)])
+    rows = index.nearest(latitudes, longitudes)
+
+    query_x, query_y = index._project(latitudes, longitudes)
+    distances = (index.x[rows] - query_x) ** 2 + (index.y[rows] - query_y) ** 2
+    # Compared by distance, as equidistant locations may be chosen differently
+    assert distances == pytest.approx(brute_force_distances(index, latitudes, longitudes), rel=0, abs=1e-12)
+
+
+def test_resolve_many_prefers_the_postcode(index):
+    theta__e = index.resolve_many(['10007', ' 10008 ', None, 'unknown', None],
+                                  [None, 0.0, 52.5, 52.5, None], [None, 0.0, 13.4, 13.4, None])
+    nearest = index.theta__e[index.nearest(52.5, 13.4)[0]]
+    assert theta__e[:4].tolist() == [index.theta__e[7], index.theta__e[8], nearest, nearest]
+    assert np.isnan(theta__e[4])
+    assert index.resolve(latitude=52.5, longitude=13.4) == nearest
+
+
+def test_saved_index_resolves_the_same(index, tmp_path):
+    path = tmp_path / 'locations.npz'
+    index.save(path)
+    loaded = load_location_index(path)
+    rng = np.random.default_rng(13)
+    latitudes, longitudes = rng.uniform(47.3, 55.0, 200), rng.uniform(5.9, 15.0, 200)
+    assert loaded.nearest(latitudes, longitudes).tolist() == index.nearest(latitudes, longitudes).tolist()
+    assert loaded.resolve('10042') == index.resolve('10042')
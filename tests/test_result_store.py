@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from benchmarks.synthetic_portfolio import generate_portfolio
+from src.portfolio_calculators import calculate_portfolio, resolve_portfolio_records
+from src.result_store import BUILDING_FIELDS, load_results, write_building_results, write_results
+from src.simplified_calculators import Building
+
+
+@pytest.fixture(scope='module')
+def records():
+    return list(generate_portfolio(40, seed=41))
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_results_round_trip(records, tmp_path, mmap):
+    columns = resolve_portfolio_records(records)
+    result = calculate_portfolio(**columns)
+    path = tmp_path / 'results.bin'
+    write_results(path, columns, result, building_ids=np.arange(1, 41), metadata={'snapshot': 'default', 'n_buildings': 'all'})
+
+    results = load_results(path, mmap=mmap)
+    assert len(results) == 40
+    assert results.n_elements == columns['a__k'].shape[0]
+    assert results.run_metadata == {'snapshot': 'default', 'n_buildings': 'all'}
+    assert results.building_ids.tolist() == list(range(1, 41))
+    for name in BUILDING_FIELDS:
+        expected = getattr(result, name) if hasattr(result, name) else columns[name]
+        assert results[name].tolist() == expected.tolist(), name
+    assert results['design_transmission_loss'].tolist() == result.element_design_transmission_loss.tolist()
+    assert results.element_building_index().tolist() == columns['building_index'].tolist()
+    elements = results.building_elements(3)
+    assert elements['u__k'].tolist() == columns['u__k'][columns['building_index'] == 3].tolist()
+
+
+def test_unsorted_elements_are_grouped_by_building(tmp_path):
+    columns = {'a__k': [1.0, 2.0, 3.0], 'u__k': [0.5, 1.0, 1.5], 'f__x': [1.0, 1.0, 0.6], 'building_index': [1, 0, 1],
+               'v__build': [100.0, 200.0], 'n__build': [0.5, 0.7], 'theta__int_build': [20.0, 20.0], 'theta__e': [-12.0, -10.0],
+               'delta__utb': [0.05, 0.1]}
+    result = calculate_portfolio(**columns)
+    path = tmp_path / 'results.bin'
+    write_results(path, columns, result)
+
+    results = load_results(path)
+    assert results.building_ids is None
+    assert results.building_elements(0)['a__k'].tolist() == [2.0]
+    assert results.building_elements(1)['a__k'].tolist() == [1.0, 3.0]
+    assert results.building_elements(1)['design_transmission_loss'].tolist() == result.element_design_transmission_loss[[0, 2]].tolist()
+
+
+def test_building_results_match_the_building_objects(records, tmp_path):
+    buildings = [Building(data) for data in records[:10]]
+    path = tmp_path / 'buildings.bin'
+    write_building_results(path, buildings)
+
+    results = load_results(path)
+    assert results['building_design_heat_load'].tolist() == [building.building_design_heat_load for building in buildings]
+    assert results.building_elements(9)['u__k'].tolist() == [element.u__k for element in buildings[9].building_elements]
@@ -0,0 +1,87 @@
+import pytest
+
+from src.batch_runner import calculate_chunk
+from src.calculation_cache import BuildingCache
+from src.data import din_12831_compiled, din_12831_data, din_12831_snapshot
+from src.element_templates import ElementTemplateRegistry, TemplatedBuilding
+from src.incremental_calculators import IncrementalBuilding
+from src.simplified_calculators import Building
+
+
+BUILDING = {
+    'build_year': 1930, 'v__build': 300, 'theta__e': -12, 'building_type': 'Residential', 'delta__utb': 0.05, 'n__build': 0.5,
+    'building_elements': [{'a__k': 2, 'be_type': 'Doors', 'be_sub_type': 'all', 'be_adjacent_to': 'external air'}],
+}
+
+
+@pytest.fixture
+def customer_snapshot(tmp_path):
+    registry = din_12831_snapshot.default_registry()
+    registry.add_layer('customer', {
+        'B.14': {'Residential': 22},
+        'B.15': {('Doors', 'all', '1919-48'): 2.0,
+                 ('Windows, French doors', 'Wooden frame, single glazing', '>=1995'): 4.2},  # empty cell in Annex B
+    })
+    path = tmp_path / 'tables.snapshot'
+    din_12831_snapshot.build_snapshot(path, registry)
+    din_12831_snapshot.use_snapshot(path)
+    yield path
+    din_12831_compiled.set_compiled_tables(None)
+
+
+def test_snapshot_overrides_reach_batch_results(customer_snapshot):
+    filled_cell = {**BUILDING, 'build_year': 2000, 'building_elements': [
+        {'a__k': 2, 'be_type': 'Windows, French doors', 'be_sub_type': 'Wooden frame, single glazing', 'be_adjacent_to': 'external air'}]}
+    results, rejects = calculate_chunk([(1, BUILDING), (2, filled_cell)])
+    assert rejects == []
+    assert [result['theta__int_build'] for result in results] == [22, 22]
+    assert [result['building_elements'][0]['u__k'] for result in results] == [2.0, 4.2]
+
+
+def test_without_snapshot_the_empty_cell_is_rejected():
+    filled_cell = {**BUILDING, 'build_year': 2000, 'building_elements': [
+        {'a__k': 2, 'be_type': 'Windows, French doors', 'be_sub_type': 'Wooden frame, single glazing', 'be_adjacent_to': 'external air'}]}
+    results, rejects = calculate_chunk([(1, BUILDING), (2, filled_cell)])
+    assert results[0]['theta__int_build'] == 20
+    assert results[0]['building_elements'][0]['u__k'] == 3.5
+    assert [reject['record_number'] for reject in rejects] == [2]
+
+
+def records_without_delta__utb():
+    # No delta__utb_selection_criteria: delta__utb is the Annex B.3.2 default, unless overridden
+    return [(1, {**BUILDING, 'delta__utb': None, 'delta__utb_selection_criteria': None})]
+
+
+@pytest.mark.parametrize('layer', ['national_annex_a', 'customer'])
+def test_table_b_1_blanket_reaches_the_b_3_2_default(tmp_path, layer):
+    registry = din_12831_snapshot.AnnexOverrideRegistry()
+    registry.add_layer(layer, {'B.1': {din_12831_snapshot.BLANKET: 0.07}})
+    din_12831_snapshot.build_snapshot(tmp_path / 'tables.snapshot', registry)
+    din_12831_snapshot.use_snapshot(tmp_path / 'tables.snapshot')
+    try:
+        results, rejects = calculate_chunk(records_without_delta__utb())
+        assert rejects == []
+        assert results[0]['delta__utb'] == 0.07
+        assert Building(records_without_delta__utb()[0][1]).delta__utb == 0.07
+    finally:
+        din_12831_compiled.set_compiled_tables(None)
+
+
+def test_national_b_3_2_value_without_snapshot(monkeypatch):
+    monkeypatch.setattr(din_12831_data, 'a_3_2_simplified_thermal_bridges', lambda: 0.07)
+    results, _ = calculate_chunk(records_without_delta__utb())
+    assert results[0]['delta__utb'] == Building(records_without_delta__utb()[0][1]).delta__utb == 0.07
+
+
+def test_scalar_paths_read_the_snapshot_in_use(customer_snapshot):
+    data = {**BUILDING, 'building_type': 'Residential', 'theta__int_build': None}
+    (result,), _ = calculate_chunk([(1, data)])
+    heat_loads = [
+        Building(data).building_design_heat_load,
+        Building(data, compact=True).building_design_heat_load,
+        BuildingCache().get_building(data).building_design_heat_load,
+        TemplatedBuilding(data, ElementTemplateRegistry()).building_design_heat_load,
+        IncrementalBuilding(data).building_design_heat_load,
+    ]
+    assert heat_loads == pytest.approx([result['building_design_heat_load']] * len(heat_loads))
+    assert Building(data).theta__int_build == 22